@@ -1,8 +1,10 @@
-import pygame
+import argparse
 import random
 import sys
 import math
 
+from simcore import capture, ccd, circles, headless, kernels, profiler, scheduler, sleep, textcache, trajectory
+
 # Constants
 WIDTH, HEIGHT = 800, 600
 GRAVITY = 9.8  # Acceleration due to gravity (m/s^2)
@@ -11,12 +13,46 @@ BALL_COUNT = 15 # Number of balls
 PIXELS_PER_METER = 17  # Scale: 1 meter = 17 pixels
 DT = 0.020
 BALL_COLOR = (0, 0, 139)  # Dark blue
+SLEEP_COLOR = (150, 150, 200)  # Sleeping balls are drawn faded
 
-# Initialize pygame
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 24)
+parser = argparse.ArgumentParser(description="Bouncing balls with continuous collision detection")
+parser.add_argument("--balls", type=int, default=BALL_COUNT, help="number of balls")
+parser.add_argument("--height", type=float, default=10.0, help="initial height (m)")
+parser.add_argument("--dt-scale", type=int, default=1, help="timestep multiplier (1-10)")
+parser.add_argument("--discrete", action="store_true", help="start with discrete overlap tests instead of CCD")
+parser.add_argument("--no-sleep", action="store_true", help="start with sleeping of resting balls off")
+parser.add_argument("--check", action="store_true", help="check that CCD never misses a contact at large timesteps and exit")
+headless.add_arguments(parser)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+scheduler.add_arguments(parser)
+kernels.add_arguments(parser)
+args = parser.parse_args()
+kernels.from_args(args)  # Compiled discrete step when Numba is installed
+
+if args.check:
+    # Headless check: large timesteps must never let a ball leave the box or pass through another
+    for dt_scale in (1, 5, 10):
+        result = ccd.check_containment(dt=DT * dt_scale, scale=PIXELS_PER_METER,
+                                       gravity=GRAVITY, restitution=ENERGY_LOSS)
+        print(f"DT x{dt_scale}: {result['steps']} steps, {result['escapes']} escapes, "
+              f"worst overlap {result['worst_overlap_px']:.3f} px")
+        if result["escapes"] or result["worst_overlap_px"] > 1e-6:
+            sys.exit(1)
+    sys.exit()
+
+use_ccd = not args.discrete  # Swept collision detection; press 'C' to compare with discrete overlap tests
+dt_scale = max(1, min(10, args.dt_scale))  # Timestep multiplier, Up/Down to change
+step_dt = DT * 60 / args.physics_hz  # DT per step at 60 steps per second
+box = ccd.Box(0, WIDTH, HEIGHT - 20)
+sleeper = sleep.SleepManager()  # Press 'S' to toggle sleeping of resting balls
+sleeper.enabled = not args.no_sleep
+
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+if playback:
+    args.balls = playback.trajectory.rows("position")
+headless.setup(args)
 
 # Ball class
 class Ball:
@@ -27,12 +63,13 @@ class Ball:
         self.color = BALL_COLOR
         self.vx = random.uniform(-15, 15)  # Increased horizontal velocity range
         self.vy = random.uniform(10, 40)  # Increased vertical velocity range
+        sleep.reset(self)
 
-    def update(self):
+    def update(self, dt=DT):
         # Apply gravity
-        self.vy += GRAVITY * DT
-        self.y += self.vy * PIXELS_PER_METER * DT
-        self.x += self.vx * PIXELS_PER_METER * DT
+        self.vy += GRAVITY * dt
+        self.y += self.vy * PIXELS_PER_METER * dt
+        self.x += self.vx * PIXELS_PER_METER * dt
         
         # Collision with ground
         if self.y + self.radius >= HEIGHT - 20:
@@ -44,14 +81,14 @@ class Ball:
             self.vx = -self.vx * ENERGY_LOSS
             self.x = max(self.radius, min(WIDTH - self.radius, self.x))
         
+        self.settle()
+
+    def settle(self):
         # Stop the ball if velocity is very low
         if abs(self.vy) < 0.5 and self.y >= HEIGHT - 20 - self.radius:
             self.vy = 0
             self.vx *= 0.95  # Gradually stop horizontal motion
 
-    def draw(self):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
-
     def check_collision(self, other):
         # Calculate the distance between the centers of the two balls
         dx = self.x - other.x
@@ -69,37 +106,157 @@ class Ball:
             other.vx += p * nx
             other.vy += p * ny
 
-# Get user input for height in meters
-initial_height_meters = 10.0
+# Draw the balls with one batched call per color (sleeping balls are faded)
+def draw_balls():
+    groups = {}
+    for ball in balls:
+        groups.setdefault(SLEEP_COLOR if ball.asleep else ball.color, []).append(ball)
+    for color, group in groups.items():
+        circles.draw(screen, [(ball.x, ball.y) for ball in group], [ball.radius for ball in group], color)
+
+# Initial height in meters
+initial_height_meters = args.height
 
 # Create balls
-balls = [Ball(random.randint(50, WIDTH - 50), initial_height_meters, 10) for _ in range(BALL_COUNT)]
+balls = [Ball(random.randint(50, WIDTH - 50), initial_height_meters, 10) for _ in range(args.balls)]
+history = trajectory.writer_from_args(args, {"position": ((len(balls), 2), "f8"), "velocity": ((len(balls), 2), "f8")},
+                                      script="Bouncing Ball", dt=step_dt)
+
+# The discrete update and check_collision() loop as one compiled kernel (simcore.kernels); returns touching pairs
+def bounce_compiled(dt):
+    import numpy as np
+
+    x = np.array([ball.x for ball in balls], dtype=float)
+    y = np.array([ball.y for ball in balls], dtype=float)
+    vx = np.array([ball.vx for ball in balls], dtype=float)
+    vy = np.array([ball.vy for ball in balls], dtype=float)
+    radius = np.array([ball.radius for ball in balls], dtype=float)
+    island = np.array([-1 if ball.island is None else ball.island for ball in balls], dtype=np.int64)
+    pairs, woken = kernels.bounce_step(x, y, vx, vy, radius, island, dt, GRAVITY, ENERGY_LOSS,
+                                       float(PIXELS_PER_METER), float(WIDTH), float(HEIGHT - 20),
+                                       float(sleep.CONTACT_MARGIN), float(sleeper.sleep_speed))
+    for ball, bx, by, bvx, bvy in zip(balls, x.tolist(), y.tolist(), vx.tolist(), vy.tolist()):
+        ball.x, ball.y, ball.vx, ball.vy = bx, by, bvx, bvy
+    for woke in woken:
+        sleeper.wake(sleeper.islands[woke][0])
+    return [(balls[i], balls[j]) for i, j in pairs]
+
+def step():
+    # Advance every ball (sleeping balls are skipped)
+    contacts = None  # Touching pairs for the sleep islands, when the pass below collects them
+    if use_ccd:
+        ccd.step(balls, step_dt * dt_scale, box, GRAVITY, ENERGY_LOSS, PIXELS_PER_METER, sleep=sleeper)
+        for ball in balls:
+            if not ball.asleep:
+                ball.settle()
+    elif kernels.compiled():
+        contacts = bounce_compiled(step_dt * dt_scale)
+    else:
+        contacts = [] if sleeper.enabled else None
+        for i, ball in enumerate(balls):
+            if not ball.asleep:
+                ball.update(step_dt * dt_scale)
+            for j in range(i + 1, len(balls)):
+                other = balls[j]
+                if ball.asleep and other.asleep:
+                    continue
+                if contacts is not None and sleep.touching(ball, other):
+                    contacts.append((ball, other))
+                if (ball.asleep or other.asleep) and sleep.touching(ball, other, 0):
+                    awake, resting = (other, ball) if ball.asleep else (ball, other)
+                    if not sleeper.on_contact(awake, resting):
+                        sleep.static_response(awake, resting)
+                        continue
+                ball.check_collision(other)  # Check collision with other balls
+    if sleeper.enabled:
+        sleeper.update(balls, sleep.find_contacts(balls) if contacts is None else contacts, step_dt * dt_scale)
+    if history:
+        history.append(state())
+
+def state():
+    return {"position": [(ball.x, ball.y) for ball in balls], "velocity": [(ball.vx, ball.vy) for ball in balls]}
+
+def restore(state):
+    for ball, (x, y), (vx, vy) in zip(balls, state["position"].tolist(), state["velocity"].tolist()):
+        ball.x, ball.y, ball.vx, ball.vy = x, y, vx, vy
+
+if args.headless:
+    mode = "CCD" if use_ccd else f"discrete, {kernels.label()}"
+    headless.run(step, args, f"Bouncing balls ({len(balls)} balls, {mode}, DT x{dt_scale})", len(balls))
+    sys.exit()
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
+
+# Initialize pygame
+pygame.init()
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+clock = pygame.time.Clock()
+font = textcache.font(None, 24)
 
 # Simulation loop
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
+timestep = scheduler.from_args(args, step, state, restore)  # Fixed physics rate, drawn interpolated
 running = True
 while running:
+    phases.start("draw")
     screen.fill((255, 255, 255))
     
     # Draw ground
     pygame.draw.line(screen, (0, 0, 0), (0, HEIGHT - 20), (WIDTH, HEIGHT - 20), 3)
     
     # Display initial height in the corner
-    text = font.render(f"Initial Height: {initial_height_meters:.2f} m", True, (0, 0, 0))
+    phases.start("text")
+    text = textcache.render(font, f"Initial Height: {initial_height_meters:.2f} m", (0, 0, 0))
     screen.blit(text, (10, 10))
+    mode = "Continuous" if use_ccd else "Discrete"
+    text = textcache.render(font, f"{mode} collisions, DT x{dt_scale} (C: toggle, Up/Down: DT)", (0, 0, 0))
+    screen.blit(text, (10, 30))
+    sleeping_text = f"{sleeper.sleeping}/{len(balls)}" if sleeper.enabled else "off"
+    text = textcache.render(font, f"Sleeping: {sleeping_text} (S: toggle)", (0, 0, 0))
+    screen.blit(text, (10, 50))
+    status = playback.label() if playback else timestep.label()
+    screen.blit(textcache.render(font, status, (0, 0, 0)), (10, 70))
     
     # Update and draw balls
-    for i, ball in enumerate(balls):
-        ball.update()
-        for j in range(i + 1, len(balls)):
-            ball.check_collision(balls[j])  # Check collision with other balls
-        ball.draw()
+    phases.start("physics")
+    if playback:
+        restore(playback.advance())
+    else:
+        timestep.advance(clock.get_time() / 1000)
+        timestep.show_interpolated()
+    phases.start("balls")
+    draw_balls()
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
     
+    phases.start("flip")
     pygame.display.flip()
-    clock.tick(60)
+    phases.start("tick")
+    clock.tick(args.fps)
     
+    phases.start("events")
     for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        if playback:
+            playback.handle_event(event)
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_c:
+                use_ccd = not use_ccd
+            elif event.key == pygame.K_UP:
+                dt_scale = min(10, dt_scale + 1)
+            elif event.key == pygame.K_DOWN:
+                dt_scale = max(1, dt_scale - 1)
+            elif event.key == pygame.K_s:
+                sleeper.enabled = not sleeper.enabled
+                sleeper.wake_all()
+    phases.end_frame()
 
 pygame.quit()
 sys.exit()
\ No newline at end of file
@@ -1,5 +1,23 @@
-import pygame
+import argparse
 import math
+import sys
+
+from simcore import capture, circles, headless, profiler, scheduler, textcache, trajectory
+from simcore.double_pendulum import DoublePendulum
+
+parser = argparse.ArgumentParser(description="Chaotic double pendulum")
+parser.add_argument("--mass1", type=float, default=5, help="mass of the first bob (kg)")
+parser.add_argument("--mass2", type=float, default=10, help="mass of the second bob (kg)")
+parser.add_argument("--length1", type=float, default=10, help="length of the first arm (m)")
+parser.add_argument("--length2", type=float, default=10, help="length of the second arm (m)")
+parser.add_argument("--theta1", type=float, default=90, help="initial angle of the first arm (degrees)")
+parser.add_argument("--theta2", type=float, default=90, help="initial angle of the second arm (degrees)")
+headless.add_arguments(parser, steps=100_000)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+scheduler.add_arguments(parser)
+args = parser.parse_args()
 
 # Pygame setup
 WIDTH, HEIGHT = 800, 600
@@ -10,83 +28,99 @@ BLUE = (0, 0, 255)
 
 g = 9.81  # Gravity
 pixel_to_meter = 15  # 1 meter = 15 pixels
-length1_m = 10  # Length of first pendulum in meters
-length2_m = 10  # Length of second pendulum in meters
-length1 = length1_m * pixel_to_meter  # Convert to pixels
-length2 = length2_m * pixel_to_meter  # Convert to pixels
-mass1 = 5  # Mass of first bob
-mass2 = 10  # Mass of second bob
+length1_m = args.length1  # Length of first pendulum in meters
+length2_m = args.length2  # Length of second pendulum in meters
 
-theta1 = math.pi / 2  # Initial angle of first pendulum
-theta2 = math.pi / 2  # Initial angle of second pendulum
-omega1 = 0  # Angular velocity of first pendulum
-omega2 = 0  # Angular velocity of second pendulum
-dt = 0.05  # Time step
+# Lengths are passed in pixels, the unit the angular accelerations were tuned for;
+# a step is 0.05 time units at the default 60 steps per second
+pendulum = DoublePendulum(args.mass1, args.mass2, length1_m * pixel_to_meter, length2_m * pixel_to_meter,
+                          math.radians(args.theta1), math.radians(args.theta2), gravity=g,
+                          dt=0.05 * 60 / args.physics_hz)
 
-def calculate_acceleration(theta1, theta2, omega1, omega2):
-    num1 = -g * (2 * mass1 + mass2) * math.sin(theta1)
-    num2 = -mass2 * g * math.sin(theta1 - 2 * theta2)
-    num3 = -2 * math.sin(theta1 - theta2) * mass2
-    num4 = omega2**2 * length2 + omega1**2 * length1 * math.cos(theta1 - theta2)
-    den = length1 * (2 * mass1 + mass2 - mass2 * math.cos(2 * theta1 - 2 * theta2))
-    alpha1 = (num1 + num2 + num3 * num4) / den
-    
-    num5 = 2 * math.sin(theta1 - theta2)
-    num6 = (omega1**2 * length1 * (mass1 + mass2) + g * (mass1 + mass2) * math.cos(theta1))
-    num7 = omega2**2 * length2 * mass2 * math.cos(theta1 - theta2)
-    den2 = length2 * (2 * mass1 + mass2 - mass2 * math.cos(2 * theta1 - 2 * theta2))
-    alpha2 = (num5 * (num6 + num7)) / den2
-    
-    return alpha1, alpha2
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+headless.setup(args)
+history = trajectory.writer_from_args(args, {"theta": ((2,), "f8"), "omega": ((2,), "f8")},
+                                      script="Double Pendulum", dt=pendulum.dt)
+
+def state():
+    return {"theta": (pendulum.theta1, pendulum.theta2), "omega": (pendulum.omega1, pendulum.omega2)}
+
+def step():
+    pendulum.step()
+    if history:
+        history.append(state())
+
+def restore(state):
+    pendulum.theta1, pendulum.theta2 = state["theta"].tolist()
+    pendulum.omega1, pendulum.omega2 = state["omega"].tolist()
+
+if args.headless:
+    headless.run(step, args, "Double pendulum")
+    sys.exit()
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
 
 pygame.init()
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 clock = pygame.time.Clock()
-font = pygame.font.Font(None, 24)
+font = textcache.font(None, 24)
 
 origin = (WIDTH // 2, HEIGHT // 3)
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
+timestep = scheduler.from_args(args, step, state, restore)  # Fixed physics rate, drawn interpolated
 
 running = True
 while running:
-    screen.fill(WHITE)
-    
+    phases.start("events")
     for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        if playback:
+            playback.handle_event(event)
         if event.type == pygame.QUIT:
             running = False
     
-    # Compute accelerations
-    alpha1, alpha2 = calculate_acceleration(theta1, theta2, omega1, omega2)
+    phases.start("physics")
+    if playback:
+        restore(playback.advance())
+    else:
+        timestep.advance(clock.get_time() / 1000)
+        timestep.show_interpolated()
     
-    # Update velocities and angles
-    omega1 += alpha1 * dt
-    omega2 += alpha2 * dt
-    theta1 += omega1 * dt
-    theta2 += omega2 * dt
+    phases.start("draw")
+    screen.fill(WHITE)
     
     # Calculate bob positions
-    x1 = origin[0] + length1 * math.sin(theta1)
-    y1 = origin[1] + length1 * math.cos(theta1)
-    x2 = x1 + length2 * math.sin(theta2)
-    y2 = y1 + length2 * math.cos(theta2)
+    (x1, y1), (x2, y2) = pendulum.positions(origin)
     
     # Draw pendulums
     pygame.draw.line(screen, BLACK, origin, (x1, y1), 2)
-    pygame.draw.circle(screen, RED, (int(x1), int(y1)), 10)
     pygame.draw.line(screen, BLACK, (x1, y1), (x2, y2), 2)
-    pygame.draw.circle(screen, BLUE, (int(x2), int(y2)), 10)
+    circles.draw(screen, [(x1, y1)], 10, RED)
+    circles.draw(screen, [(x2, y2)], 10, BLUE)
     
     # Display text info
+    phases.start("text")
     info_text = [
         "Double Pendulum Chaos",
-        f"Mass1: {mass1} kg, Mass2: {mass2} kg",
-        f"Length1: {length1_m} m, Length2: {length2_m} m",
+        f"Mass1: {pendulum.mass1:g} kg, Mass2: {pendulum.mass2:g} kg",
+        f"Length1: {length1_m:g} m, Length2: {length2_m:g} m",
         f"Gravity: {g} m/s²"
     ]
-    for i, text in enumerate(info_text):
-        label = font.render(text, True, BLACK)
-        screen.blit(label, (10, 10 + i * 20))
+    screen.blit(textcache.block(font, info_text, BLACK), (10, 10))  # Composed once per set of lines
+    status = playback.label() if playback else timestep.label()
+    screen.blit(textcache.render(font, status, BLACK), (10, 10 + len(info_text) * 20))
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
     
+    phases.start("flip")
     pygame.display.flip()
-    clock.tick(60)
+    phases.start("tick")
+    clock.tick(args.fps)
+    phases.end_frame()
 
 pygame.quit()
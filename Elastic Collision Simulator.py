@@ -1,8 +1,13 @@
-import pygame
+import argparse
+import itertools
 import random
 import sys
 import math
 
+import numpy as np
+
+from simcore import capture, circles, contacts, gas_stats, headless, kernels, profiler, scheduler, sleep, sweep, textcache, trajectory
+
 # Constants
 WIDTH, HEIGHT = 800, 600
 GRAVITY = 9.8  # Acceleration due to gravity (m/s^2)
@@ -12,107 +17,447 @@ PIXELS_PER_METER = 50  # Scale: 1 meter = 50 pixels
 DT = 0.016  # Time step (seconds per frame, ~60 FPS)
 BALL_COLOR = (0, 0, 139)  # Dark blue
 BALL_RADIUS = 10  # Normal ball size
+SLEEP_COLOR = (150, 150, 200)  # Sleeping balls are drawn faded
+SOLVER_ITERATIONS = 4  # Sequential impulse iterations per frame, Up/Down to change
+DROP_COUNT = 200  # Balls added by pressing 'B'
+BALL_MASS = 1.0  # kg, of a ball of BALL_RADIUS (mass grows with the area)
+RESYNC_FRAMES = 300  # Full statistics pass every 5 s to cancel drift
 
-# Initialize pygame
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.DOUBLEBUF)
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 24)
+parser = argparse.ArgumentParser(description="Elastic collisions between falling balls")
+parser.add_argument("--height", type=float, default=5.0, help="initial height (m)")
+parser.add_argument("--balls", type=int, default=BALL_COUNT, help="number of balls")
+parser.add_argument("--solver", action="store_true", help="start with the warm-started contact solver")
+parser.add_argument("--gas", action="store_true", help="start in gas mode")
+parser.add_argument("--radii", type=float, nargs=2, default=(BALL_RADIUS, BALL_RADIUS), metavar=("MIN", "MAX"),
+                    help="ball radii are drawn uniformly from MIN..MAX pixels")
+parser.add_argument("--all-pairs", action="store_true",
+                    help="start with the all-pairs collision loop instead of the sweep-and-prune broad phase")
+parser.add_argument("--pile-benchmark", action="store_true", help="time the contact solver on a 10k-ball pile and exit")
+parser.add_argument("--log", metavar="PATH", help="stream per-frame energy, momentum and speed histogram to a .csv or .npy file")
+headless.add_arguments(parser)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+scheduler.add_arguments(parser)
+kernels.add_arguments(parser)
+args = parser.parse_args()
+if not 0 < args.radii[0] <= args.radii[1]:
+    parser.error("--radii needs 0 < MIN <= MAX")
+kernels.from_args(args)  # Compiled pairwise loop when Numba is installed
+DT = DT * 60 / args.physics_hz  # Seconds per physics step (0.016 at the default 60 steps per second)
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
+
+if args.pile_benchmark:
+    # Headless check: a 10k-ball pile must settle with few solver iterations
+    for iterations in (2, SOLVER_ITERATIONS, 8):
+        result = contacts.pile_benchmark(iterations=iterations, scale=PIXELS_PER_METER, dt=DT)
+        print(f"{result['balls']} balls, {iterations} iterations: {result['contacts']} contacts, "
+              f"{result['median_frame_ms']:.1f} ms/frame, max overlap {result['max_overlap_px']:.2f} px, "
+              f"mean speed {result['mean_speed']:.3f} m/s")
+    sys.exit()
+
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+if playback:
+    args.balls = playback.trajectory.rows("position")
+headless.setup(args)
+sleeper = sleep.SleepManager()  # Press 'S' to toggle sleeping of resting balls
+solver = contacts.ContactSolver(WIDTH, HEIGHT - 20, PIXELS_PER_METER, GRAVITY, SOLVER_ITERATIONS,
+                                restitution=ENERGY_LOSS, wall_restitution=ENERGY_LOSS)
+use_solver = args.solver  # Press 'I' to switch to the warm-started impulse solver
+gas_mode = args.gas  # Press 'G' for an ideal gas: no gravity, elastic walls and a ceiling
+sleeper.enabled = not gas_mode
+show_stats = True  # Press 'H' to toggle the statistics overlay
+use_sweep = not args.all_pairs  # Press 'P' to switch between sweep and prune and the all-pairs loop
+broad_phase = sweep.SweepAndPrune(sleep.CONTACT_MARGIN)
+pair_tests = 0  # Pairs whose distance the last collision pass computed
+stats = gas_stats.GasStatistics()
+stats_log = gas_stats.StatsLog(args.log, stats.columns()) if args.log else None
+
+# Radius of a new ball (no random draw when every ball has the same size)
+def ball_radius():
+    low, high = args.radii
+    return random.uniform(low, high) if high > low else low
 
 # Ball class
 class Ball:
-    def __init__(self, x, height_meters):
+    def __init__(self, x, height_meters, radius=BALL_RADIUS):
         self.x = x
         self.y = HEIGHT - (height_meters * PIXELS_PER_METER) - 20
-        self.radius = BALL_RADIUS
+        self.radius = radius
+        self.mass = BALL_MASS * (radius / BALL_RADIUS) ** 2
         self.color = BALL_COLOR
         self.vx = random.uniform(-3, 3)  # Random initial horizontal velocity in m/s
         self.vy = random.uniform(1, 5)  # Random initial vertical velocity in m/s
+        sleep.reset(self)
 
     def update(self):
-        # Apply gravity
-        self.vy += GRAVITY * DT
+        # Apply gravity (the statistics account for it in closed form)
+        gravity = 0.0 if gas_mode else GRAVITY
+        restitution = 1.0 if gas_mode else ENERGY_LOSS
+        self.vy += gravity * DT
         self.y += self.vy * PIXELS_PER_METER * DT
         self.x += self.vx * PIXELS_PER_METER * DT
+        old_vx, old_vy = self.vx, self.vy
         
         # Collision with ground
         if self.y + self.radius >= HEIGHT - 20:
             self.y = HEIGHT - 20 - self.radius
-            self.vy = -self.vy * ENERGY_LOSS  # Bounce with energy loss
+            self.vy = -self.vy * restitution  # Bounce with energy loss
+        
+        # Collision with the ceiling (gas mode only)
+        if gas_mode and self.y - self.radius <= 0:
+            self.y = self.radius
+            self.vy = abs(self.vy)
         
         # Collision with walls (left & right boundaries)
         if self.x - self.radius <= 0 or self.x + self.radius >= WIDTH:
-            self.vx = -self.vx * ENERGY_LOSS
+            self.vx = -self.vx * restitution
             self.x = max(self.radius, min(WIDTH - self.radius, self.x))
         
         # Stop the ball if velocity is very low
-        if abs(self.vy) < 0.5 and self.y >= HEIGHT - 20 - self.radius:
+        if not gas_mode and abs(self.vy) < 0.5 and self.y >= HEIGHT - 20 - self.radius:
             self.vy = 0
             self.vx *= 0.95  # Gradually stop horizontal motion
+        
+        if self.vx != old_vx or self.vy != old_vy:
+            stats.change(self, old_vx, old_vy)
 
-    def draw(self):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
+# Draw the balls with one batched call per color (sleeping balls are faded)
+def draw_balls():
+    groups = {}
+    for ball in balls:
+        groups.setdefault(SLEEP_COLOR if ball.asleep else ball.color, []).append(ball)
+    for color, group in groups.items():
+        circles.draw(screen, [(ball.x, ball.y) for ball in group], [ball.radius for ball in group], color)
 
-# Collision handling with momentum exchange
+# Collision handling with momentum exchange; returns touching pairs for the sleep islands
 def handle_collisions():
-    for i in range(len(balls)):
-        for j in range(i + 1, len(balls)):
-            dx = balls[j].x - balls[i].x
-            dy = balls[j].y - balls[i].y
-            distance = math.sqrt(dx**2 + dy**2)
+    global pair_tests
+    if kernels.compiled():
+        return collide_compiled()
+    if use_sweep:
+        # Only pairs whose boxes overlap, from the x order kept across frames
+        candidates = broad_phase.pairs([ball.x for ball in balls], [ball.y for ball in balls],
+                                       [ball.radius for ball in balls])
+        pair_tests = len(candidates)
+    else:
+        candidates = itertools.combinations(range(len(balls)), 2)
+        pair_tests = len(balls) * (len(balls) - 1) // 2
+    contacts = []
+    for i, j in candidates:
+        a, b = balls[i], balls[j]
+        if a.asleep and b.asleep:
+            continue  # Sleeping pairs cannot collide
+        dx = b.x - a.x
+        dy = b.y - a.y
+        distance = math.sqrt(dx**2 + dy**2)
+        
+        if distance < a.radius + b.radius + sleep.CONTACT_MARGIN:
+            contacts.append((a, b))
+        
+        if distance < a.radius + b.radius:  # Collision detected
+            if a.asleep or b.asleep:
+                # Slow contacts treat the sleeping ball as static, fast ones wake its island
+                awake, resting = (b, a) if a.asleep else (a, b)
+                woken = sleeper.on_contact(awake, resting)
+                if not woken:
+                    old_vx, old_vy = awake.vx, awake.vy
+                    sleep.static_response(awake, resting)
+                    stats.change(awake, old_vx, old_vy)
+                    continue
+                stats.wake(woken)
+            
+            old_a = a.vx, a.vy
+            old_b = b.vx, b.vy
             
-            if distance < balls[i].radius + balls[j].radius:  # Collision detected
-                angle = math.atan2(dy, dx)
-                
-                # Velocity components along the collision axis
-                v1_parallel = balls[i].vx * math.cos(angle) + balls[i].vy * math.sin(angle)
-                v2_parallel = balls[j].vx * math.cos(angle) + balls[j].vy * math.sin(angle)
-                
-                # Exchange velocities (elastic collision)
-                balls[i].vx += (v2_parallel - v1_parallel) * math.cos(angle)
-                balls[i].vy += (v2_parallel - v1_parallel) * math.sin(angle)
-                balls[j].vx += (v1_parallel - v2_parallel) * math.cos(angle)
-                balls[j].vy += (v1_parallel - v2_parallel) * math.sin(angle)
-                
-                # Push balls apart to prevent sticking
-                overlap = (balls[i].radius + balls[j].radius - distance) / 2
-                balls[i].x -= overlap * math.cos(angle)
-                balls[i].y -= overlap * math.sin(angle)
-                balls[j].x += overlap * math.cos(angle)
-                balls[j].y += overlap * math.sin(angle)
-
-# Get user input for height in meters
-initial_height_meters = float(input("Enter initial height (meters): "))
+            angle = math.atan2(dy, dx)
+            
+            # Velocity components along the collision axis
+            v1_parallel = a.vx * math.cos(angle) + a.vy * math.sin(angle)
+            v2_parallel = b.vx * math.cos(angle) + b.vy * math.sin(angle)
+            
+            # Elastic collision along the axis (equal masses exchange their components)
+            total = a.mass + b.mass
+            share_a = 2 * b.mass / total
+            share_b = 2 * a.mass / total
+            a.vx += (v2_parallel - v1_parallel) * share_a * math.cos(angle)
+            a.vy += (v2_parallel - v1_parallel) * share_a * math.sin(angle)
+            b.vx += (v1_parallel - v2_parallel) * share_b * math.cos(angle)
+            b.vy += (v1_parallel - v2_parallel) * share_b * math.sin(angle)
+            stats.change(a, *old_a)
+            stats.change(b, *old_b)
+            
+            # Push balls apart to prevent sticking (the lighter ball moves further)
+            overlap = a.radius + b.radius - distance
+            a.x -= overlap * (b.mass / total) * math.cos(angle)
+            a.y -= overlap * (b.mass / total) * math.sin(angle)
+            b.x += overlap * (a.mass / total) * math.cos(angle)
+            b.y += overlap * (a.mass / total) * math.sin(angle)
+    return contacts
+
+# handle_collisions() as one compiled loop (simcore.kernels), broad phase included
+def collide_compiled():
+    global pair_tests
+    x = np.array([ball.x for ball in balls], dtype=float)
+    y = np.array([ball.y for ball in balls], dtype=float)
+    vx = np.array([ball.vx for ball in balls], dtype=float)
+    vy = np.array([ball.vy for ball in balls], dtype=float)
+    radius = np.array([ball.radius for ball in balls], dtype=float)
+    mass = np.array([ball.mass for ball in balls], dtype=float)
+    island = np.array([-1 if ball.island is None else ball.island for ball in balls], dtype=np.int64)
+    if use_sweep:
+        first, second = broad_phase.pair_arrays(x, y, radius)
+        pair_tests = len(first)
+    else:
+        first = second = np.empty(0, dtype=np.int64)
+        pair_tests = len(balls) * (len(balls) - 1) // 2
+    old_vx, old_vy = vx.copy(), vy.copy()
+    pairs, woken = kernels.elastic_collisions(x, y, vx, vy, radius, mass, island, first, second, not use_sweep,
+                                              float(sleep.CONTACT_MARGIN), float(sleeper.sleep_speed))
+    for ball, bx, by, bvx, bvy in zip(balls, x.tolist(), y.tolist(), vx.tolist(), vy.tolist()):
+        ball.x, ball.y, ball.vx, ball.vy = bx, by, bvx, bvy
+    for woke in woken:
+        stats.wake(sleeper.wake(sleeper.islands[woke][0]))
+    for i in np.flatnonzero((vx != old_vx) | (vy != old_vy)).tolist():
+        stats.change(balls[i], old_vx[i], old_vy[i])
+    return [(balls[i], balls[j]) for i, j in pairs]
+
+# Advance all balls with the contact solver (gathered into arrays and written back)
+def solve_contacts():
+    x = np.array([ball.x for ball in balls], dtype=float)
+    y = np.array([ball.y for ball in balls], dtype=float)
+    vx = np.array([ball.vx for ball in balls], dtype=float)
+    vy = np.array([ball.vy for ball in balls], dtype=float)
+    radius = np.array([ball.radius for ball in balls], dtype=float)
+    mass = np.array([ball.mass for ball in balls], dtype=float)
+    solver.step(x, y, vx, vy, radius, mass, DT)
+    stats.measure(vx, vy, mass)
+    for ball, bx, by, bvx, bvy in zip(balls, x.tolist(), y.tolist(), vx.tolist(), vy.tolist()):
+        ball.x, ball.y, ball.vx, ball.vy = bx, by, bvx, bvy
+
+# Drop a block of balls from the top of the screen to build a pile
+def drop_balls():
+    largest = max(args.radii)
+    spacing = int(2 * largest) + 1
+    columns = int(WIDTH - 2 * largest) // spacing
+    for i in range(DROP_COUNT):
+        ball = Ball(largest + 1 + (i % columns) * spacing + random.uniform(-0.5, 0.5), 0, ball_radius())
+        ball.y = largest + (i // columns) * spacing
+        ball.vx = ball.vy = 0.0
+        balls.append(ball)
+        stats.add(ball)
+
+# Speed histogram with the Maxwell-Boltzmann expectation for the same temperature
+def draw_statistics():
+    left, top, width, height = WIDTH - 260, 100, 240, 100
+    pygame.draw.rect(screen, (0, 0, 0), (left, top, width, height), 1)
+    expected = stats.maxwell_boltzmann()
+    peak = max(1, int(stats.counts.max()), int(expected.max()))
+    bar = width / stats.bins
+    points = []
+    for i, (count, mb) in enumerate(zip(stats.counts.tolist(), expected.tolist())):
+        bar_height = height * count / peak
+        pygame.draw.rect(screen, (100, 149, 237), (left + i * bar, top + height - bar_height, max(1, bar - 1), bar_height))
+        points.append((left + (i + 0.5) * bar, top + height - height * mb / peak))
+    pygame.draw.lines(screen, (200, 0, 0), False, points, 2)
+    text = textcache.render(font, f"Speed 0-{stats.max_speed:.0f} m/s (red: Maxwell-Boltzmann)", (0, 0, 0))
+    screen.blit(text, (left - 60, top + height + 5))
+
+# Initial height in meters
+initial_height_meters = args.height
 
 # Create balls
-balls = [Ball(random.randint(50, WIDTH - 50), initial_height_meters) for _ in range(BALL_COUNT)]
+balls = [Ball(random.randint(50, WIDTH - 50), initial_height_meters, ball_radius()) for _ in range(args.balls)]
+stats.reset(balls)
+sim_time = 0.0
+frame = 0
+history = trajectory.writer_from_args(args, {"position": ((len(balls), 2), "f8"), "velocity": ((len(balls), 2), "f8")},
+                                      script="Elastic Collision", dt=DT)
+
+def step():
+    global sim_time, frame
+    if use_solver:
+        # Contact solver: no sleeping, every ball is integrated by the solver
+        phases.start("contact solver")
+        solve_contacts()
+    else:
+        # Handle ball collisions
+        phases.start("collisions")
+        pairs = handle_collisions()
+        
+        # Gravity changes every awake ball: update the totals in closed form and
+        # re-bin a slice of the balls for the histogram
+        if not gas_mode:
+            stats.apply_gravity(GRAVITY, DT)
+            stats.refresh(balls, len(balls) // 8 + 1)
+        
+        # Update balls (sleeping balls are skipped)
+        phases.start("integrate")
+        for ball in balls:
+            if not ball.asleep:
+                ball.update()
+        phases.start("sleep")
+        sleeping = sleeper.sleeping
+        sleeper.update(balls, pairs, DT)
+        if sleeper.sleeping > sleeping or frame % RESYNC_FRAMES == 0:
+            stats.reset(balls)  # Islands that fell asleep had their velocities zeroed
+    
+    sim_time += DT
+    frame += 1
+    if stats_log:
+        phases.start("log")
+        stats_log.write(stats.row(sim_time))
+    if history:
+        phases.start("record")
+        history.append({"position": [(ball.x, ball.y) for ball in balls],
+                        "velocity": [(ball.vx, ball.vy) for ball in balls]})
+
+def restore(state):
+    for ball, (x, y), (vx, vy) in zip(balls, state["position"].tolist(), state["velocity"].tolist()):
+        ball.x, ball.y, ball.vx, ball.vy = x, y, vx, vy
+    stats.reset(balls)
+
+# Only positions are interpolated for drawing, so the statistics are left alone
+def positions():
+    return {"position": [(ball.x, ball.y) for ball in balls]}
+
+def place(state):
+    for ball, (x, y) in zip(balls, state["position"].tolist()):
+        ball.x, ball.y = x, y
+
+# Broad phase of the pairwise collisions and the pair tests of the last pass against all pairs
+def broad_phase_label():
+    name = "sweep and prune" if use_sweep else "all pairs"
+    if kernels.compiled():
+        name += f", {kernels.label()}"
+    all_pairs = len(balls) * (len(balls) - 1) // 2
+    return f"Broad phase: {name} (P: toggle)  Pair tests: {pair_tests:,} of {all_pairs:,} pairs"
+
+if args.headless:
+    mode = "contact solver" if use_solver else f"pairwise, {kernels.label()}"
+    if not use_solver:
+        mode += ", sweep and prune" if use_sweep else ", all pairs"
+    tests = []
+    def counted_step():
+        step()
+        tests.append(pair_tests)
+    headless.run(counted_step, args, f"Elastic collisions ({len(balls)} balls, {mode})", len(balls))
+    if tests and not use_solver:
+        all_pairs = len(balls) * (len(balls) - 1) // 2
+        print(f"Pair tests per step: {sum(tests) / len(tests):,.0f} on average, all pairs: {all_pairs:,}")
+    if stats_log:
+        stats_log.close()
+    sys.exit()
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
+
+# Initialize pygame
+pygame.init()
+screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.DOUBLEBUF)
+clock = pygame.time.Clock()
+font = textcache.font(None, 24)
+
+timestep = scheduler.from_args(args, step, positions, place)  # Fixed physics rate, drawn interpolated
 
 # Simulation loop
 running = True
 while running:
+    phases.start("draw")
     screen.fill((255, 255, 255))
     
     # Draw ground
     pygame.draw.line(screen, (0, 0, 0), (0, HEIGHT - 20), (WIDTH, HEIGHT - 20), 3)
     
     # Display initial height in the corner
-    text = font.render(f"Initial Height: {initial_height_meters:.2f} m", True, (0, 0, 0))
+    phases.start("text")
+    text = textcache.render(font, f"Initial Height: {initial_height_meters:.2f} m", (0, 0, 0))
     screen.blit(text, (10, 10))
     
-    # Handle ball collisions
-    handle_collisions()
+    if use_solver:
+        solver_stats = solver.stats
+        warm = "on" if solver.warm_starting else "off"
+        info_text = [
+            f"Solver: impulses, {solver.iterations} iterations (Up/Down), warm start {warm} (W), I: toggle",
+            f"Balls: {len(balls)}  Contacts: {solver_stats['contacts']}  "
+            f"Warm started: {solver_stats['warm_started']}  Batches: {solver_stats['batches']}",
+            f"Broad phase: {solver_stats['broadphase_ms']:.2f} ms  Solver: {solver_stats['solver_ms']:.2f} ms  "
+            f"(B: drop balls)",
+        ]
+    else:
+        sleeping_text = f"{sleeper.sleeping}/{len(balls)}" if sleeper.enabled else "off"
+        info_text = [f"Sleeping: {sleeping_text} (S: toggle)  Solver: pairwise, {kernels.label()} (I: toggle, B: drop balls)"]
+        info_text.append(f"Gas mode: {'on' if gas_mode else 'off'} (G: no gravity, elastic walls and ceiling)")
+        info_text.append(broad_phase_label())
+    if show_stats:
+        info_text.append(f"Kinetic energy: {stats.kinetic:.2f} J  kT: {stats.temperature():.3f} J  (H: hide)")
+        info_text.append(f"Momentum: ({stats.momentum_x:.2f}, {stats.momentum_y:.2f}) kg m/s")
+        draw_statistics()
+    info_text.append(playback.label() if playback else timestep.label())
+    textcache.draw_lines(screen, font, info_text, (0, 0, 0), (10, 30))
     
     # Update and draw balls
-    for ball in balls:
-        ball.update()
-        ball.draw()
+    if playback:
+        phases.start("playback")
+        restore(playback.advance())
+    else:
+        timestep.advance(clock.get_time() / 1000)
+        timestep.show_interpolated()
+    phases.start("balls")
+    draw_balls()
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
     
+    phases.start("flip")
     pygame.display.flip()
-    clock.tick(60)
+    phases.start("tick")
+    clock.tick(args.fps)
     
+    phases.start("events")
     for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        if playback:
+            playback.handle_event(event)
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_s:
+                sleeper.enabled = not sleeper.enabled
+                sleeper.wake_all()
+                stats.reset(balls)
+            elif event.key == pygame.K_i:
+                use_solver = not use_solver
+                sleeper.wake_all()
+                stats.reset(balls)
+            elif event.key == pygame.K_g:
+                gas_mode = not gas_mode
+                use_solver = False
+                sleeper.enabled = not gas_mode
+                sleeper.wake_all()
+                stats.reset(balls)
+            elif event.key == pygame.K_h:
+                show_stats = not show_stats
+            elif event.key == pygame.K_p:
+                use_sweep = not use_sweep
+            elif event.key == pygame.K_w:
+                solver.warm_starting = not solver.warm_starting
+            elif event.key == pygame.K_UP:
+                solver.iterations += 1
+            elif event.key == pygame.K_DOWN:
+                solver.iterations = max(1, solver.iterations - 1)
+            elif event.key == pygame.K_b and not playback:
+                drop_balls()
+                if history:
+                    # The recording has a fixed number of balls
+                    history.close()
+                    history = None
+    phases.end_frame()
 
+if stats_log:
+    stats_log.close()
 pygame.quit()
 sys.exit()
@@ -1,16 +1,43 @@
-import pygame
-import pymunk
-import pymunk.pygame_util
-import numpy as np
+import argparse
 import math
-import random
+import sys
+
+import numpy as np
+
+from simcore import camera, capture, headless, kernels, physics_process, profiler, scheduler, textcache, trajectory
+from simcore.magnetic import DIPOLE_RANGE, IRON_RADIUS, MESH_SPACING, FilingArrays, FilingField, Magnet, compare_mesh
+
+parser = argparse.ArgumentParser(description="Iron filings in a magnetic field")
+parser.add_argument("--filings", type=int, default=1000, help="number of iron filings")
+parser.add_argument("--two-magnets", action="store_true", help="start with the second magnet")
+parser.add_argument("--flip", action="store_true", help="start with the magnets flipped")
+parser.add_argument("--engine", choices=("pymunk", "numpy"), default="pymunk",
+                    help="filing physics: pymunk bodies, or NumPy arrays (fast enough for tens of thousands)")
+parser.add_argument("--long-range", action="store_true",
+                    help=f"couple every pair of filings through an FFT particle mesh, not only those within "
+                         f"{DIPOLE_RANGE} px (NumPy engine)")
+parser.add_argument("--mesh-spacing", type=float, default=MESH_SPACING,
+                    help=f"particle mesh grid spacing in pixels (default {MESH_SPACING})")
+parser.add_argument("--mesh-check", action="store_true",
+                    help="after --steps steps, compare the cut-off and particle mesh dipole forces with direct "
+                         "summation over all pairs and exit (O(n^2): keep --filings small)")
+headless.add_arguments(parser, steps=20)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+physics_process.add_arguments(parser)
+scheduler.add_arguments(parser)
+kernels.add_arguments(parser)
+args = parser.parse_args()
+kernels.from_args(args)  # The pymunk engine's dipole loop is compiled when Numba is installed
+if args.physics_process and (args.record or args.play):
+    parser.error("--physics-process cannot be combined with --record or --play")
+if (args.long_range or args.mesh_check) and args.engine != "numpy":
+    parser.error("--long-range and --mesh-check need --engine numpy")
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
 
-# Initialize pygame
-pygame.init()
 WIDTH, HEIGHT = 1000, 800
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Magnetic Field Simulation with Iron Filings")
-clock = pygame.time.Clock()
 
 # Colors
 BACKGROUND = (0, 0, 0)
@@ -19,213 +46,163 @@ N_POLE_COLOR = (255, 0, 0)
 S_POLE_COLOR = (0, 0, 255)
 WHITE = (255, 255, 255)
 
-# Physics setup
-space = pymunk.Space()
-space.gravity = (0, 0)  # No gravity
-draw_options = pymunk.pygame_util.DrawOptions(screen)
+# Create magnets and iron filings
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+if playback:
+    metadata = playback.trajectory.metadata
+    args.filings = playback.trajectory.rows("position")
+    args.two_magnets, args.flip = metadata.get("two_magnets", False), metadata.get("flip", False)
+headless.setup(args)
+magnets = [
+    Magnet((WIDTH//2, HEIGHT//2), is_north_up=not args.flip)
+]
+if args.two_magnets:
+    magnets.append(Magnet((WIDTH//2 - 150, HEIGHT//2), is_north_up=args.flip))
+if args.engine == "numpy":
+    filing_field = FilingArrays(WIDTH, HEIGHT, args.filings, magnets, long_range=args.long_range,
+                                mesh_spacing=args.mesh_spacing)
+else:
+    filing_field = FilingField(WIDTH, HEIGHT, args.filings, magnets)
+magnets = filing_field.magnets  # The buttons add, remove and flip magnets in this list
+n_filings = len(filing_field)
+fields = {"position": ((n_filings, 2), "f8"), "angle": ((n_filings,), "f8")}
+history = trajectory.writer_from_args(args, fields, script="Magnetic Field", two_magnets=args.two_magnets,
+                                      flip=args.flip)
+
+def step():
+    phases.start("field forces")
+    filing_field.apply_field_forces()
+    phases.start("dipole forces")
+    filing_field.apply_dipole_forces()
+    
+    # Update physics
+    phases.start("integrate")
+    filing_field.integrate(1 / args.physics_hz)
+    if history:
+        phases.start("record")
+        history.append(filing_field.state())
+
+def restore(state):
+    filing_field.restore(state)
+
+if args.mesh_check:
+    for _ in range(args.steps):
+        step()
+    check = compare_mesh(filing_field)
+    print(f"Dipole forces of {check['filings']} filings after {args.steps} steps, against direct summation "
+          f"({check['direct_seconds'] * 1000:.0f} ms):")
+    print(f"  cut off at {DIPOLE_RANGE} px: {check['cut_off_error'] * 100:.2f}% RMS error "
+          f"({check['cut_off_seconds'] * 1000:.1f} ms)")
+    print(f"  particle mesh ({args.mesh_spacing:g} px): {check['mesh_error'] * 100:.2f}% RMS error "
+          f"({check['mesh_seconds'] * 1000:.1f} ms)")
+    sys.exit()
 
-# Constants
-IRON_RADIUS = 2
-IRON_MASS = 1
-MAGNET_STRENGTH = 5000
-DAMPING = 0.7  # Air resistance
-DIPOLE_STRENGTH = 10  # Strength of dipole-dipole interaction
+if args.headless:
+    engine_name = f"{args.engine}, long range" if args.long_range else args.engine
+    if args.engine == "pymunk":
+        engine_name += f", {kernels.label()}"
+    headless.run(step, args, f"Magnetic field ({n_filings} filings, {engine_name})", n_filings)
+    sys.exit()
+
+# Forked before the display opens; the window then only draws the engine's latest state
+physics = physics_process.from_args(args, filing_field, fields, 1 / args.physics_hz)
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
+
+# Initialize pygame
+pygame.init()
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+pygame.display.set_caption("Magnetic Field Simulation with Iron Filings")
+clock = pygame.time.Clock()
 
 # Create a background surface
 background = pygame.Surface((WIDTH, HEIGHT))
 background.fill(BACKGROUND)
 
-class Magnet:
-    def __init__(self, pos, strength=MAGNET_STRENGTH, width=100, height=30, is_north_up=True):
-        self.pos = pos
-        self.strength = strength
-        self.width = width
-        self.height = height
-        self.is_north_up = is_north_up
-        self.rect = pygame.Rect(
-            self.pos[0] - self.width/2,
-            self.pos[1] - self.height/2,
-            self.width,
-            self.height
-        )
-        
-    def get_field_at(self, pos):
-        """Calculate magnetic field vector at given position"""
-        dx = pos[0] - self.pos[0]
-        dy = pos[1] - self.pos[1]
-        distance_squared = dx*dx + dy*dy
-        
-        # Avoid division by zero
-        if distance_squared < 1:
-            distance_squared = 1
-            
-        # Simple inverse square law for field strength
-        strength = self.strength / distance_squared
-        
-        # Field direction depends on pole orientation
-        direction = 1 if self.is_north_up else -1
-        
-        # Calculate field components
-        if abs(dx) < self.width/2 and abs(dy) < self.height/2:
-            # Inside the magnet, field points straight up or down
-            return (0, direction * strength)
-        else:
-            # Outside the magnet, field curves from north to south
-            r = math.sqrt(distance_squared)
-            # Simplified dipole field
-            fx = 3 * dx * dy * strength / (r**5) * direction
-            fy = strength * (3 * dy * dy / (r**5) - 1 / (r**3)) * direction
-            
-            # Normalize and scale
-            mag = math.sqrt(fx*fx + fy*fy)
-            if mag > 0:
-                fx = fx / mag * strength
-                fy = fy / mag * strength
-                
-            return (fx, fy)
+def draw_magnet(magnet, surface):
+    # Draw magnet body
+    rect = pygame.Rect(magnet.bounds)
+    pygame.draw.rect(surface, WHITE, rect, 2)
     
-    def draw(self, surface):
-        # Draw magnet body
-        pygame.draw.rect(surface, WHITE, self.rect, 2)
-        
-        # Draw N and S poles
-        n_rect = pygame.Rect(
-            self.pos[0] - self.width/2,
-            self.pos[1] - self.height/2 if self.is_north_up else self.pos[1],
-            self.width,
-            self.height/2
-        )
-        
-        s_rect = pygame.Rect(
-            self.pos[0] - self.width/2,
-            self.pos[1] if self.is_north_up else self.pos[1] - self.height/2,
-            self.width,
-            self.height/2
-        )
-        
-        n_color = N_POLE_COLOR if self.is_north_up else S_POLE_COLOR
-        s_color = S_POLE_COLOR if self.is_north_up else N_POLE_COLOR
-        
-        pygame.draw.rect(surface, n_color, n_rect)
-        pygame.draw.rect(surface, s_color, s_rect)
-        
-        # Label poles
-        font = pygame.font.SysFont('Arial', 20, bold=True)
-        n_text = font.render("N", True, WHITE)
-        s_text = font.render("S", True, WHITE)
-        
-        n_pos = (self.pos[0], self.pos[1] - self.height/4 if self.is_north_up else self.pos[1] + self.height/4)
-        s_pos = (self.pos[0], self.pos[1] + self.height/4 if self.is_north_up else self.pos[1] - self.height/4)
-        
-        surface.blit(n_text, (n_pos[0] - n_text.get_width()/2, n_pos[1] - n_text.get_height()/2))
-        surface.blit(s_text, (s_pos[0] - s_text.get_width()/2, s_pos[1] - s_text.get_height()/2))
-        return self.rect
+    # Draw N and S poles
+    n_rect = pygame.Rect(
+        magnet.pos[0] - magnet.width/2,
+        magnet.pos[1] - magnet.height/2 if magnet.is_north_up else magnet.pos[1],
+        magnet.width,
+        magnet.height/2
+    )
+    
+    s_rect = pygame.Rect(
+        magnet.pos[0] - magnet.width/2,
+        magnet.pos[1] if magnet.is_north_up else magnet.pos[1] - magnet.height/2,
+        magnet.width,
+        magnet.height/2
+    )
+    
+    n_color = N_POLE_COLOR if magnet.is_north_up else S_POLE_COLOR
+    s_color = S_POLE_COLOR if magnet.is_north_up else N_POLE_COLOR
+    
+    pygame.draw.rect(surface, n_color, n_rect)
+    pygame.draw.rect(surface, s_color, s_rect)
+    
+    # Label poles (the font and both letters are created once and cached)
+    font = textcache.font('Arial', 20, bold=True)
+    n_text = textcache.render(font, "N", WHITE)
+    s_text = textcache.render(font, "S", WHITE)
+    
+    n_pos = (magnet.pos[0], magnet.pos[1] - magnet.height/4 if magnet.is_north_up else magnet.pos[1] + magnet.height/4)
+    s_pos = (magnet.pos[0], magnet.pos[1] + magnet.height/4 if magnet.is_north_up else magnet.pos[1] - magnet.height/4)
+    
+    surface.blit(n_text, (n_pos[0] - n_text.get_width()/2, n_pos[1] - n_text.get_height()/2))
+    surface.blit(s_text, (s_pos[0] - s_text.get_width()/2, s_pos[1] - s_text.get_height()/2))
+    return rect
 
-class IronFiling(pygame.sprite.DirtySprite):
-    def __init__(self, pos):
+class IronFilingSprite(pygame.sprite.DirtySprite):
+    """Draws one simcore.magnetic.Filing as a short line along its dipole"""
+    def __init__(self, filing):
         pygame.sprite.DirtySprite.__init__(self)
-        self.body = pymunk.Body(IRON_MASS, pymunk.moment_for_circle(IRON_MASS, 0, IRON_RADIUS))
-        self.body.position = pos
-        self.shape = pymunk.Circle(self.body, IRON_RADIUS)
-        self.shape.friction = 0.5
-        self.shape.elasticity = 0.1
-        
-        # Add damping to simulate air resistance
-        self.body.velocity_func = self.damping_velocity_func
-        
-        # Dipole moment - initially random
-        self.dipole_angle = random.uniform(0, 2*math.pi)
-        self.dipole_strength = DIPOLE_STRENGTH
+        self.filing = filing
         
         # For dirty sprite
         self.image = pygame.Surface((IRON_RADIUS*4, IRON_RADIUS*4), pygame.SRCALPHA)
-        self.rect = self.image.get_rect(center=pos)
+        self.rect = self.image.get_rect(center=filing.body.position)
         self.dirty = 2  # Always dirty
-        
-        # Add to space
-        space.add(self.body, self.shape)
-    
-    def damping_velocity_func(self, body, gravity, damping, dt):
-        # Custom damping function
-        pymunk.Body.update_velocity(body, gravity, DAMPING, dt)
-    
-    def apply_magnetic_force(self, field_vector):
-        # Calculate torque to align with field
-        field_angle = math.atan2(field_vector[1], field_vector[0])
-        angle_diff = ((field_angle - self.dipole_angle + math.pi) % (2*math.pi)) - math.pi
-        
-        # Torque is proportional to sine of angle difference
-        torque = self.dipole_strength * math.sin(angle_diff) * 5
-        self.body.angular_velocity += torque
-        
-        # Update dipole angle based on body rotation
-        self.dipole_angle = (self.dipole_angle + self.body.angular_velocity * 0.1) % (2*math.pi)
-        
-        # Apply force in direction of field gradient
-        field_strength = math.sqrt(field_vector[0]**2 + field_vector[1]**2)
-        force_scale = field_strength * 0.5
-        force = (field_vector[0] * force_scale, field_vector[1] * force_scale)
-        self.body.apply_force_at_local_point(force, (0, 0))
-    
-    def apply_dipole_interaction(self, other):
-        # Calculate vector between filings
-        dx = other.body.position.x - self.body.position.x
-        dy = other.body.position.y - self.body.position.y
-        r_squared = dx*dx + dy*dy
-        
-        if r_squared < 1:
-            return  # Avoid division by zero
-        
-        # Calculate dipole-dipole interaction force
-        r = math.sqrt(r_squared)
-        
-        # Get unit vector in direction of other filing
-        nx = dx / r
-        ny = dy / r
-        
-        # Calculate dot products of dipole orientations with separation vector
-        dot1 = nx * math.cos(self.dipole_angle) + ny * math.sin(self.dipole_angle)
-        dot2 = nx * math.cos(other.dipole_angle) + ny * math.sin(other.dipole_angle)
-        
-        # Calculate dipole-dipole interaction (simplified)
-        strength = (3 * dot1 * dot2 - math.cos(self.dipole_angle - other.dipole_angle)) / (r_squared * r)
-        strength *= self.dipole_strength * other.dipole_strength * 0.01
-        
-        force = (nx * strength, ny * strength)
-        self.body.apply_force_at_local_point(force, (0, 0))
     
     def update(self):
         # Update sprite position based on physics body
-        self.rect.center = (int(self.body.position.x), int(self.body.position.y))
+        position = self.filing.body.position
+        self.rect.center = (int(position.x), int(position.y))
         
         # Clear the image
         self.image.fill((0, 0, 0, 0))
         
         # Draw the filing as a small line oriented along its dipole
+        angle = self.filing.dipole_angle
         center = (self.image.get_width()//2, self.image.get_height()//2)
-        end_x = center[0] + IRON_RADIUS * 2 * math.cos(self.dipole_angle)
-        end_y = center[1] + IRON_RADIUS * 2 * math.sin(self.dipole_angle)
+        end_x = center[0] + IRON_RADIUS * 2 * math.cos(angle)
+        end_y = center[1] + IRON_RADIUS * 2 * math.sin(angle)
         pygame.draw.line(self.image, IRON_COLOR, center, (end_x, end_y), 2)
 
-# Create magnets
-magnets = [
-    Magnet((WIDTH//2, HEIGHT//2), is_north_up=True)
-]
+LINE_STEPS = np.arange(IRON_RADIUS * 2 + 1)  # Pixels along a filing, from its centre
 
-# Create iron filings sprite group
-filings_group = pygame.sprite.LayeredDirty()
-filings = []
+def draw_filing_arrays(surface):
+    """The NumPy engine's filings as the sprites' 2 px lines, plotted in bulk"""
+    position = np.floor(filing_field.position)
+    direction = np.column_stack((np.cos(filing_field.angle), np.sin(filing_field.angle)))
+    points = position[:, None] + LINE_STEPS[None, :, None] * direction[:, None]
+    # The second pixel of the width goes across the line's main axis, as pygame draws wide lines
+    across = np.where(np.abs(direction[:, 1:]) > np.abs(direction[:, :1]), (1, 0), (0, 1))
+    points = np.concatenate((points, points + across[:, None])).reshape(-1, 2)
+    camera.plot_points(surface, points, IRON_COLOR)
 
-# Create 1000 iron filings
-for _ in range(1000):
-    x = random.uniform(100, WIDTH-100)
-    y = random.uniform(100, HEIGHT-100)
-    filing = IronFiling((x, y))
-    filings.append(filing)
-    filings_group.add(filing)
+# Iron filings sprite group (the NumPy engine has no filing objects and draws them in bulk)
+sprites = args.engine == "pymunk"
+filings_group = pygame.sprite.LayeredDirty(*(IronFilingSprite(filing) for filing in filing_field.filings)
+                                           if sprites else ())
 
 # Create UI elements
-font = pygame.font.SysFont('Arial', 20)
+font = textcache.font('Arial', 20)
 font_surface = font.render("Press F to toggle field lines", True, WHITE).convert_alpha()
 
 # Create buttons
@@ -241,6 +218,9 @@ clear_text = font.render("Reset Filings", True, WHITE).convert_alpha()
 # Create field line surface
 field_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
 
+# Fixed physics rate, drawn interpolated (dipole angles turn the short way round)
+timestep = scheduler.from_args(args, step, filing_field.state, restore, wrap=("angle",))
+
 # Main loop
 running = True
 show_field_lines = False
@@ -253,7 +233,12 @@ pygame.display.flip()
 while running:
     dirty_rects = []
     
+    phases.start("events")
     for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        if playback:
+            playback.handle_event(event)
         if event.type == pygame.QUIT:
             running = False
         elif event.type == pygame.KEYDOWN:
@@ -270,57 +255,55 @@ while running:
                 else:
                     # Remove second magnet
                     magnets.pop()
+                if physics:
+                    physics.call("set_magnets", list(magnets))
                 dirty_rects.append(pygame.Rect(0, 0, WIDTH, HEIGHT))  # Full screen update needed
             
             elif flip_magnet_button.collidepoint(mouse_pos):
                 # Flip the orientation of all magnets
                 for magnet in magnets:
                     magnet.is_north_up = not magnet.is_north_up
+                if physics:
+                    physics.call("set_magnets", list(magnets))
                 dirty_rects.append(pygame.Rect(0, 0, WIDTH, HEIGHT))  # Full screen update needed
             
-            elif clear_button.collidepoint(mouse_pos):
+            elif clear_button.collidepoint(mouse_pos) and physics:
+                # The engine process scatters the new filings; they arrive with its next state
+                physics.call("clear")
+                physics.call("add_filings", args.filings)
+            
+            elif clear_button.collidepoint(mouse_pos) and not playback:
                 # Remove all filings and create new ones
-                for filing in filings:
-                    space.remove(filing.body, filing.shape)
-                filings.clear()
+                if history:
+                    # The recording belongs to the old filings
+                    history.close()
+                    history = None
+                filing_field.clear()
                 filings_group.empty()
-                
-                for _ in range(1000):
-                    x = random.uniform(100, WIDTH-100)
-                    y = random.uniform(100, HEIGHT-100)
-                    filing = IronFiling((x, y))
-                    filings.append(filing)
-                    filings_group.add(filing)
+                added = filing_field.add_filings(args.filings)
+                if sprites:
+                    for filing in added:
+                        filings_group.add(IronFilingSprite(filing))
                 dirty_rects.append(pygame.Rect(0, 0, WIDTH, HEIGHT))  # Full screen update needed
     
-    # Calculate total field at each filing position
-    for filing in filings:
-        total_field = [0, 0]
-        for magnet in magnets:
-            field = magnet.get_field_at(filing.body.position)
-            total_field[0] += field[0]
-            total_field[1] += field[1]
-        
-        filing.apply_magnetic_force(total_field)
-    
-    # Apply dipole-dipole interactions between nearby filings (using spatial partitioning)
-    for i, filing1 in enumerate(filings):
-        pos1 = filing1.body.position
-        # Only check filings that haven't been checked yet
-        for filing2 in filings[i+1:]:
-            pos2 = filing2.body.position
-            dist_squared = (pos1.x - pos2.x)**2 + (pos1.y - pos2.y)**2
-            if dist_squared < 100:  # Only interact with nearby filings
-                filing1.apply_dipole_interaction(filing2)
-                filing2.apply_dipole_interaction(filing1)
-    
-    # Update physics
-    space.step(1/60.0)
+    if physics:
+        phases.start("physics state")
+        state = physics.latest()
+        if state:
+            restore(state)
+    elif playback:
+        phases.start("playback")
+        restore(playback.advance())
+    else:
+        timestep.advance(clock.get_time() / 1000)
+        timestep.show_interpolated()
     
     # Update sprites
+    phases.start("sprites")
     filings_group.update()
     
     # Draw background
+    phases.start("draw")
     screen.blit(background, (0, 0))
     dirty_rects.append(pygame.Rect(0, 0, WIDTH, HEIGHT))
     
@@ -345,11 +328,14 @@ while running:
         screen.blit(field_surface, (0, 0))
     
     # Draw filings using dirty sprite group
-    filings_group.draw(screen)
+    if sprites:
+        filings_group.draw(screen)
+    else:
+        draw_filing_arrays(screen)
     
     # Draw magnets
     for magnet in magnets:
-        rect = magnet.draw(screen)
+        rect = draw_magnet(magnet, screen)
         dirty_rects.append(rect)
     
     # Draw buttons
@@ -362,10 +348,24 @@ while running:
     screen.blit(clear_text, (clear_button.x + 40, clear_button.y + 10))
     
     # Display instructions
+    phases.start("text")
     screen.blit(font_surface, (20, 20))
+    if playback:
+        screen.blit(textcache.render(font, playback.label(), WHITE), (20, HEIGHT - 40))
+    elif physics:
+        screen.blit(textcache.render(font, physics.label(), WHITE), (20, HEIGHT - 40))
+    else:
+        screen.blit(textcache.render(font, timestep.label(), WHITE), (20, HEIGHT - 40))
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
     
     # Update only dirty rectangles
+    phases.start("flip")
     pygame.display.update(dirty_rects)
-    clock.tick(60)
+    phases.start("tick")
+    clock.tick(args.fps)
+    phases.end_frame()
 
 pygame.quit()
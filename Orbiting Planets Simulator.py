@@ -1,11 +1,34 @@
-import pygame
-import math
+import argparse
+import sys
+
+import numpy as np
+
+from simcore import camera, capture, circles, headless, profiler, scheduler, textcache, trajectory
+from simcore.orbits import PLANETS, SolarSystem
+
+parser = argparse.ArgumentParser(description="Planets orbiting the Sun")
+parser.add_argument("--time-step", type=float, default=3600, help="simulated seconds per step")
+parser.add_argument("--asteroids", type=int, default=0, help="small bodies to add in the asteroid belt")
+parser.add_argument("--particles", type=int, default=0,
+                    help="massless test particles in the asteroid belt, kept in NumPy arrays (1,000,000 is fine)")
+parser.add_argument("--particle-dtype", choices=("float64", "float32"), default="float64",
+                    help="precision of the test particles (float32 halves their memory)")
+parser.add_argument("--block-timesteps", action="store_true",
+                    help="give every body its own power-of-two multiple of the time step")
+headless.add_arguments(parser, steps=100_000)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+scheduler.add_arguments(parser)
+args = parser.parse_args()
 
 # Constants
 WIDTH, HEIGHT = 1920, 1080
-G = 6.67430e-11  # Gravitational constant
-SCALE = 2.5e9  # Increased scale to make outer planets visible (1 pixel = SCALE meters)
-TIME_STEP = 3600  # Time step in seconds (1 hour)
+SCALE = 2.5e9  # Increased scale to make outer planets visible (1 pixel = SCALE meters at zoom 1)
+POINT_RADIUS = 3  # Bodies drawn this small (pixels) or smaller are plotted as single pixels
+LABEL_RADIUS = 4  # Names are shown for bodies drawn at least this large
+LABEL_MARGIN = 25  # Room above a body for its name when culling
+TIME_STEP = args.time_step * 60 / args.physics_hz  # Time step in seconds (1 hour at 60 steps per second)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -19,6 +42,61 @@ BROWN = (139, 69, 19)
 BLACK = (0, 0, 0)
 TURQUOISE = (64, 224, 208)  # New color for Uranus
 DARK_BLUE = (0, 0, 139)  # Darker blue for Neptune to distinguish from Earth
+PARTICLE_COLOR = (110, 110, 110)
+
+PLANET_COLORS = {
+    "Sun": YELLOW, "Mercury": GRAY, "Venus": ORANGE, "Earth": BLUE, "Mars": RED,
+    "Jupiter": BROWN, "Saturn": LIGHT_BLUE, "Uranus": TURQUOISE, "Neptune": DARK_BLUE,
+}
+
+# Create Sun and Planets (plus an optional asteroid belt between Mars and Jupiter)
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+if playback:
+    args.asteroids = playback.trajectory.rows("position") - len(PLANETS)
+    if "particles" in playback.trajectory.fields:
+        shape, dtype = playback.trajectory.fields["particles"]
+        args.particles, args.particle_dtype = shape[1], dtype.name
+headless.setup(args)
+system = SolarSystem(args.asteroids, args.particles, args.particle_dtype, args.block_timesteps)
+particles = system.particles
+if particles is not None:
+    print(f"{len(particles):,} test particles ({args.particle_dtype}): {particles.bytes_per_particle} bytes each, "
+          f"{particles.nbytes / 2**20:.1f} MB")
+# Planet and asteroid state vectors; the Sun stays at the origin
+n_bodies = len(system.planets)
+fields = {"position": ((n_bodies, 2), "f8"), "velocity": ((n_bodies, 2), "f8")}
+if particles is not None:
+    fields["particles"] = ((4, len(particles)), particles.dtype)  # Rows x, y, vx, vy
+history = trajectory.writer_from_args(args, fields, script="Orbiting Planets", dt=TIME_STEP)
+
+def state():
+    # Test particles are left out: they are drawn as single pixels, where interpolation does not show
+    return {"position": [(body.x, body.y) for body in system.planets],
+            "velocity": [(body.vx, body.vy) for body in system.planets]}
+
+def step():
+    system.step(TIME_STEP)
+    if history:
+        if particles is not None:
+            history.append({**state(), "particles": particles.state})
+        else:
+            history.append(state())
+
+def restore(state):
+    for body, (x, y), (vx, vy) in zip(system.planets, state["position"].tolist(), state["velocity"].tolist()):
+        body.x, body.y, body.vx, body.vy = x, y, vx, vy
+    if "particles" in state:
+        particles.state[...] = state["particles"]
+
+if args.headless:
+    headless.run(step, args, f"Orbiting planets ({len(system)} bodies)", len(system))
+    if args.block_timesteps:
+        print(f"Block timesteps: {system.force_evaluations / system.ticks:.1f} force evaluations per step "
+              f"(shared step: {len(system.planets)}), bodies per level {system.level_counts()}")
+    sys.exit()
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
 
 class Button:
     def __init__(self, x, y, width, height, text, color, hover_color):
@@ -33,7 +111,7 @@ class Button:
         pygame.draw.rect(screen, color, self.rect, 0, 5)
         pygame.draw.rect(screen, WHITE, self.rect, 2, 5)
         
-        text_surf = font.render(self.text, True, WHITE)
+        text_surf = textcache.render(font, self.text, WHITE)
         text_rect = text_surf.get_rect(center=self.rect.center)
         screen.blit(text_surf, text_rect)
         
@@ -44,95 +122,78 @@ class Button:
     def is_clicked(self, pos, click):
         return self.rect.collidepoint(pos) and click
 
-class Planet:
-    def __init__(self, x, y, mass, radius, color, name, vx=0, vy=0):
-        self.x = x
-        self.y = y
-        self.mass = mass
-        self.radius = max(radius, 3)  # Ensure minimum visibility
-        self.color = color
-        self.name = name
-        self.vx = vx
-        self.vy = vy
-        self.ax = 0
-        self.ay = 0
-    
-    def update_position(self):
-        # Update velocity based on acceleration
-        self.vx += self.ax * TIME_STEP
-        self.vy += self.ay * TIME_STEP
-        # Update position based on velocity
-        self.x += self.vx * TIME_STEP
-        self.y += self.vy * TIME_STEP
-    
-    def apply_gravity(self, other):
-        dx = other.x - self.x
-        dy = other.y - self.y
-        r = math.sqrt(dx**2 + dy**2)
-        
-        if r < self.radius + other.radius:
-            return  # Prevent extreme forces in case of collision
-        
-        force = G * self.mass * other.mass / r**2
-        ax = force / self.mass * (dx / r)
-        ay = force / self.mass * (dy / r)
-        
-        self.ax += ax
-        self.ay += ay
+def draw_body(body, screen, font, x, y, radius):
+    """Rings and name of a body; draw_bodies() draws the discs themselves in batches"""
+    # Draw rings for Uranus (simplified representation)
+    if body.name == "Uranus":
+        ring_color = (200, 200, 255)  # Light blue-white for rings
+        pygame.draw.ellipse(screen, ring_color, (x - radius*1.8, y - radius/3, 
+                                               radius*3.6, radius/1.5), 1)
     
-    def draw(self, screen, font):
-        x = WIDTH // 2 + int(self.x / SCALE)
-        y = HEIGHT // 2 + int(self.y / SCALE)
-        
-        # Draw the planet
-        pygame.draw.circle(screen, self.color, (x, y), self.radius)
-        
-        # Draw rings for Uranus (simplified representation)
-        if self.name == "Uranus":
-            ring_color = (200, 200, 255)  # Light blue-white for rings
-            pygame.draw.ellipse(screen, ring_color, (x - self.radius*1.8, y - self.radius/3, 
-                                                   self.radius*3.6, self.radius/1.5), 1)
-        
-        # Draw planet name
-        text = font.render(self.name, True, WHITE)
-        text_rect = text.get_rect(center=(x, y - self.radius - 15))
+    # Draw planet name once it is large enough on screen
+    if body.name and radius >= LABEL_RADIUS:
+        text = textcache.render(font, body.name, WHITE)
+        text_rect = text.get_rect(center=(x, y - radius - 15))
         screen.blit(text, text_rect)
 
+def draw_bodies(screen, font):
+    """Draw the bodies in view: tiny ones as pixels in bulk, the rest as batched circles; returns the counts"""
+    plotted = culled = 0
+    if particles is not None:
+        plotted = camera.plot_points(screen, view.project_visible(particles.x, particles.y), PARTICLE_COLOR)
+        culled = len(particles) - plotted
+    count = len(bodies)
+    points = view.project(np.column_stack((np.fromiter([body.x for body in bodies], float, count),
+                                           np.fromiter([body.y for body in bodies], float, count))))
+    radii = body_radii * min(view.zoom, 1.0)  # Markers shrink when zooming out, but never grow
+    in_view = view.visible(points, radii + LABEL_MARGIN)
+    tiny = in_view & (radii <= POINT_RADIUS)
+    camera.plot_points(screen, points[tiny], body_pixels[tiny])
+    detailed = np.flatnonzero(in_view & ~tiny)
+    groups = {}
+    for i in detailed.tolist():
+        groups.setdefault(body_colors[i], []).append(i)
+    for color, group in groups.items():
+        circles.draw(screen, points[group], radii[group], color)
+    for i, (x, y), radius in zip(detailed.tolist(), points[detailed].tolist(), radii[detailed].tolist()):
+        draw_body(bodies[i], screen, font, x, y, radius)
+    return len(detailed), plotted + int(tiny.sum()), culled + len(bodies) - int(in_view.sum())
+
 # Initialize pygame
 pygame.init()
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Orbiting Planets Simulation")
 clock = pygame.time.Clock()
-font = pygame.font.SysFont('Arial', 16)
-button_font = pygame.font.SysFont('Arial', 20, bold=True)
+font = textcache.font('Arial', 16)
+button_font = textcache.font('Arial', 20, bold=True)
+
+# Camera over the system; the Sun is last so it is drawn over the planets
+view = camera.Camera((WIDTH, HEIGHT), SCALE)
+bodies = system.planets + [system.sun]
+body_radii = np.array([body.radius for body in bodies], dtype=float)
+body_colors = [PLANET_COLORS.get(body.name, GRAY) for body in bodies]
+body_pixels = np.array([screen.map_rgb(color) for color in body_colors], dtype=np.int64)
 
 # Create exit button
 exit_button = Button(WIDTH - 120, 20, 100, 40, "EXIT", RED, (200, 0, 0))
 
-# Create Sun and Planets
-sun = Planet(0, 0, 1.989e30, 15, YELLOW, "Sun")
-mercury = Planet(5.79e10, 0, 3.285e23, 5, GRAY, "Mercury", 0, 47.87e3)
-venus = Planet(1.082e11, 0, 4.867e24, 7, ORANGE, "Venus", 0, 35.02e3)
-earth = Planet(1.496e11, 0, 5.972e24, 8, BLUE, "Earth", 0, 29.78e3)
-mars = Planet(2.279e11, 0, 6.39e23, 6, RED, "Mars", 0, 24.07e3)
-jupiter = Planet(7.785e11, 0, 1.898e27, 12, BROWN, "Jupiter", 0, 13.07e3)
-saturn = Planet(1.429e12, 0, 5.683e26, 10, LIGHT_BLUE, "Saturn", 0, 9.69e3)
-
-# Adjusted distances for Uranus and Neptune to fit on screen
-uranus = Planet(1.8e12, 0, 8.681e25, 11, TURQUOISE, "Uranus", 0, 6.81e3)
-neptune = Planet(2.2e12, 0, 1.024e26, 9, DARK_BLUE, "Neptune", 0, 5.43e3)
-
-planets = [mercury, venus, earth, mars, jupiter, saturn, uranus, neptune]
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
+timestep = scheduler.from_args(args, step, state, restore)  # Fixed physics rate, drawn interpolated
 
 running = True
 while running:
-    screen.fill(BLACK)
-    
     # Handle events
+    phases.start("events")
     mouse_pos = pygame.mouse.get_pos()
     mouse_click = False
     
     for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        view.handle_event(event)
+        if playback:
+            playback.handle_event(event)
         if event.type == pygame.QUIT:
             running = False
         elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -145,19 +206,35 @@ while running:
         running = False
     
     # Update and draw planets
-    for planet in planets:
-        planet.ax, planet.ay = 0, 0  # Reset acceleration
-        planet.apply_gravity(sun)  # Apply Sun's gravity
-        planet.update_position()
-        planet.draw(screen, font)
-    
-    # Draw sun
-    sun.draw(screen, font)
+    phases.start("physics")
+    if playback:
+        restore(playback.advance())
+    else:
+        timestep.advance(clock.get_time() / 1000)
+        timestep.show_interpolated()
+    phases.start("draw")
+    screen.fill(BLACK)
+    drawn, plotted, culled = draw_bodies(screen, font)
     
     # Draw exit button
+    phases.start("text")
     exit_button.draw(screen, button_font)
+    status = playback.label() if playback else timestep.label()
+    screen.blit(textcache.render(font, status, WHITE), (20, HEIGHT - 30))
+    detail = f"{view.label()}  Drawn: {drawn}, as pixels: {plotted}, culled: {culled}"
+    if args.block_timesteps and system.ticks:
+        detail += (f"  Block timesteps: bodies per level {system.level_counts()}, "
+                   f"{system.force_evaluations / system.ticks:.1f} force evaluations per step")
+    screen.blit(textcache.render(font, detail, WHITE), (20, HEIGHT - 50))
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
     
+    phases.start("flip")
     pygame.display.flip()
-    clock.tick(60)
+    phases.start("tick")
+    clock.tick(args.fps)
+    phases.end_frame()
     
 pygame.quit()
@@ -1,15 +1,73 @@
-import pygame
 import math
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from simcore.propagator import OscillatorPropagator
+from simcore import capture, circles, headless, pendulum_sweep, profiler, scheduler, textcache, trajectory
+from simcore.pendulum import PendulumEnsemble, drag_benchmark, stokes_damping
+
+parser = argparse.ArgumentParser(description="Damped pendulum with air resistance")
+parser.add_argument("--sweep", action="store_true",
+                    help="run a batch parameter sweep instead of the interactive window")
+parser.add_argument("--angles", type=float, nargs=3, default=(5, 85, 10), metavar=("MIN", "MAX", "N"),
+                    help="initial angle grid in degrees")
+parser.add_argument("--masses", type=float, nargs=3, default=(0.5, 5, 10), metavar=("MIN", "MAX", "N"),
+                    help="mass grid in kg")
+parser.add_argument("--lengths", type=float, nargs=3, default=(0.5, 3, 10), metavar=("MIN", "MAX", "N"),
+                    help="length grid in meters")
+parser.add_argument("--dampings", type=float, nargs=3, default=(0, 0.5, 10), metavar=("MIN", "MAX", "N"),
+                    help="linear drag coefficient grid in kg/s")
+parser.add_argument("--duration", type=float, default=20.0, help="simulated seconds per run")
+parser.add_argument("--csv", help="write the sweep results to this CSV file")
+parser.add_argument("--drag-benchmark", action="store_true",
+                    help="time the quadratic drag model and check its energy dissipation")
+parser.add_argument("--angle", type=float, help="initial angle in degrees (skips the input screen)")
+parser.add_argument("--mass", type=float, help="bob mass in kg (skips the input screen)")
+parser.add_argument("--mode", choices=("euler", "propagator", "drag"), default="euler",
+                    help="integrator to start with")
+parser.add_argument("--ensemble", type=int, default=1,
+                    help="pendulums advanced together by the drag model (the first one is drawn)")
+headless.add_arguments(parser, steps=100_000)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+scheduler.add_arguments(parser)
+args = parser.parse_args()
+
+if args.drag_benchmark:
+    for dt in (1 / 60, 1 / 240):
+        result = drag_benchmark(dt=dt)
+        print(f"dt = 1/{round(1 / dt)} s: {result['pendulums']} pendulums, "
+              f"{result['steps_per_second']:,.0f} steps/s "
+              f"({result['pendulum_steps_per_second']:,.0f} pendulum-steps/s), "
+              f"energy dissipated {result['dissipated_fraction'] * 100:.1f}%, "
+              f"max dissipation error vs reference {result['max_relative_dissipation_error']:.2e}")
+    sys.exit()
+
+if args.sweep:
+    grids = [np.linspace(lo, hi, int(n)) for lo, hi, n in
+             (args.angles, args.masses, args.lengths, args.dampings)]
+    start = time.perf_counter()
+    result = pendulum_sweep.sweep(*grids, duration=args.duration)
+    elapsed = time.perf_counter() - start
+    print(f"{len(result['period'])} runs in {elapsed:.2f} s ({result['cached']} from cache)")
+    print(f"Period: {np.nanmin(result['period']):.3f} - {np.nanmax(result['period']):.3f} s")
+    print(f"Decay constant: {np.nanmin(result['decay']):.4f} - {np.nanmax(result['decay']):.4f} 1/s")
+    if args.csv:
+        pendulum_sweep.write_csv(result, args.csv)
+        print(f"Results written to {args.csv}")
+    sys.exit()
 
 # Pygame setup
 WIDTH, HEIGHT = 800, 600
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 24)  # Font for displaying text
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+headless.setup(args)
 
 # Pendulum properties
 origin = (WIDTH // 2, 100)  # Fixed pivot point
@@ -18,11 +76,17 @@ length = 200  # Length of the pendulum
 gravity = 9.80  # Gravity
 damping = 0.02  # Air resistance factor
 
+# Physical drag model (seconds and meters)
+FPS = 60
+PHYSICS_DT = 1 / 240  # Fixed timestep in seconds, independent of the frame rate
+PIXELS_PER_METER = 100  # Scale: 1 meter = 100 pixels
+BOB_RADIUS = 0.15  # Bob radius in meters (matches the 15 px circle)
+
 # User input fields
 input_active = True
-angle_deg = 45  # Default angle
-mass = 10  # Default mass
-start_simulation = False
+angle_deg = 45 if args.angle is None else args.angle  # Default angle
+mass = 10 if args.mass is None else args.mass  # Default mass
+start_simulation = args.angle is not None or args.mass is not None or args.headless or playback is not None
 
 # Initialize physics variables
 def update_angle(value):
@@ -34,6 +98,76 @@ update_angle(angle_deg)
 angular_velocity = 0  # Initial angular velocity
 angular_acceleration = 0  # Initial angular acceleration
 
+# Integrators: per-frame Euler, exact small-angle propagator, or linear + quadratic air drag
+mode = args.mode
+
+# Euler and the propagator work in 60 Hz frames; a physics step can be a fraction of one
+step_seconds = 1 / args.physics_hz
+frames_per_step = step_seconds * FPS
+
+# Small-angle limit: angle'' = -(gravity / length) * angle - damping * angle', in frame units
+propagator = OscillatorPropagator(gravity / length, 1, damping, frames_per_step)
+
+# Stokes (linear) plus quadratic drag on a sphere, advanced in seconds
+drag_model = PendulumEnsemble(np.full(max(1, args.ensemble), angle), length / PIXELS_PER_METER, mass=mass,
+                              damping=stokes_damping(BOB_RADIUS), gravity=gravity,
+                              bob_radius=BOB_RADIUS)
+time_accumulator = 0.0
+drag_state = None  # (angle, angular_velocity) the drag model last handed back
+history = trajectory.writer_from_args(args, {"angle": ((), "f8"), "angular_velocity": ((), "f8")},
+                                      script="Pendulum Air Resistance", mode=mode, mass=mass)
+
+def state():
+    return {"angle": angle, "angular_velocity": angular_velocity}
+
+def step(frame_time=step_seconds):
+    """Advance the pendulum by frame_time seconds (one physics step)"""
+    global angle, angular_velocity, angular_acceleration, time_accumulator, drag_state
+    if mode == "propagator":
+        propagator.set_parameters(gravity / length, 1, damping, frames_per_step)
+        angle, angular_velocity = propagator.step((angle, angular_velocity))
+    elif mode == "drag":
+        # Run the finer fixed drag steps that fit in this step (angular_velocity is kept per frame)
+        if drag_model.mass[0] != mass:
+            drag_model.mass[:] = mass
+            drag_model.update_coefficients()
+        if (angle, angular_velocity) != drag_state:
+            # Started, reset, replayed or switched to drag mode: every member restarts from this state
+            drag_model.angle[:] = angle
+            drag_model.angular_velocity[:] = angular_velocity * FPS
+        time_accumulator += min(frame_time, 0.25)
+        while time_accumulator >= PHYSICS_DT:
+            drag_model.step(PHYSICS_DT)
+            time_accumulator -= PHYSICS_DT
+        angle = float(drag_model.angle[0])  # The first member is the one drawn
+        angular_velocity = float(drag_model.angular_velocity[0]) / FPS
+        drag_state = (angle, angular_velocity)
+    else:
+        force_gravity = -gravity * math.sin(angle) / length  # Torque equation
+        angular_acceleration = force_gravity - damping * angular_velocity  # Adding air resistance
+        angular_velocity += angular_acceleration * frames_per_step  # Update velocity
+        angle += angular_velocity * frames_per_step  # Update angle
+    if history:
+        history.append(state())
+
+def restore(state):
+    global angle, angular_velocity
+    angle, angular_velocity = float(state["angle"]), float(state["angular_velocity"])
+
+if args.headless:
+    # One step is 1 / --physics-hz seconds of simulated time (a 60 Hz frame by default)
+    size = len(drag_model) if mode == "drag" else 1
+    headless.run(step, args, f"Pendulum ({mode}, {size} pendulum{'s' if size != 1 else ''})", size)
+    sys.exit()
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
+
+pygame.init()
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+clock = pygame.time.Clock()
+font = textcache.font(None, 24)  # Font for displaying text
+
 # Input box setup
 input_box_angle = pygame.Rect(200, 250, 140, 32)
 input_box_mass = pygame.Rect(200, 300, 140, 32)
@@ -46,11 +180,17 @@ active_angle = False
 active_mass = False
 text_angle = str(angle_deg)
 text_mass = str(mass)
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
+timestep = scheduler.from_args(args, step, state, restore)  # Fixed physics rate, drawn interpolated
 
 while True:
-    screen.fill(WHITE)
-    
+    phases.start("events")
     for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        if playback:
+            playback.handle_event(event)
         if event.type == pygame.QUIT:
             pygame.quit()
             exit()
@@ -65,6 +205,7 @@ while True:
                 start_simulation = True
                 update_angle(float(text_angle))
                 mass = float(text_mass)
+                timestep.snap()
             elif exit_button.collidepoint(event.pos):
                 start_simulation = False
                 angular_velocity = 0
@@ -92,53 +233,74 @@ while True:
                     text_mass = text_mass[:-1]
                 else:
                     text_mass += event.unicode
+            elif event.key == pygame.K_p:
+                mode = "euler" if mode == "propagator" else "propagator"
+            elif event.key == pygame.K_d:
+                mode = "euler" if mode == "drag" else "drag"
+                time_accumulator = 0.0
     
+    phases.start("draw")
+    screen.fill(WHITE)
     if not start_simulation:
         pygame.draw.rect(screen, color_active if active_angle else color_inactive, input_box_angle, 2)
         pygame.draw.rect(screen, color_active if active_mass else color_inactive, input_box_mass, 2)
         pygame.draw.rect(screen, BLACK, start_button)
         
-        angle_surface = font.render(text_angle, True, BLACK)
-        mass_surface = font.render(text_mass, True, BLACK)
-        button_text = font.render("Start", True, WHITE)
+        angle_surface = textcache.render(font, text_angle, BLACK)
+        mass_surface = textcache.render(font, text_mass, BLACK)
+        button_text = textcache.render(font, "Start", WHITE)
         
         screen.blit(angle_surface, (input_box_angle.x + 5, input_box_angle.y + 5))
         screen.blit(mass_surface, (input_box_mass.x + 5, input_box_mass.y + 5))
         screen.blit(button_text, (start_button.x + 50, start_button.y + 10))
         
-        screen.blit(font.render("Enter Initial Angle:", True, BLACK), (50, 255))
-        screen.blit(font.render("Enter Mass:", True, BLACK), (50, 305))
+        screen.blit(textcache.render(font, "Enter Initial Angle:", BLACK), (50, 255))
+        screen.blit(textcache.render(font, "Enter Mass:", BLACK), (50, 305))
     
     if start_simulation:
         # Physics calculations
-        force_gravity = -gravity * math.sin(angle) / length  # Torque equation
-        angular_acceleration = force_gravity - damping * angular_velocity  # Adding air resistance
-        angular_velocity += angular_acceleration  # Update velocity
-        angle += angular_velocity  # Update angle
+        phases.start("physics")
+        if playback:
+            restore(playback.advance())
+        else:
+            timestep.advance(clock.get_time() / 1000)
+            timestep.show_interpolated()
         
         # Calculate bob position
+        phases.start("draw")
         bob_x = origin[0] + length * math.sin(angle)
         bob_y = origin[1] + length * math.cos(angle)
         bob_pos = (int(bob_x), int(bob_y))
         
         # Draw pendulum
         pygame.draw.line(screen, BLACK, origin, bob_pos, 2)
-        pygame.draw.circle(screen, BLACK, bob_pos, 15)
+        circles.draw(screen, [bob_pos], 15, BLACK)
         
         # Display text info
+        phases.start("text")
         info_text = [
             f"Mass: {mass} kg",
             f"Damping: {damping}",
-            f"Initial Angle: {angle_deg}°"
+            f"Initial Angle: {angle_deg}°",
+            {"euler": "Integrator: Euler",
+             "propagator": "Integrator: Small-angle propagator",
+             "drag": f"Integrator: Air drag RK4, dt = {PHYSICS_DT * 1000:.1f} ms"}[mode],
+            "P: Propagator  D: Air drag model"
         ]
-        for i, text in enumerate(info_text):
-            label = font.render(text, True, BLACK)
-            screen.blit(label, (10, 10 + i * 20))
+        info_text.append(playback.label() if playback else timestep.label())
+        textcache.draw_lines(screen, font, info_text, BLACK, (10, 10))
     
     # Draw the exit button (always visible)
     pygame.draw.rect(screen, BLACK, exit_button)
-    exit_text = font.render("Exit", True, WHITE)
+    exit_text = textcache.render(font, "Exit", WHITE)
     screen.blit(exit_text, (exit_button.x + 50, exit_button.y + 10))
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
     
+    phases.start("flip")
     pygame.display.flip()
-    clock.tick(60)
+    phases.start("tick")
+    clock.tick(args.fps)
+    phases.end_frame()
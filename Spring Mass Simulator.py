@@ -1,5 +1,22 @@
-import pygame
+import argparse
 import math
+import sys
+
+from simcore import capture, headless, profiler, scheduler, textcache, trajectory
+from simcore.propagator import OscillatorPropagator
+
+parser = argparse.ArgumentParser(description="Damped mass on a spring")
+parser.add_argument("--k", type=float, default=0.05, help="spring constant")
+parser.add_argument("--mass", type=float, default=2, help="mass of the object")
+parser.add_argument("--damping", type=float, default=0.02, help="fraction of the velocity lost per frame")
+parser.add_argument("--stretch", type=float, default=20, help="initial displacement (pixels)")
+parser.add_argument("--propagator", action="store_true", help="start with the exact propagator")
+headless.add_arguments(parser, steps=100_000)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+scheduler.add_arguments(parser)
+args = parser.parse_args()
 
 # Pygame setup
 WIDTH, HEIGHT = 800, 600
@@ -8,44 +25,98 @@ BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 
 g = 9.8  # Gravity
-k = 0.05  # Spring constant
-mass = 2  # Mass of the object
-damping = 0.02  # Damping factor
+k = args.k  # Spring constant
+mass = args.mass  # Mass of the object
+damping = args.damping  # Damping factor
 
 y_equilibrium = HEIGHT // 3  # Equilibrium position
 velocity = 0
 acceleration = 0
-stretch = 20  # Initial displacement
+stretch = args.stretch  # Initial displacement
+use_propagator = args.propagator  # Advance with the exact transition matrix instead of Euler steps
+frames_per_step = 60 / args.physics_hz  # The units are per 60 Hz frame; a step can be a fraction of one
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
-font = pygame.font.Font(None, 24)
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+headless.setup(args)
+history = trajectory.writer_from_args(args, {"stretch": ((), "f8"), "velocity": ((), "f8")},
+                                      script="Spring Mass Simulator", k=k, mass=mass, damping=damping)
+
+# The Euler loop multiplies velocity by (1 - damping) once per frame, which is a
+# damping force of mass * -ln(1 - damping) per frame, so one frame is dt = 1 here
+propagator = OscillatorPropagator(k, mass, -mass * math.log(1 - damping), frames_per_step, force=mass * g)
 
 def reset_system():
     global stretch, velocity
     stretch = 50  # Reset displacement
     velocity = 0
 
+def state():
+    return {"stretch": stretch, "velocity": velocity}
+
+def step():
+    global stretch, velocity, acceleration
+    if use_propagator:
+        # Only rebuilds the matrix if k, mass or damping changed
+        propagator.set_parameters(k, mass, -mass * math.log(1 - damping), frames_per_step, force=mass * g)
+        stretch, velocity = propagator.step((stretch, velocity))
+    else:
+        force_spring = -k * stretch  # Hooke's Law: F = -k * x
+        force_gravity = mass * g
+        net_force = force_spring + force_gravity
+        acceleration = net_force / mass
+        velocity += acceleration * frames_per_step
+        velocity *= (1 - damping) ** frames_per_step  # Apply damping
+        stretch += velocity * frames_per_step
+    if history:
+        history.append(state())
+
+def restore(state):
+    global stretch, velocity
+    stretch, velocity = float(state["stretch"]), float(state["velocity"])
+
+if args.headless:
+    headless.run(step, args, "Spring mass (" + ("propagator" if use_propagator else "Euler") + ")")
+    sys.exit()
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
+
+pygame.init()
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+clock = pygame.time.Clock()
+font = textcache.font(None, 24)
+
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
+timestep = scheduler.from_args(args, step, state, restore)  # Fixed physics rate, drawn interpolated
+
 running = True
 while running:
-    screen.fill(WHITE)
-    
+    phases.start("events")
     for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        if playback:
+            playback.handle_event(event)
         if event.type == pygame.QUIT:
             running = False
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_r:  # Press 'R' to reset the system
                 reset_system()
+                timestep.snap()
+            elif event.key == pygame.K_p:  # Press 'P' to toggle the exact propagator
+                use_propagator = not use_propagator
     
     # Physics calculations
-    force_spring = -k * stretch  # Hooke's Law: F = -k * x
-    force_gravity = mass * g
-    net_force = force_spring + force_gravity
-    acceleration = net_force / mass
-    velocity += acceleration
-    velocity *= (1 - damping)  # Apply damping
-    stretch += velocity
+    phases.start("physics")
+    if playback:
+        restore(playback.advance())
+    else:
+        timestep.advance(clock.get_time() / 1000)
+        timestep.show_interpolated()
+    
+    phases.start("draw")
+    screen.fill(WHITE)
     
     # Ball position
     ball_y = y_equilibrium + stretch
@@ -56,17 +127,26 @@ while running:
     pygame.draw.circle(screen, RED, (ball_x, int(ball_y)), 20)
     
     # Display text info
+    phases.start("text")
     info_text = [
         f"Spring Constant: {k}",
         f"Mass: {mass} kg",
         f"Damping: {damping}",
-        f"Press 'R' to Reset"
+        f"Integrator: {'Exact propagator' if use_propagator else 'Euler'}",
+        f"Press 'R' to Reset, 'P' to toggle propagator"
     ]
-    for i, text in enumerate(info_text):
-        label = font.render(text, True, BLACK)
-        screen.blit(label, (10, 10 + i * 20))
+    screen.blit(textcache.block(font, info_text, BLACK), (10, 10))  # Composed once per set of lines
+    status = playback.label() if playback else timestep.label()
+    screen.blit(textcache.render(font, status, BLACK), (10, 10 + len(info_text) * 20))
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
     
+    phases.start("flip")
     pygame.display.flip()
-    clock.tick(60)
+    phases.start("tick")
+    clock.tick(args.fps)
+    phases.end_frame()
 
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,167 @@
+import argparse
+import sys
+
+import numpy as np
+
+from simcore import capture, headless, profiler, scheduler, spring_network, textcache, trajectory
+
+parser = argparse.ArgumentParser(description="Implicit mass-spring networks")
+parser.add_argument("--scene", type=int, choices=(1, 2, 3), default=1, help="1 = cloth, 2 = rope, 3 = jelly")
+parser.add_argument("--stiffness", type=float, default=1e5, help="spring constant (N/m)")
+parser.add_argument("--benchmark", action="store_true", help="time the solver on large cloths and exit")
+headless.add_arguments(parser, steps=300)
+profiler.add_arguments(parser)
+capture.add_arguments(parser)
+trajectory.add_arguments(parser)
+scheduler.add_arguments(parser, rate=30)
+args = parser.parse_args()
+playback = trajectory.setup(args)  # --play replays a recording instead of simulating
+if playback:
+    args.scene, args.stiffness = playback.trajectory.metadata["scene"], playback.trajectory.metadata["stiffness"]
+    playback.speed = playback.trajectory.metadata["dt"] * args.fps  # Recorded steps per frame in real time
+
+# Pygame setup
+WIDTH, HEIGHT = 800, 600
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+GRAY = (120, 120, 120)
+
+PIXELS_PER_METER = 40  # Scale: 1 meter = 40 pixels
+DT = 1 / args.physics_hz  # Physics timestep in seconds (two display frames by default)
+FLOOR = (HEIGHT - 20) / PIXELS_PER_METER  # Ground height in meters
+
+stiffness = args.stiffness  # Spring constant (N/m)
+scene = args.scene  # 1 = cloth, 2 = rope, 3 = jelly
+
+
+def build_scene():
+    if scene == 1:
+        return spring_network.cloth(40, 30, width=10.0, height=7.5, origin=(5.0, 1.0),
+                                    stiffness=stiffness, floor=FLOOR)
+    if scene == 2:
+        return spring_network.rope(120, length=8.0, origin=(6.0, 2.0),
+                                   stiffness=stiffness, floor=FLOOR)
+    return spring_network.jelly(20, 20, width=4.0, height=4.0, origin=(8.0, 2.0),
+                                stiffness=stiffness, damping=0.5, floor=FLOOR)
+
+
+if args.benchmark:
+    for result in spring_network.benchmark():
+        print(f"{result['nodes']:>7} nodes, {result['springs']:>7} springs ({result['backend']}): "
+              f"{result['node_steps_per_second']:,.0f} node-steps/s")
+    sys.exit()
+
+headless.setup(args)
+
+network = build_scene()
+history = trajectory.writer_from_args(args, {"x": ((network.n, 2), "f8"), "v": ((network.n, 2), "f8")},
+                                      script="Spring Network", scene=scene, stiffness=stiffness, dt=DT)
+
+
+def state():
+    return {"x": network.x.copy(), "v": network.v.copy()}
+
+
+def step():
+    network.step(DT)
+    if history:
+        history.append({"x": network.x, "v": network.v})
+
+
+def restore(state):
+    network.x[:] = state["x"]
+    network.v[:] = state["v"]
+
+
+if args.headless:
+    headless.run(step, args, f"Spring network ({network.n} nodes)", network.n)
+    sys.exit()
+
+# The display is only needed from here on, so headless runs never import pygame
+import pygame
+
+pygame.init()
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+pygame.display.set_caption("Spring Network Simulation")
+clock = pygame.time.Clock()
+font = textcache.font(None, 24)
+
+phases = profiler.from_args(args)  # F3: frame profiler, F4: record a trace
+recorder = capture.from_args(args)  # F5: record the frames
+timestep = scheduler.from_args(args, step, state, restore)  # Fixed physics rate, drawn interpolated
+
+running = True
+while running:
+    phases.start("events")
+    for event in pygame.event.get():
+        phases.handle_event(event)
+        recorder.handle_event(event)
+        if event.type == pygame.QUIT:
+            running = False
+        elif playback:
+            playback.handle_event(event)  # The recorded scene cannot be changed
+        elif event.type == pygame.KEYDOWN:
+            if event.key in (pygame.K_1, pygame.K_2, pygame.K_3):
+                scene = event.key - pygame.K_0
+                network = build_scene()
+                timestep.snap()
+            elif event.key == pygame.K_r:  # Press 'R' to reset the scene
+                network = build_scene()
+                timestep.snap()
+            elif event.key == pygame.K_UP:
+                stiffness *= 10
+                network.set_stiffness(stiffness)
+            elif event.key == pygame.K_DOWN:
+                stiffness = max(10.0, stiffness / 10)
+                network.set_stiffness(stiffness)
+            if history and network.n != history.fields["x"][0][0]:
+                history.close()  # The recording keeps the node count it started with
+                history = None
+
+    phases.start("physics")
+    if playback:
+        restore(playback.advance())
+    else:
+        timestep.advance(clock.get_time() / 1000)
+        timestep.show_interpolated()
+
+    # Draw ground
+    phases.start("draw")
+    screen.fill(WHITE)
+    pygame.draw.line(screen, BLACK, (0, HEIGHT - 20), (WIDTH, HEIGHT - 20), 3)
+
+    # Draw springs between neighbouring nodes only (shear and bend springs are hidden)
+    points = (network.x * PIXELS_PER_METER).tolist()
+    length = np.linalg.norm(network.x[network.i] - network.x[network.j], axis=1)
+    visible = network.rest < 1.1 * network.rest.min()
+    for i, j in zip(network.i[visible].tolist(), network.j[visible].tolist()):
+        pygame.draw.line(screen, GRAY, points[i], points[j], 1)
+    for index in np.flatnonzero(~network.free).tolist():
+        pygame.draw.circle(screen, RED, (int(points[index][0]), int(points[index][1])), 5)
+
+    # Display text info
+    phases.start("text")
+    info_text = [
+        f"Nodes: {network.n}, Springs: {network.spring_count}",
+        f"Spring Constant: {stiffness:.0e} N/m",
+        f"Max Stretch: {np.max(length / network.rest - 1) * 100:.2f}%",
+        "1: Cloth  2: Rope  3: Jelly  Up/Down: Stiffness  R: Reset"
+    ]
+    if playback:
+        info_text[-1] = playback.label()
+    else:
+        info_text.append(timestep.label())
+    textcache.draw_lines(screen, font, info_text, BLACK, (10, 10))
+    phases.start("capture")
+    recorder.capture(screen)
+    phases.draw(screen)
+    timestep.show_current()
+
+    phases.start("flip")
+    pygame.display.flip()
+    phases.start("tick")
+    clock.tick(args.fps)
+    phases.end_frame()
+
+pygame.quit()
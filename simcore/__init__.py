@@ -0,0 +1,13 @@
+"""Shared simulation code used by the simulator scripts.
+
+The modules in this package hold the physics engines; the top-level
+scripts only handle the pygame window, input and drawing. No engine
+imports pygame, and pymunk is only imported once a pymunk world is built,
+so the engines can be imported and stepped without a display:
+
+    from simcore.orbits import SolarSystem
+
+    system = SolarSystem(asteroids=100)
+    for _ in range(24 * 365):
+        system.step(3600)
+"""
@@ -0,0 +1,265 @@
+"""Cross-simulator benchmark suite.
+
+Each case runs one simulator script headlessly (see simcore.headless) in a
+fresh process at several problem sizes and collects the median step time,
+its variance and the peak memory of the process:
+
+    python -m simcore.benchmark run --out results.json
+    python -m simcore.benchmark compare baseline.json results.json
+    python -m simcore.benchmark plot results.json --out scaling.png
+    python -m simcore.benchmark coldstart
+
+Every size is run a few times with a fixed seed. `run` also prints the
+scaling exponent of every case, the slope of log(median step time)
+against log(size): about 1 for linear engines and about 2 for all-pairs
+loops such as handle_collisions(). `compare` exits with status 1 when a
+case got slower than the threshold allows and none of its repeats was as
+fast as the slowest baseline repeat. `plot` needs matplotlib.
+
+`coldstart` measures the time from launching each script headlessly to
+the end of its first physics step, and checks that every engine module
+imports without pulling in pygame.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGRESSION_THRESHOLD = 0.15  # Relative slowdown of the median step time that counts as a regression
+REPEATS = 3  # Runs per size; the run with the middle median step time is kept
+
+SCRIPTS = (
+    "Bouncing Ball Simulator.py", "Double Pendulum.py", "Elastic Collision Simulator.py",
+    "Magnetic Field Simulator.py", "Orbiting Planets Simulator.py", "Pendulum Air Resistance.py",
+    "Spring Mass Simulator.py", "Spring Network Simulator.py", "Tower Collapse Simulator.py",
+)
+ENGINES = (
+    "simcore.ccd", "simcore.contacts", "simcore.double_pendulum", "simcore.gas_stats", "simcore.kernels",
+    "simcore.magnetic", "simcore.orbits", "simcore.pendulum", "simcore.propagator", "simcore.sleep",
+    "simcore.spring_network", "simcore.sweep", "simcore.tower",
+)
+
+# name: (script, size flag, sizes, steps per run, extra arguments)
+CASES = {
+    "bouncing_balls": ("Bouncing Ball Simulator.py", "--balls", (10, 20, 40, 80, 160, 320), 200, ()),
+    "bouncing_balls_dt5": ("Bouncing Ball Simulator.py", "--balls", (10, 20, 40, 80, 160, 320), 200,
+                           ("--dt-scale", "5")),
+    "elastic_pairwise": ("Elastic Collision Simulator.py", "--balls", (25, 50, 100, 200, 400), 200, ()),
+    "elastic_all_pairs": ("Elastic Collision Simulator.py", "--balls", (25, 50, 100, 200, 400), 200, ("--all-pairs",)),
+    "elastic_solver": ("Elastic Collision Simulator.py", "--balls", (250, 1000, 4000), 100, ("--solver",)),
+    "magnetic_filings": ("Magnetic Field Simulator.py", "--filings", (125, 250, 500, 1000), 10, ()),
+    "magnetic_filings_numpy": ("Magnetic Field Simulator.py", "--filings", (1000, 5000, 20000, 50000), 10,
+                               ("--engine", "numpy")),
+    "magnetic_filings_mesh": ("Magnetic Field Simulator.py", "--filings", (1000, 5000, 20000), 10,
+                              ("--engine", "numpy", "--long-range")),
+    "tower_blocks": ("Tower Collapse Simulator.py", "--layers", (5, 10, 20, 40), 500, ()),
+    "orbit_bodies": ("Orbiting Planets Simulator.py", "--asteroids", (0, 100, 1000, 10000), 200, ()),
+    "orbit_block_timesteps": ("Orbiting Planets Simulator.py", "--asteroids", (0, 100, 1000, 10000), 200,
+                              ("--block-timesteps",)),
+    "orbit_particles": ("Orbiting Planets Simulator.py", "--particles", (10_000, 100_000, 1_000_000), 20, ()),
+    "pendulum_ensemble": ("Pendulum Air Resistance.py", "--ensemble", (1, 100, 10000, 100000), 200,
+                          ("--mode", "drag")),
+}
+
+
+def run_case(name, size, steps=None):
+    """Run one case at one size in a fresh process and return its headless statistics"""
+    script, flag, _, default_steps, extra = CASES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "result.json")
+        command = [sys.executable, os.path.join(ROOT, script), "--headless",
+                   "--steps", str(steps or default_steps), "--json", path, "--seed", "0", flag, str(size), *extra]
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(path) as f:
+            result = json.load(f)
+    result["case"] = name
+    result["parameter"] = size
+    return result
+
+
+def scaling_exponent(results):
+    """Least-squares slope of log(median step time) against log(size)"""
+    points = [(math.log(r["size"]), math.log(r["median_step_s"])) for r in results
+              if r["size"] and r["median_step_s"]]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    sxx = sum((x - mean_x) ** 2 for x, _ in points)
+    if sxx == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sxx
+
+
+def run_repeated(name, size, repeats=REPEATS):
+    """Median of `repeats` runs, which keeps one-off scheduler noise out of the result"""
+    runs = sorted((run_case(name, size) for _ in range(repeats)), key=lambda r: r["median_step_s"])
+    result = runs[len(runs) // 2]
+    result["repeat_medians_s"] = [r["median_step_s"] for r in runs]
+    return result
+
+
+def run_suite(cases=None, quick=False, repeats=REPEATS):
+    """Run the selected cases (all by default); quick runs only the two smallest sizes"""
+    suite = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cases": {},
+    }
+    for name in cases or CASES:
+        sizes = CASES[name][2][:2] if quick else CASES[name][2]
+        results = []
+        for size in sizes:
+            result = run_repeated(name, size, repeats)
+            results.append(result)
+            memory = result["peak_memory_mb"]
+            memory = "unknown" if memory is None else f"{memory:.0f} MB"
+            print(f"{name:18} size {result['size']:>7}: median {result['median_step_s'] * 1000:9.3f} ms/step, "
+                  f"stdev {math.sqrt(result['variance_step_s2']) * 1000:8.3f} ms, peak memory {memory}")
+        exponent = scaling_exponent(results)
+        suite["cases"][name] = {"results": results, "scaling_exponent": exponent}
+        if exponent is not None:
+            print(f"{name:18} scales as n^{exponent:.2f}")
+    return suite
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """Rows (case, size, old, new, ratio, regressed) for every size present in both files"""
+    rows = []
+    for name, case in new["cases"].items():
+        if name not in old["cases"]:
+            continue
+        before = {r["parameter"]: r for r in old["cases"][name]["results"]}
+        for result in case["results"]:
+            reference = before.get(result["parameter"])
+            if reference is None:
+                continue
+            ratio = result["median_step_s"] / reference["median_step_s"]
+            # Only a slowdown beyond the threshold whose repeats all lie above the
+            # baseline's repeats counts; overlapping ranges are run-to-run noise
+            fastest = min(result.get("repeat_medians_s", [result["median_step_s"]]))
+            slowest = max(reference.get("repeat_medians_s", [reference["median_step_s"]]))
+            rows.append((name, result["size"], reference["median_step_s"], result["median_step_s"],
+                         ratio, ratio > 1 + threshold and fastest > slowest))
+    return rows
+
+
+def cold_start(script, repeats=REPEATS):
+    """Median seconds from launching `script` headlessly to the end of its first step"""
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "result.json")
+        command = [sys.executable, os.path.join(ROOT, script), "--headless", "--steps", "1",
+                   "--json", path]
+        for _ in range(repeats):
+            launched = time.time()
+            subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with open(path) as f:
+                times.append(json.load(f)["first_step_done"] - launched)
+    return sorted(times)[len(times) // 2]
+
+
+def heavy_imports(module):
+    """Display and physics libraries that importing `module` in a fresh interpreter loads"""
+    code = (f"import sys, {module}; "
+            "print(' '.join(m for m in ('pygame', 'pymunk', 'numpy', 'scipy') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return output.split()
+
+
+def plot(suite, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    figure, axis = plt.subplots(figsize=(8, 6))
+    for name, case in suite["cases"].items():
+        results = [r for r in case["results"] if r["size"]]
+        exponent = case["scaling_exponent"]
+        label = name if exponent is None else f"{name} (n^{exponent:.2f})"
+        axis.loglog([r["size"] for r in results], [r["median_step_s"] * 1000 for r in results], "o-", label=label)
+    axis.set_xlabel("Problem size (balls, filings, blocks, bodies, pendulums)")
+    axis.set_ylabel("Median step time (ms)")
+    axis.set_title("Simulator scaling")
+    axis.grid(True, which="both", alpha=0.3)
+    axis.legend()
+    figure.savefig(path, dpi=120, bbox_inches="tight")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulators at several problem sizes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and write the results to JSON")
+    run_parser.add_argument("--out", default="benchmark_results.json", help="result file")
+    run_parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="only run these cases")
+    run_parser.add_argument("--quick", action="store_true", help="only the two smallest sizes of each case")
+    run_parser.add_argument("--repeats", type=int, default=REPEATS, help="runs per size (default 3)")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                                help="relative slowdown that counts as a regression (default 0.15)")
+
+    plot_parser = commands.add_parser("plot", help="plot scaling curves (needs matplotlib)")
+    plot_parser.add_argument("results")
+    plot_parser.add_argument("--out", default="benchmark_scaling.png", help="image file")
+
+    coldstart_parser = commands.add_parser("coldstart", help="time from launch to the first step of every script")
+    coldstart_parser.add_argument("--repeats", type=int, default=REPEATS, help="launches per script (default 3)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        suite = run_suite(args.cases, args.quick, args.repeats)
+        with open(args.out, "w") as f:
+            json.dump(suite, f, indent=2)
+        print(f"Results written to {args.out}")
+        return 0
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            old = json.load(f)
+        with open(args.results) as f:
+            new = json.load(f)
+        rows = compare(old, new, args.threshold)
+        for name, size, before, after, ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:18} size {size:>7}: {before * 1000:9.3f} -> {after * 1000:9.3f} ms/step "
+                  f"({(ratio - 1) * 100:+6.1f}%){flag}")
+        regressions = sum(row[-1] for row in rows)
+        print(f"{regressions} regression(s) in {len(rows)} comparisons")
+        return 1 if regressions else 0
+
+    if args.command == "coldstart":
+        for script in SCRIPTS:
+            print(f"{script:32} {cold_start(script, args.repeats) * 1000:7.0f} ms to the first step")
+        display = 0
+        for module in ENGINES:
+            loaded = heavy_imports(module)
+            display += "pygame" in loaded
+            print(f"import {module:24} loads {', '.join(loaded) or 'nothing heavy'}")
+        return 1 if display else 0
+
+    with open(args.results) as f:
+        suite = json.load(f)
+    try:
+        plot(suite, args.out)
+    except ImportError:
+        print("Plotting needs matplotlib: pip install matplotlib")
+        return 1
+    print(f"Scaling curves written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""A pan and zoom camera for drawing large 2D worlds.
+
+The camera maps world coordinates (e.g. metres) to screen pixels with a
+uniform scale (world units per pixel) around a world point shown at the
+centre of the window. project() maps many positions at once with NumPy,
+and visible() tells which of them (with a radius in pixels) touch the
+window, so the drawing code only loops over what can be seen. Bodies
+that are a pixel or two across go to plot_points(), which writes them
+into the surface's pixels in one NumPy assignment instead of one draw
+call each.
+
+Controls (handle_event): the mouse wheel zooms around the pointer, a
+right or middle button drag pans, +/- zoom around the centre and C goes
+back to the starting view.
+"""
+
+ZOOM_STEP = 1.25  # Per wheel notch or +/- press
+MIN_ZOOM = 1 / 64
+MAX_ZOOM = 4096.0
+
+
+class Camera:
+    def __init__(self, size, scale, center=(0.0, 0.0)):
+        """`scale` is world units per pixel at zoom 1; `center` is the world point in the middle"""
+        self.width, self.height = size
+        self.home_scale = scale
+        self.home_center = tuple(center)
+        self.scale = scale
+        self.center_x, self.center_y = center
+        self._drag = None  # Last pointer position of a pan drag
+
+    @property
+    def zoom(self):
+        """Magnification relative to the starting scale"""
+        return self.home_scale / self.scale
+
+    def to_screen(self, x, y):
+        return (self.width / 2 + (x - self.center_x) / self.scale,
+                self.height / 2 + (y - self.center_y) / self.scale)
+
+    def to_world(self, sx, sy):
+        return (self.center_x + (sx - self.width / 2) * self.scale,
+                self.center_y + (sy - self.height / 2) * self.scale)
+
+    def project(self, positions):
+        """Screen coordinates (n, 2) of world `positions` (n, 2)"""
+        import numpy as np
+
+        screen = (np.asarray(positions, dtype=float) - (self.center_x, self.center_y)) / self.scale
+        screen += (self.width / 2, self.height / 2)
+        return screen
+
+    def project_xy(self, x, y):
+        """Screen coordinates (n, 2) of world coordinates given as separate x and y arrays"""
+        import numpy as np
+
+        screen = np.empty((len(x), 2))
+        screen[:, 0] = x
+        screen[:, 1] = y
+        screen -= (self.center_x, self.center_y)
+        screen *= 1 / self.scale
+        screen += (self.width / 2, self.height / 2)
+        return screen
+
+    def project_visible(self, x, y):
+        """Screen coordinates (k, 2) of the points of the world arrays x, y that fall in the window.
+
+        The points are culled against the view in world coordinates first, so
+        only the visible ones are projected.
+        """
+        import numpy as np
+
+        left, top = self.to_world(0, 0)
+        right, bottom = self.to_world(self.width, self.height)
+        inside = (x >= left) & (x < right) & (y >= top) & (y < bottom)
+        if not inside.all():
+            x, y = x[inside], y[inside]
+        return self.project_xy(x, y)
+
+    def visible(self, screen, radius=0.0):
+        """Mask of the projected points whose circle of `radius` pixels overlaps the window"""
+        x, y = screen[:, 0], screen[:, 1]
+        return (x + radius >= 0) & (x - radius < self.width) & (y + radius >= 0) & (y - radius < self.height)
+
+    def zoom_at(self, factor, screen_pos=None):
+        """Zoom by `factor`, keeping the world point under `screen_pos` (default: the centre) in place"""
+        if screen_pos is None:
+            screen_pos = (self.width / 2, self.height / 2)
+        anchor = self.to_world(*screen_pos)
+        zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        self.scale = self.home_scale / zoom
+        sx, sy = screen_pos
+        self.center_x = anchor[0] - (sx - self.width / 2) * self.scale
+        self.center_y = anchor[1] - (sy - self.height / 2) * self.scale
+
+    def pan(self, dx, dy):
+        """Move the view by (dx, dy) pixels; the world follows the pointer"""
+        self.center_x -= dx * self.scale
+        self.center_y -= dy * self.scale
+
+    def reset(self):
+        self.scale = self.home_scale
+        self.center_x, self.center_y = self.home_center
+
+    def handle_event(self, event):
+        """Wheel/+/- zoom, right or middle drag pans, C resets; True if the event was used"""
+        import pygame
+
+        if event.type == pygame.MOUSEWHEEL:
+            self.zoom_at(ZOOM_STEP ** event.y, pygame.mouse.get_pos())
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (2, 3):
+            self._drag = event.pos
+        elif event.type == pygame.MOUSEBUTTONUP and event.button in (2, 3):
+            self._drag = None
+        elif event.type == pygame.MOUSEMOTION and self._drag is not None:
+            self.pan(event.pos[0] - self._drag[0], event.pos[1] - self._drag[1])
+            self._drag = event.pos
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+            self.zoom_at(ZOOM_STEP)
+        elif event.type == pygame.KEYDOWN and event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            self.zoom_at(1 / ZOOM_STEP)
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_c:
+            self.reset()
+        else:
+            return False
+        return True
+
+    def label(self):
+        zoom = self.zoom
+        zoom_text = f"x{zoom:.3g}" if zoom >= 1 else f"1/{1 / zoom:.3g}"
+        return f"Zoom {zoom_text} ({self.scale:.3g} per pixel, wheel/+/-, right drag: pan, C: reset)"
+
+
+def plot_points(surface, screen, color):
+    """Set one pixel per projected point in `screen` (n, 2) that lies on the surface.
+
+    `color` is one color, or an array of the points' colors already mapped
+    with surface.map_rgb(). 32-bit surfaces are written through a pixel
+    array in one assignment; other formats fall back to set_at().
+    """
+    import numpy as np
+    import pygame
+
+    width, height = surface.get_size()
+    x, y = screen[:, 0], screen[:, 1]
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    if not inside.all():
+        x, y = x[inside], y[inside]
+        if isinstance(color, np.ndarray):
+            color = color[inside]
+    if not isinstance(color, np.ndarray):
+        color = surface.map_rgb(color)
+    xs, ys = x.astype(np.intp), y.astype(np.intp)  # Truncating is flooring for points on the surface
+    if surface.get_bytesize() == 4:
+        pixels = pygame.surfarray.pixels2d(surface)
+        pixels[xs, ys] = color
+        del pixels  # Unlocks the surface
+    else:
+        colors = np.broadcast_to(color, xs.shape)
+        for px, py, mapped in zip(xs.tolist(), ys.tolist(), colors.tolist()):
+            surface.set_at((px, py), surface.unmap_rgb(mapped))
+    return len(xs)
@@ -0,0 +1,279 @@
+"""Frame capture to PNG files or a video encoder, off the main loop.
+
+capture(surface) only copies the frame's pixels into one of a fixed set of
+preallocated buffers (a fraction of a millisecond for 800x600) and queues
+it. Worker threads then turn the buffers into PNG files, or a single
+writer thread pipes them as raw frames into ffmpeg when it is installed
+and a video file was asked for. The PNG encoder uses zlib, which releases
+the GIL while compressing, so the workers run alongside the simulation.
+
+When every buffer is in use the `policy` decides what happens:
+
+* "drop": the frame is skipped and counted in `dropped` (the main loop
+  never waits)
+* "block": capture() waits for a free buffer (every frame is kept and the
+  wait is counted in `stall_seconds`)
+
+F5 starts and stops a recording; `--capture PATH` records from the start.
+A PATH ending in a video extension is encoded with ffmpeg (PNG frames next
+to it when ffmpeg is missing), anything else is a directory for PNGs.
+"""
+
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+BUFFERS = 8  # Preallocated frame buffers (the queue bound)
+WORKERS = 2  # PNG encoder threads
+PNG_LEVEL = 3  # zlib level: fast, still a good ratio for flat simulator graphics
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm", ".avi")
+
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk) & 0xFFFFFFFF)
+
+
+def encode_png(rgb, level=PNG_LEVEL):
+    """PNG file bytes for an (height, width, 3) uint8 array"""
+    import numpy as np
+
+    height, width, _ = rgb.shape
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)  # Filter byte 0 (none) per row
+    rows[:, 1:] = rgb.reshape(height, width * 3)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8-bit RGB
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)) + _png_chunk(b"IEND", b""))
+
+
+class FrameCapture:
+    def __init__(self, path, size, fps=60, policy="drop", buffers=BUFFERS, workers=WORKERS, encoder=None):
+        import numpy as np
+
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown capture policy {policy!r}")
+        self.size = size
+        self.fps = fps
+        self.policy = policy
+        self.captured = 0  # Frames handed to the workers
+        self.dropped = 0  # Frames skipped because every buffer was in use
+        self.encoded = 0
+        self.stall_seconds = 0.0  # Main loop time spent waiting for a buffer ("block")
+        self.copy_seconds = 0.0  # Main loop time spent copying pixels
+        self._encode_start = None
+        self._encode_end = None
+        self._lock = threading.Lock()
+
+        # Buffers are (width, height) in Fortran order, the memory layout of the
+        # surface rows, so copying a 32-bit surface is one contiguous copy
+        width, height = size
+        self._buffers = [np.empty((width, height), dtype=np.uint32, order="F") for _ in range(buffers)]
+        for buffer in self._buffers:
+            buffer.fill(0)  # Touch the pages now rather than during the first captures
+        self._free = queue.Queue()
+        for index in range(buffers):
+            self._free.put(index)
+        self._filled = queue.Queue()
+        self._channels = None  # Byte offsets of R, G, B in a pixel, set by the first frame
+
+        encoder = encoder if encoder is not None else shutil.which("ffmpeg")
+        self.video = os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+        if self.video and not encoder:
+            print("ffmpeg not found, capturing PNG frames instead")
+            self.video = False
+            path = os.path.splitext(path)[0]
+        self.path = path
+        self._encoder_path = encoder
+        self._process = None
+        if not self.video:
+            os.makedirs(path, exist_ok=True)
+        # Video frames must reach the encoder in order, so a single writer
+        workers = 1 if self.video else workers
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def capture(self, surface):
+        """Queue a copy of the surface's pixels (call after drawing, before the flip)"""
+        import numpy as np
+
+        try:
+            index = self._free.get_nowait()
+        except queue.Empty:
+            if self.policy == "drop":
+                self.dropped += 1
+                return False
+            waited = time.perf_counter()
+            index = self._free.get()
+            self.stall_seconds += time.perf_counter() - waited
+
+        started = time.perf_counter()
+        if self._channels is None:
+            offsets = [shift // 8 for shift in surface.get_shifts()[:3]]
+            self._channels = tuple(3 - offset if sys.byteorder == "big" else offset for offset in offsets)
+        buffer = self._buffers[index]
+        if surface.get_bytesize() == 4 and surface.get_size() == self.size:
+            import pygame
+
+            pixels = pygame.surfarray.pixels2d(surface)
+            np.copyto(buffer, pixels)
+            del pixels  # Unlocks the surface
+        else:
+            # Other pixel formats go through a converted RGBX copy
+            import pygame
+
+            self._channels = (0, 1, 2)
+            data = pygame.image.tobytes(surface, "RGBX")
+            buffer.T[:] = np.frombuffer(data, dtype=np.uint32).reshape(self.size[1], self.size[0])
+        self.copy_seconds += time.perf_counter() - started
+        self._filled.put((self.captured, index))
+        self.captured += 1
+        return True
+
+    def _rgb(self, buffer):
+        height, width = buffer.shape[1], buffer.shape[0]
+        pixels = buffer.T.view("u1").reshape(height, width, 4)  # The rows as bytes, no copy
+        return pixels[:, :, list(self._channels)]
+
+    def _start_encoder(self):
+        width, height = self.size
+        command = [self._encoder_path, "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+                   "-pix_fmt", "yuv420p", self.path]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def _work(self):
+        while True:
+            item = self._filled.get()
+            if item is None:
+                return
+            frame, index = item
+            with self._lock:
+                if self._encode_start is None:
+                    self._encode_start = time.perf_counter()
+            rgb = self._rgb(self._buffers[index])
+            if self.video:
+                if self._process is None:
+                    self._start_encoder()
+                try:
+                    self._process.stdin.write(rgb.tobytes())  # Blocks in C while ffmpeg catches up
+                except OSError:
+                    # The encoder exited; keep recycling buffers so the main loop never hangs
+                    with self._lock:
+                        self.dropped += 1
+                    self._free.put(index)
+                    continue
+            else:
+                data = encode_png(rgb)
+                with open(os.path.join(self.path, f"frame_{frame:06d}.png"), "wb") as f:
+                    f.write(data)
+            self._free.put(index)
+            with self._lock:
+                self.encoded += 1
+                self._encode_end = time.perf_counter()
+
+    def stats(self):
+        encode_time = (self._encode_end or 0) - (self._encode_start or 0)
+        return {
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "encoded": self.encoded,
+            "queued": self.captured - self.encoded,
+            "encode_fps": self.encoded / encode_time if encode_time > 0 else 0.0,
+            "copy_ms_per_frame": self.copy_seconds / self.captured * 1000 if self.captured else 0.0,
+            "stall_seconds": self.stall_seconds,
+        }
+
+    def close(self):
+        """Finish encoding every queued frame and print the capture report"""
+        for _ in self._threads:
+            self._filled.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+            self._process.wait()
+        stats = self.stats()
+        total = stats["captured"] + stats["dropped"]
+        lost = stats["dropped"] / total * 100 if total else 0.0
+        print(f"Captured {stats['captured']} frames to {self.path}, dropped {stats['dropped']} ({lost:.1f}%), "
+              f"encoded at {stats['encode_fps']:.1f} frames/s, copy {stats['copy_ms_per_frame']:.2f} ms/frame, "
+              f"stalled {stats['stall_seconds'] * 1000:.0f} ms")
+        return stats
+
+
+class Recorder:
+    """F5 toggle around FrameCapture; capture() does nothing while not recording"""
+
+    def __init__(self, path=None, fps=60, policy="drop", workers=WORKERS):
+        self.path = path
+        self.fps = fps
+        self.policy = policy
+        self.workers = workers
+        self.capture_session = None
+        self.start_pending = path is not None  # Started by the first frame, once the size is known
+
+    @property
+    def recording(self):
+        return self.capture_session is not None
+
+    def start(self, size):
+        path = self.path
+        if path is None:
+            extension = ".mp4" if shutil.which("ffmpeg") else ""
+            path = time.strftime("capture-%Y%m%d-%H%M%S") + extension
+        self.capture_session = FrameCapture(path, size, self.fps, self.policy, workers=self.workers)
+        self.path = None  # Later F5 recordings get a fresh name
+        print(f"Recording to {self.capture_session.path} (F5 to stop)")
+
+    def stop(self):
+        if self.capture_session is None:
+            return None
+        stats = self.capture_session.close()
+        self.capture_session = None
+        return stats
+
+    def capture(self, surface):
+        if self.start_pending:
+            self.start_pending = False
+            self.start(surface.get_size())
+        if self.capture_session is not None:
+            self.capture_session.capture(surface)
+
+    def handle_event(self, event):
+        """F5 starts/stops a recording; True if the event was used"""
+        import pygame
+
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+            if self.recording:
+                self.stop()
+            else:
+                self.start_pending = True
+            return True
+        return False
+
+
+def add_arguments(parser):
+    parser.add_argument("--capture", metavar="PATH",
+                        help="record frames from the start: a directory of PNGs or a video file (needs ffmpeg) (F5)")
+    parser.add_argument("--capture-policy", choices=("drop", "block"), default="drop",
+                        help="when the encoders fall behind: drop frames (default) or wait for them")
+    parser.add_argument("--capture-workers", type=int, default=WORKERS, help="PNG encoder threads")
+
+
+def from_args(args, fps=60):
+    """A recorder configured by the --capture options; recordings are finished at exit"""
+    import atexit
+
+    recorder = Recorder(args.capture, fps, args.capture_policy, args.capture_workers)
+    atexit.register(recorder.stop)
+    return recorder
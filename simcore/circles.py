@@ -0,0 +1,211 @@
+"""Batched drawing of filled circles (balls, pendulum bobs, planets).
+
+draw() takes the centres of a whole population as an (n, 2) array and
+draws them in one go instead of one pygame.draw.circle() call each:
+
+- Circles up to STAMP_RADIUS pixels are stamped straight into the
+  surface's pixels: every centre is expanded into the disc's pixel
+  offsets and written with one NumPy assignment through a pixel array
+  (like camera.plot_points()). At that size a sprite blit costs more per
+  circle than writing its pixels, and the hard edge hardly shows.
+- Larger circles are blitted with a single Surface.blits() call from an
+  anti-aliased sprite rendered once per (radius, color) and kept in a
+  least-recently-used cache. Sprites are stored with premultiplied alpha,
+  which pygame blends faster than plain per-pixel alpha.
+
+Radii are rounded to half pixels for the cache, and a circle's centre is
+snapped to the pixel it falls in, like pygame.draw.circle() with int()
+coordinates. On surfaces that are not 32 bits per pixel small circles are
+blitted as sprites too.
+
+`python -m simcore.circles` times draw() against a pygame.draw.circle()
+loop on an off-screen window-sized surface.
+"""
+
+import argparse
+import math
+import sys
+import time
+from collections import OrderedDict
+
+STAMP_RADIUS = 3  # Circles this small (pixels) or smaller are written as pixels
+CAPACITY = 256  # Sprites kept
+
+
+class CircleRenderer:
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.blitted = 0
+        self.stamped = 0
+        self._sprites = OrderedDict()
+        self._stamps = {}
+
+    def sprite(self, radius, color):
+        """The anti-aliased sprite of a circle and the offset of its top left corner from the centre"""
+        key = (radius, tuple(color))
+        entry = self._sprites.get(key)
+        if entry is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        import numpy as np
+        import pygame
+
+        half = math.ceil(radius) + 1  # One pixel of room for the soft edge
+        offset = np.arange(-half, half + 1, dtype=float)
+        distance = np.hypot(offset[:, None], offset[None, :])
+        coverage = np.clip(radius + 0.5 - distance, 0.0, 1.0)  # Fraction of each pixel inside the circle
+        sprite = pygame.Surface((2 * half + 1, 2 * half + 1), pygame.SRCALPHA)
+        sprite.fill(tuple(color)[:3] + (255,))
+        alpha = pygame.surfarray.pixels_alpha(sprite)
+        alpha[...] = np.rint(coverage * 255).astype(np.uint8)
+        del alpha  # Unlocks the sprite
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        flags = 0
+        if hasattr(sprite, "premul_alpha"):  # pygame 2.1.4 and later
+            sprite = sprite.premul_alpha()
+            flags = pygame.BLEND_PREMULTIPLIED
+        entry = (sprite, -half, flags)
+        self._sprites[key] = entry
+        if len(self._sprites) > self.capacity:
+            self._sprites.popitem(last=False)
+        return entry
+
+    def stamp(self, radius):
+        """Pixel offsets (k, 2) of a solid disc of `radius`"""
+        offsets = self._stamps.get(radius)
+        if offsets is None:
+            import numpy as np
+
+            half = math.ceil(radius)
+            dy, dx = np.mgrid[-half:half + 1, -half:half + 1]
+            inside = dx * dx + dy * dy <= radius * radius + radius  # Matches the sprites' outline
+            offsets = self._stamps[radius] = np.column_stack((dx[inside], dy[inside])).astype(np.intp)
+        return offsets
+
+    def draw(self, surface, positions, radius, color):
+        """Draw circles of `radius` (one number or one per circle) centred on `positions` (n, 2).
+
+        Returns the number of circles that touched the surface.
+        """
+        import numpy as np
+
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        radius = np.asarray(radius, dtype=float)
+        if radius.ndim:
+            radius = np.rint(radius * 2) / 2
+            drawn = 0
+            for value in np.unique(radius).tolist():
+                drawn += self.draw(surface, positions[radius == value], value, color)
+            return drawn
+        radius = round(float(radius) * 2) / 2
+        if radius <= 0 or not len(positions):
+            return 0
+        centres = np.floor(positions).astype(np.intp)
+        if radius <= STAMP_RADIUS and surface.get_bytesize() == 4:
+            return self._stamp(surface, centres, radius, color)
+        return self._blit(surface, centres, radius, color)
+
+    def _stamp(self, surface, centres, radius, color):
+        import numpy as np
+        import pygame
+
+        width, height = surface.get_size()
+        reach = int(np.ceil(radius))
+        x, y = centres[:, 0], centres[:, 1]
+        touching = (x + reach >= 0) & (x - reach < width) & (y + reach >= 0) & (y - reach < height)
+        inside = (x >= reach) & (x < width - reach) & (y >= reach) & (y < height - reach)
+        offsets = self.stamp(radius)
+        pixels = pygame.surfarray.pixels2d(surface)
+        mapped = surface.map_rgb(color)
+        # Discs wholly on the surface need no clipping, which is nearly all of them
+        whole = centres[inside]
+        pixels[(whole[:, 0, None] + offsets[:, 0]).ravel(), (whole[:, 1, None] + offsets[:, 1]).ravel()] = mapped
+        edge = centres[touching & ~inside]
+        if len(edge):
+            xs = (edge[:, 0, None] + offsets[:, 0]).ravel()
+            ys = (edge[:, 1, None] + offsets[:, 1]).ravel()
+            keep = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+            pixels[xs[keep], ys[keep]] = mapped
+        del pixels  # Unlocks the surface
+        count = int(touching.sum())
+        self.stamped += count
+        return count
+
+    def _blit(self, surface, centres, radius, color):
+        from itertools import repeat
+
+        sprite, offset, flags = self.sprite(radius, color)
+        width, height = surface.get_size()
+        size = sprite.get_width()
+        corners = centres + offset
+        x, y = corners[:, 0], corners[:, 1]
+        touching = (x + size > 0) & (x < width) & (y + size > 0) & (y < height)
+        if not touching.all():
+            corners = corners[touching]
+        surface.blits(zip(repeat(sprite), corners.tolist(), repeat(None), repeat(flags)), False)
+        self.blitted += len(corners)
+        return len(corners)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "blitted": self.blitted,
+            "stamped": self.stamped,
+            "sprites": len(self._sprites),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def label(self):
+        stats = self.stats()
+        return (f"circles: {stats['blitted']} blitted, {stats['stamped']} stamped, "
+                f"{stats['sprites']} sprites ({stats['hit_rate'] * 100:.1f}% hits)")
+
+
+def bench(count=100_000, radii=(1, 2, 3, 5, 10), size=(800, 600), seed=0, repeats=3):
+    """Rows (radius, draw() seconds, pygame.draw.circle() loop seconds) for `count` circles"""
+    import numpy as np
+    import pygame
+
+    surface = pygame.Surface(size, depth=32)
+    positions = np.random.default_rng(seed).random((count, 2)) * size
+    renderer = CircleRenderer()
+    rows = []
+    for radius in radii:
+        renderer.draw(surface, positions[:1], radius, (0, 0, 139))  # Render the sprite outside the timing
+        batched = math.inf
+        for _ in range(repeats):
+            started = time.perf_counter()
+            renderer.draw(surface, positions, radius, (0, 0, 139))
+            batched = min(batched, time.perf_counter() - started)
+        started = time.perf_counter()
+        for x, y in positions.tolist():
+            pygame.draw.circle(surface, (0, 0, 139), (int(x), int(y)), radius)
+        rows.append((radius, batched, time.perf_counter() - started))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time batched circle drawing against pygame.draw.circle()")
+    parser.add_argument("--count", type=int, default=100_000, help="circles per frame")
+    args = parser.parse_args(argv)
+    print(f"{args.count:,} circles on an 800x600 surface")
+    for radius, batched, loop in bench(args.count):
+        mode = "stamped" if radius <= STAMP_RADIUS else "blitted"
+        print(f"radius {radius:<3} {mode}  draw() {batched * 1000:7.1f} ms, "
+              f"draw.circle loop {loop * 1000:7.1f} ms ({loop / batched:4.1f}x)")
+    return 0
+
+
+# The renderer shared by the simulator scripts
+renderer = CircleRenderer()
+draw = renderer.draw
+stats = renderer.stats
+label = renderer.label
+
+if __name__ == "__main__":
+    sys.exit(main())
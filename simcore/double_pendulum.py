@@ -0,0 +1,58 @@
+"""Double pendulum engine.
+
+Angles are measured from the downward vertical. Lengths are in whatever
+unit the caller draws with (the simulator passes pixels), so the angular
+accelerations are those of the original per-frame integrator.
+"""
+
+import math
+
+GRAVITY = 9.81
+
+
+class DoublePendulum:
+    def __init__(self, mass1, mass2, length1, length2, theta1, theta2, gravity=GRAVITY, dt=0.05):
+        self.mass1 = mass1
+        self.mass2 = mass2
+        self.length1 = length1
+        self.length2 = length2
+        self.theta1 = theta1  # Radians
+        self.theta2 = theta2
+        self.omega1 = 0.0  # Angular velocities
+        self.omega2 = 0.0
+        self.gravity = gravity
+        self.dt = dt
+
+    def acceleration(self, theta1, theta2, omega1, omega2):
+        g, mass1, mass2 = self.gravity, self.mass1, self.mass2
+        length1, length2 = self.length1, self.length2
+        num1 = -g * (2 * mass1 + mass2) * math.sin(theta1)
+        num2 = -mass2 * g * math.sin(theta1 - 2 * theta2)
+        num3 = -2 * math.sin(theta1 - theta2) * mass2
+        num4 = omega2**2 * length2 + omega1**2 * length1 * math.cos(theta1 - theta2)
+        den = length1 * (2 * mass1 + mass2 - mass2 * math.cos(2 * theta1 - 2 * theta2))
+        alpha1 = (num1 + num2 + num3 * num4) / den
+
+        num5 = 2 * math.sin(theta1 - theta2)
+        num6 = (omega1**2 * length1 * (mass1 + mass2) + g * (mass1 + mass2) * math.cos(theta1))
+        num7 = omega2**2 * length2 * mass2 * math.cos(theta1 - theta2)
+        den2 = length2 * (2 * mass1 + mass2 - mass2 * math.cos(2 * theta1 - 2 * theta2))
+        alpha2 = (num5 * (num6 + num7)) / den2
+
+        return alpha1, alpha2
+
+    def step(self):
+        """Semi-implicit Euler step of length dt"""
+        alpha1, alpha2 = self.acceleration(self.theta1, self.theta2, self.omega1, self.omega2)
+        self.omega1 += alpha1 * self.dt
+        self.omega2 += alpha2 * self.dt
+        self.theta1 += self.omega1 * self.dt
+        self.theta2 += self.omega2 * self.dt
+
+    def positions(self, origin=(0.0, 0.0)):
+        """Positions of the two bobs for a pivot at `origin` (y pointing down)"""
+        x1 = origin[0] + self.length1 * math.sin(self.theta1)
+        y1 = origin[1] + self.length1 * math.cos(self.theta1)
+        x2 = x1 + self.length2 * math.sin(self.theta2)
+        y2 = y1 + self.length2 * math.cos(self.theta2)
+        return (x1, y1), (x2, y2)
@@ -0,0 +1,204 @@
+"""Streaming kinetic energy, momentum and speed statistics for the ball simulators.
+
+GasStatistics keeps running totals instead of summing over every ball each
+frame:
+
+* change(ball, old_vx, old_vy) is called whenever a collision, bounce or
+  friction changes a ball's velocity and updates the kinetic energy, the
+  momentum and the speed histogram from the old and new velocity only
+* apply_gravity() updates the totals for a whole frame of gravity in closed
+  form: every moving ball gains g*dt of vertical velocity, so with M the
+  mass of the moving balls dP_y = M g dt and dKE = g dt P_y + M (g dt)^2 / 2.
+  M is the awake mass, kept by reset(), add() and wake()
+* gravity moves every falling ball to another histogram bin, so with
+  gravity on refresh() re-bins a rotating slice of the balls each frame
+
+Each ball remembers the histogram bin it was counted in (`speed_bin`, see
+reset()). reset() is the only full pass and is also used now and then to
+cancel floating point drift.
+
+maxwell_boltzmann() gives the 2D Maxwell-Boltzmann counts for the current
+temperature (kT = mean kinetic energy in 2D) to compare the histogram with,
+summed over the ball masses present.
+StatsLog streams one row per frame to a CSV or .npy file.
+"""
+
+import os
+
+import numpy as np
+
+BINS = 30
+MAX_SPEED = 15.0  # m/s, top of the last histogram bin (faster balls are counted in it)
+
+
+class GasStatistics:
+    def __init__(self, bins=BINS, max_speed=MAX_SPEED):
+        self.bins = bins
+        self.max_speed = max_speed
+        self.bin_width = max_speed / bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.kinetic = 0.0  # J
+        self.momentum_x = 0.0  # kg m/s
+        self.momentum_y = 0.0
+        self.balls = 0
+        self.masses = np.zeros(0)  # kg, of every counted ball
+        self.awake_mass = 0.0  # kg, of the balls that are not asleep
+        self.updates = 0  # Incremental updates since the last full pass
+        self._cursor = 0
+
+    def _bin(self, vx, vy):
+        return min(int((vx * vx + vy * vy) ** 0.5 / self.bin_width), self.bins - 1)
+
+    def reset(self, balls):
+        """Recompute everything with one pass over the balls"""
+        self.counts[:] = 0
+        self.kinetic = self.momentum_x = self.momentum_y = self.awake_mass = 0.0
+        for ball in balls:
+            self.kinetic += 0.5 * ball.mass * (ball.vx * ball.vx + ball.vy * ball.vy)
+            self.momentum_x += ball.mass * ball.vx
+            self.momentum_y += ball.mass * ball.vy
+            ball.speed_bin = self._bin(ball.vx, ball.vy)
+            self.counts[ball.speed_bin] += 1
+            if not ball.asleep:
+                self.awake_mass += ball.mass
+        self.balls = len(balls)
+        self.masses = np.array([ball.mass for ball in balls], dtype=float)
+        self.updates = 0
+
+    def add(self, ball):
+        """Count a new ball"""
+        self.kinetic += 0.5 * ball.mass * (ball.vx * ball.vx + ball.vy * ball.vy)
+        self.momentum_x += ball.mass * ball.vx
+        self.momentum_y += ball.mass * ball.vy
+        ball.speed_bin = self._bin(ball.vx, ball.vy)
+        self.counts[ball.speed_bin] += 1
+        self.balls += 1
+        self.masses = np.append(self.masses, ball.mass)
+        if not ball.asleep:
+            self.awake_mass += ball.mass
+
+    def wake(self, balls):
+        """Account for sleeping balls that woke up (their velocities were zero and still are)"""
+        for ball in balls:
+            self.awake_mass += ball.mass
+
+    def change(self, ball, old_vx, old_vy):
+        """Account for a ball whose velocity changed from (old_vx, old_vy)"""
+        self.kinetic += 0.5 * ball.mass * (ball.vx * ball.vx + ball.vy * ball.vy
+                                           - old_vx * old_vx - old_vy * old_vy)
+        self.momentum_x += ball.mass * (ball.vx - old_vx)
+        self.momentum_y += ball.mass * (ball.vy - old_vy)
+        new_bin = self._bin(ball.vx, ball.vy)
+        if new_bin != ball.speed_bin:
+            self.counts[ball.speed_bin] -= 1
+            self.counts[new_bin] += 1
+            ball.speed_bin = new_bin
+        self.updates += 1
+
+    def apply_gravity(self, gravity, dt):
+        """Totals after every awake ball gains gravity * dt (sleeping balls have zero velocity)"""
+        dv = gravity * dt
+        self.kinetic += dv * self.momentum_y + 0.5 * self.awake_mass * dv * dv
+        self.momentum_y += self.awake_mass * dv
+
+    def refresh(self, balls, count):
+        """Re-bin `count` balls, continuing where the last call stopped"""
+        n = len(balls)
+        for _ in range(min(count, n)):
+            self._cursor %= n
+            ball = balls[self._cursor]
+            new_bin = self._bin(ball.vx, ball.vy)
+            if new_bin != ball.speed_bin:
+                self.counts[ball.speed_bin] -= 1
+                self.counts[new_bin] += 1
+                ball.speed_bin = new_bin
+            self._cursor += 1
+
+    def measure(self, vx, vy, mass):
+        """Recompute the totals from velocity and mass arrays (used when a solver already has them)"""
+        speed2 = vx * vx + vy * vy
+        self.kinetic = 0.5 * float((mass * speed2).sum())
+        self.momentum_x = float((mass * vx).sum())
+        self.momentum_y = float((mass * vy).sum())
+        self.masses = np.asarray(mass, dtype=float)
+        bins = np.minimum((np.sqrt(speed2) / self.bin_width).astype(np.int64), self.bins - 1)
+        self.counts = np.bincount(bins, minlength=self.bins)
+        self.balls = len(vx)
+
+    def temperature(self):
+        """kT (J) of a 2D gas with this mean kinetic energy"""
+        return self.kinetic / self.balls if self.balls else 0.0
+
+    def maxwell_boltzmann(self):
+        """Expected ball count per speed bin for a 2D Maxwell-Boltzmann distribution"""
+        kt = self.temperature()
+        if kt <= 0:
+            return np.zeros(self.bins)
+        edges = np.arange(self.bins + 1) * self.bin_width
+        masses, counts = np.unique(self.masses, return_counts=True)
+        cumulative = 1 - np.exp(-masses[:, None] * edges ** 2 / (2 * kt))
+        cumulative[:, -1] = 1.0  # The last bin also holds every faster ball
+        return counts @ np.diff(cumulative, axis=1)
+
+    def row(self, time):
+        """One log row: time, balls, kinetic energy, momentum and the histogram"""
+        return [time, self.balls, self.kinetic, self.momentum_x, self.momentum_y, *self.counts.tolist()]
+
+    def columns(self):
+        return ["time", "balls", "kinetic", "momentum_x", "momentum_y",
+                *(f"bin_{i}" for i in range(self.bins))]
+
+
+class StatsLog:
+    """Appends rows to a .csv or .npy file, flushing every `flush_every` rows.
+
+    A .npy file is written as a float64 2D array whose header is rewritten
+    with the final row count on close(), so it loads with np.load.
+    """
+
+    HEADER_SIZE = 128  # Bytes reserved for the .npy header, enough for any row count
+
+    def __init__(self, path, columns, flush_every=60):
+        self.path = path
+        self.columns = list(columns)
+        self.flush_every = flush_every
+        self.rows = 0
+        self._pending = []
+        self._npy = os.path.splitext(path)[1].lower() == ".npy"
+        self._file = open(path, "wb" if self._npy else "w")
+        if self._npy:
+            self._file.write(self._header(0))
+        else:
+            self._file.write(",".join(self.columns) + "\n")
+
+    def _header(self, rows):
+        header = repr({"descr": "<f8", "fortran_order": False, "shape": (rows, len(self.columns))})
+        prefix = b"\x93NUMPY\x01\x00"
+        length = self.HEADER_SIZE - len(prefix) - 2
+        text = header.ljust(length - 1) + "\n"
+        return prefix + np.array(length, dtype="<u2").tobytes() + text.encode("latin1")
+
+    def write(self, row):
+        self._pending.append(row)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self._npy:
+            self._file.write(np.asarray(self._pending, dtype="<f8").tobytes())
+        else:
+            for row in self._pending:
+                self._file.write(",".join(f"{value:.6g}" for value in row) + "\n")
+        self.rows += len(self._pending)
+        self._pending = []
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._npy:
+            self._file.seek(0)
+            self._file.write(self._header(self.rows))
+        self._file.close()
+
@@ -0,0 +1,98 @@
+"""Headless runs of the simulator scripts.
+
+Every script accepts `--headless --steps N`. It then selects the SDL dummy
+video driver (so no window or display server is needed), builds its scene
+as usual, calls its physics step N times without rendering or frame cap and
+prints the physics step rate:
+
+    python "Double Pendulum.py" --headless --steps 100000
+
+With `--json PATH` the per-step timing statistics and the peak memory of
+the process are also written to PATH (used by simcore.benchmark), and
+`--seed` makes the random initial conditions repeatable. The JSON also
+holds the wall-clock time at which the first step finished, from which
+simcore.benchmark measures the cold start of every script. The first
+WARMUP_STEPS steps (which include compiling or loading the Numba kernels)
+are left out of the median and variance and reported as `warmup_s`.
+"""
+
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+DEFAULT_STEPS = 1000
+WARMUP_STEPS = 5  # Steps kept out of the step time statistics
+
+
+def add_arguments(parser, steps=DEFAULT_STEPS):
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window or frame cap and print physics steps per second")
+    parser.add_argument("--steps", type=int, default=steps, help=f"physics steps in headless mode (default {steps})")
+    parser.add_argument("--json", metavar="PATH", help="write headless timing statistics to a JSON file")
+    parser.add_argument("--seed", type=int, help="seed the random initial conditions")
+
+
+def setup(args):
+    """Apply --seed and, for --headless, select the offscreen SDL drivers; call before pygame.init()"""
+    if args.seed is not None:
+        import numpy as np  # Only imported when needed, most scripts start faster without it
+
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # Bytes on macOS, KB elsewhere
+
+
+def run(step, args, name, size=None):
+    """Call step() args.steps times as fast as possible and print the step rate.
+
+    `size` is the problem size (balls, bodies, ...) recorded in the JSON output.
+    """
+    times = []
+    clock = time.perf_counter
+    start = clock()
+    first_step_done = None
+    for _ in range(args.steps):
+        before = clock()
+        step()
+        times.append(clock() - before)
+        if first_step_done is None:
+            first_step_done = time.time()
+    elapsed = max(clock() - start, 1e-9)
+    warmup = min(WARMUP_STEPS, len(times) - 1) if times else 0  # Always keep at least one step
+    measured = times[warmup:]
+    print(f"{name}: {args.steps} steps in {elapsed:.3f} s, {args.steps / elapsed:,.1f} steps/s")
+
+    result = {
+        "name": name,
+        "size": size,
+        "steps": args.steps,
+        "total_s": elapsed,
+        "steps_per_second": args.steps / elapsed,
+        "median_step_s": statistics.median(measured) if measured else None,
+        "variance_step_s2": statistics.pvariance(measured) if measured else None,
+        "warmup_s": sum(times[:warmup]),
+        "peak_memory_mb": peak_memory_mb(),
+        "first_step_done": first_step_done,  # Wall-clock time (time.time())
+    }
+    if getattr(args, "json", None):
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    return result
@@ -0,0 +1,521 @@
+"""Optional compiled kernels for the scalar loops that do not vectorize.
+
+A few hot loops resolve pairs one after another, and every pair sees the
+positions and velocities the pairs before it left behind, so they cannot
+become one NumPy pass: handle_collisions() of the elastic collision
+simulator, the update/check_collision() loop of the bouncing ball
+simulator's discrete mode and FilingField's dipole double loop. Their
+arithmetic is repeated here, operation for operation, as plain loops over
+float arrays in the subset of Python that Numba compiles. sweep_pairs()
+is the broad phase that feeds the elastic kernel its candidate pairs
+(simcore.sweep), whose insertion sort and sweep are scalar loops too.
+
+The backend is picked once at startup by select() (from_args() for
+--kernels, else $SIMCORE_KERNELS, else "auto"): "numba" when Numba is
+installed and "python" otherwise. Forcing "numba" without Numba is an
+error. With the numba backend the callers gather their objects into
+arrays and call a kernel, which is compiled on its first call and cached
+on disk for later runs. With the python backend they keep their original
+loops, which the kernels reproduce. The interpreted backend takes the
+kernel path without compiling (each kernel runs as its `py_func`), which
+is slow but shows that the kernel path gives the original loops' results. The ball kernels take each ball's
+sleep island (-1 while awake, see simcore.sleep) and treat sleeping balls
+like the loops do: pairs of them are skipped, a slow ball touching one is
+pushed off it as from a static body, and a fast one wakes its island.
+They return the islands they woke, for the caller's SleepManager. Every
+kernel also runs uncompiled as `kernel.py_func`:
+
+    python -m simcore.kernels check   # compiled, plain Python, the scripts' loops and FilingField's loop agree
+    python -m simcore.kernels bench   # speedups of the compiled kernels
+
+Numba itself is imported only when the first kernel is compiled, so the
+startup check costs a module lookup.
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKENDS = ("auto", "numba", "python", "interpreted")
+BACKEND = "python"  # The backend in use: "numba", "python" or "interpreted"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Headless runs whose original loops and kernel path check() compares, long enough for balls to fall asleep
+SCRIPT_CHECKS = (
+    ("Bouncing Ball Simulator.py", 1500, ("--discrete", "--balls", "20", "--height", "0.3")),
+    ("Elastic Collision Simulator.py", 1000, ("--balls", "40", "--height", "0.3", "--radii", "6", "12")),
+)
+
+
+def select(choice=None):
+    """Pick the backend from `choice` or $SIMCORE_KERNELS ("auto": numba when it is installed)"""
+    global BACKEND
+    choice = choice or os.environ.get("SIMCORE_KERNELS") or "auto"
+    if choice not in BACKENDS:
+        raise ValueError(f"Unknown kernel backend {choice!r} (expected {', '.join(BACKENDS)})")
+    available = importlib.util.find_spec("numba") is not None
+    if choice == "numba" and not available:
+        raise RuntimeError("The numba kernel backend needs Numba: pip install numba")
+    if choice == "interpreted":
+        BACKEND = choice
+    else:
+        BACKEND = "numba" if available and choice != "python" else "python"
+    return BACKEND
+
+
+def compiled():
+    """True when the callers should use the kernels (compiled, or interpreted for checks)"""
+    return BACKEND != "python"
+
+
+class Kernel:
+    """A plain Python loop, compiled with Numba on its first call under the numba backend"""
+
+    def __init__(self, function):
+        self.py_func = function
+        self.__name__ = function.__name__
+        self.__doc__ = function.__doc__
+        self._compiled = None
+
+    def compile(self):
+        if self._compiled is None:
+            import numba
+
+            self._compiled = numba.njit(cache=True)(self.py_func)
+        return self._compiled
+
+    def __call__(self, *args):
+        if BACKEND == "numba":
+            return self.compile()(*args)
+        return self.py_func(*args)
+
+
+@Kernel
+def elastic_collisions(x, y, vx, vy, radius, mass, island, first, second, all_pairs, margin, sleep_speed):
+    """handle_collisions() over the pairs (first[k], second[k]), or over all pairs i < j when `all_pairs` is set.
+
+    Returns the (i, j) pairs within `margin` and the islands woken.
+    """
+    contacts = []
+    woken = [0][:0]  # An empty list of ints Numba can type
+    n = len(x)
+    count = n * (n - 1) // 2 if all_pairs else len(first)
+    i, j = 0, 0
+    for k in range(count):
+        if all_pairs:
+            j += 1
+            if j == n:
+                i += 1
+                j = i + 1
+        else:
+            i, j = first[k], second[k]
+        if island[i] >= 0 and island[j] >= 0:
+            continue  # Sleeping pairs cannot collide
+        dx = x[j] - x[i]
+        dy = y[j] - y[i]
+        distance = math.sqrt(dx**2 + dy**2)
+
+        if distance < radius[i] + radius[j] + margin:
+            contacts.append((i, j))
+
+        if distance < radius[i] + radius[j]:
+            if island[i] >= 0 or island[j] >= 0:
+                # SleepManager.on_contact(): wake the island or sleep.static_response()
+                awake, resting = (j, i) if island[i] >= 0 else (i, j)
+                if vx[awake] * vx[awake] + vy[awake] * vy[awake] > sleep_speed * sleep_speed:
+                    asleep = island[resting]
+                    woken.append(asleep)
+                    for m in range(n):
+                        if island[m] == asleep:
+                            island[m] = -1
+                else:
+                    sx = x[awake] - x[resting]
+                    sy = y[awake] - y[resting]
+                    gap = math.sqrt(sx * sx + sy * sy) or 1e-9
+                    nx, ny = sx / gap, sy / gap
+                    overlap = radius[awake] + radius[resting] - gap
+                    if overlap > 0:
+                        x[awake] += overlap * nx
+                        y[awake] += overlap * ny
+                    approach = vx[awake] * nx + vy[awake] * ny
+                    if approach < 0:
+                        vx[awake] -= approach * nx
+                        vy[awake] -= approach * ny
+                    continue
+
+            angle = math.atan2(dy, dx)
+            v1_parallel = vx[i] * math.cos(angle) + vy[i] * math.sin(angle)
+            v2_parallel = vx[j] * math.cos(angle) + vy[j] * math.sin(angle)
+            total = mass[i] + mass[j]
+            share_i = 2 * mass[j] / total
+            share_j = 2 * mass[i] / total
+            vx[i] += (v2_parallel - v1_parallel) * share_i * math.cos(angle)
+            vy[i] += (v2_parallel - v1_parallel) * share_i * math.sin(angle)
+            vx[j] += (v1_parallel - v2_parallel) * share_j * math.cos(angle)
+            vy[j] += (v1_parallel - v2_parallel) * share_j * math.sin(angle)
+
+            overlap = radius[i] + radius[j] - distance
+            x[i] -= overlap * (mass[j] / total) * math.cos(angle)
+            y[i] -= overlap * (mass[j] / total) * math.sin(angle)
+            x[j] += overlap * (mass[i] / total) * math.cos(angle)
+            y[j] += overlap * (mass[i] / total) * math.sin(angle)
+    return contacts, woken
+
+
+@Kernel
+def bounce_step(x, y, vx, vy, radius, island, dt, gravity, energy_loss, scale, width, ground, margin, sleep_speed):
+    """One discrete step of the bouncing balls: Ball.update() of the awake ones, then check_collision() with
+    later balls. Returns the (i, j) pairs within `margin` and the islands woken."""
+    contacts = []
+    woken = [0][:0]
+    n = len(x)
+    for i in range(n):
+        if island[i] < 0:  # Only awake balls move
+            vy[i] += gravity * dt
+            y[i] += vy[i] * scale * dt
+            x[i] += vx[i] * scale * dt
+            if y[i] + radius[i] >= ground:
+                y[i] = ground - radius[i]
+                vy[i] = -vy[i] * energy_loss
+            if x[i] - radius[i] <= 0 or x[i] + radius[i] >= width:
+                vx[i] = -vx[i] * energy_loss
+                x[i] = max(radius[i], min(width - radius[i], x[i]))
+            if abs(vy[i]) < 0.5 and y[i] >= ground - radius[i]:
+                vy[i] = 0.0
+                vx[i] *= 0.95
+
+        for j in range(i + 1, n):
+            if island[i] >= 0 and island[j] >= 0:
+                continue
+            dx = x[i] - x[j]
+            dy = y[i] - y[j]
+            reach = radius[i] + radius[j]
+            if dx * dx + dy * dy < (reach + margin) * (reach + margin):
+                contacts.append((i, j))
+            if (island[i] >= 0 or island[j] >= 0) and dx * dx + dy * dy < reach * reach:
+                # SleepManager.on_contact(): wake the island or sleep.static_response()
+                awake, resting = (j, i) if island[i] >= 0 else (i, j)
+                if vx[awake] * vx[awake] + vy[awake] * vy[awake] > sleep_speed * sleep_speed:
+                    asleep = island[resting]
+                    woken.append(asleep)
+                    for m in range(n):
+                        if island[m] == asleep:
+                            island[m] = -1
+                else:
+                    sx = x[awake] - x[resting]
+                    sy = y[awake] - y[resting]
+                    gap = math.sqrt(sx * sx + sy * sy) or 1e-9
+                    nx, ny = sx / gap, sy / gap
+                    overlap = reach - gap
+                    if overlap > 0:
+                        x[awake] += overlap * nx
+                        y[awake] += overlap * ny
+                    approach = vx[awake] * nx + vy[awake] * ny
+                    if approach < 0:
+                        vx[awake] -= approach * nx
+                        vy[awake] -= approach * ny
+                    continue
+
+            distance = math.sqrt(dx**2 + dy**2)
+            if distance < radius[i] + radius[j]:
+                nx, ny = dx / distance, dy / distance
+                p = 2 * (vx[i] * nx + vy[i] * ny - vx[j] * nx - vy[j] * ny) / 2
+                vx[i] -= p * nx
+                vy[i] -= p * ny
+                vx[j] += p * nx
+                vy[j] += p * ny
+    return contacts, woken
+
+
+@Kernel
+def dipole_forces(x, y, angle, fx, fy, strength, dipole_range):
+    """FilingField.apply_dipole_forces(): adds every filing's dipole force (local frame) to fx, fy"""
+    n = len(x)
+    range_squared = dipole_range * dipole_range
+    scale = strength * strength * 0.01
+    for i in range(n):
+        for j in range(i + 1, n):
+            if (x[i] - x[j])**2 + (y[i] - y[j])**2 >= range_squared:
+                continue
+            # Filing.apply_dipole_interaction of i with j, then of j with i
+            for a, b in ((i, j), (j, i)):
+                dx = x[b] - x[a]
+                dy = y[b] - y[a]
+                r_squared = dx*dx + dy*dy
+                if r_squared < 1:
+                    continue
+                r = math.sqrt(r_squared)
+                nx = dx / r
+                ny = dy / r
+                dot1 = nx * math.cos(angle[a]) + ny * math.sin(angle[a])
+                dot2 = nx * math.cos(angle[b]) + ny * math.sin(angle[b])
+                pair_strength = (3 * dot1 * dot2 - math.cos(angle[a] - angle[b])) / (r_squared * r)
+                pair_strength *= scale
+                fx[a] += nx * pair_strength
+                fy[a] += ny * pair_strength
+
+
+@Kernel
+def sweep_pairs(x, y, radius, order, margin, first, second):
+    """Sort and sweep: pairs (i < j) whose bounding boxes, grown by `margin`, overlap.
+
+    `order` holds the balls sorted by the left end of their x interval as of
+    the last call and is re-sorted in place with an insertion sort. The
+    pairs are written to `first` and `second` in sweep order. Returns their
+    number, which is larger than the arrays when they were too short: the
+    pairs that did not fit are only counted.
+    """
+    half = margin / 2
+    n = len(order)
+    for k in range(1, n):
+        ball = order[k]
+        left = x[ball] - radius[ball] - half
+        m = k - 1
+        while m >= 0 and x[order[m]] - radius[order[m]] - half > left:
+            order[m + 1] = order[m]
+            m -= 1
+        order[m + 1] = ball
+
+    count = 0
+    capacity = len(first)
+    for k in range(n):
+        a = order[k]
+        right = x[a] + radius[a] + half
+        for m in range(k + 1, n):
+            b = order[m]
+            if x[b] - radius[b] - half >= right:
+                break  # Every later ball starts further right
+            if abs(y[b] - y[a]) < radius[a] + radius[b] + margin:
+                if count < capacity:
+                    first[count] = min(a, b)
+                    second[count] = max(a, b)
+                count += 1
+    return count
+
+
+KERNELS = (elastic_collisions, bounce_step, sweep_pairs, dipole_forces)
+
+
+def _balls(count, seed, spread=400.0, speed=5.0):
+    """Overlapping balls of mixed sizes for the checks: x, y, vx, vy, radius"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    return [rng.uniform(0, spread, count), rng.uniform(0, spread, count), rng.uniform(-speed, speed, count),
+            rng.uniform(-speed, speed, count), rng.uniform(5, 12, count)]
+
+
+def _filings(count, seed):
+    """Positions and dipole angles packed as densely as settled filings: x, y, angle"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    side = 6 * math.sqrt(count)
+    return rng.uniform(0, side, count), rng.uniform(0, side, count), rng.uniform(0, 2 * math.pi, count)
+
+
+def _islands(count, seed, islands=40):
+    """Sleep islands for the ball checks: about a third of the balls asleep in `islands` islands, -1 awake"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed + 1)
+    return np.where(rng.random(count) < 1 / 3, rng.integers(0, islands, count), -1)
+
+
+def _run(kernel, function, count, seed, steps=1, listed=False):
+    """Arrays (and the contacts and islands woken, for the ball kernels) after running `function` on a check scene.
+
+    The plain Python kernel gets lists of floats, which it indexes about as
+    fast as the original loops read object attributes; NumPy arrays would
+    make it several times slower. With `listed`, elastic_collisions gets
+    every pair as a list instead of its all-pairs loop.
+    """
+    import numpy as np
+
+    from simcore.magnetic import DIPOLE_RANGE, DIPOLE_STRENGTH
+
+    convert = (lambda array: array.tolist()) if function is kernel.py_func else (lambda array: array)
+    if kernel is dipole_forces:
+        x, y, angle = map(convert, _filings(count, seed))
+        fx, fy = convert(np.zeros(count)), convert(np.zeros(count))
+        function(x, y, angle, fx, fy, float(DIPOLE_STRENGTH), float(DIPOLE_RANGE))
+        return [fx, fy], None
+    if kernel is sweep_pairs:
+        x, y, _, _, radius = _balls(count, seed)
+        order = np.argsort(x)  # Nearly sorted by left end, as after a frame of motion
+        capacity = 0
+        while True:
+            first, second = convert(np.zeros(capacity, dtype=np.int64)), convert(np.zeros(capacity, dtype=np.int64))
+            found = function(*map(convert, (x, y, radius, order)), 1.0, first, second)
+            if found <= capacity:
+                return [first, second], found
+            capacity = found
+    balls = _balls(count, seed)
+    island = _islands(count, seed)
+    balls[2][island >= 0] = balls[3][island >= 0] = 0.0  # Sleeping balls are at rest
+    arrays = [convert(array) for array in balls]
+    island = convert(island)
+    contacts = []
+    for _ in range(steps):
+        if kernel is elastic_collisions:
+            mass = convert((np.asarray(arrays[4]) / 10) ** 2)  # Mass grows with the area
+            first, second = np.triu_indices(count, 1) if listed else (np.empty(0, dtype=np.int64),) * 2
+            pairs, woken = function(*arrays, mass, island, convert(first), convert(second), not listed, 1.0, 4.0)
+        else:
+            pairs, woken = function(*arrays, island, 0.02, 9.8, 0.8, 17.0, 400.0, 380.0, 1.0, 4.0)
+        contacts.append((list(pairs), list(woken)))
+    return arrays + [island], contacts
+
+
+def _filing_field_forces(count, seed):
+    """Forces from FilingField's own pymunk loop on the dipole check scene, or None without pymunk"""
+    global BACKEND
+    import numpy as np
+
+    from simcore.magnetic import FilingField
+
+    if importlib.util.find_spec("pymunk") is None:
+        return None
+    field = FilingField(0, 0, count, margin=0)
+    for filing, *placed in zip(field.filings, *(array.tolist() for array in _filings(count, seed))):
+        filing.body.position = placed[:2]
+        filing.dipole_angle = placed[2]
+    backend, BACKEND = BACKEND, "python"  # The original loop, not the kernel
+    try:
+        field.apply_dipole_forces()
+    finally:
+        BACKEND = backend
+    return [np.array([filing.body.force.x for filing in field.filings]),
+            np.array([filing.body.force.y for filing in field.filings])]
+
+
+def _script_run(script, steps, arguments, backend, seed=0):
+    """Positions and velocities of every step of a headless script run with the given kernel backend"""
+    from simcore.trajectory import Trajectory
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.traj")
+        command = [sys.executable, os.path.join(ROOT, script), "--headless", "--steps", str(steps),
+                   "--seed", str(seed), "--kernels", backend, "--record", path, *arguments]
+        subprocess.run(command, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        recorded = Trajectory(path)
+        return [recorded.column("position").copy(), recorded.column("velocity").copy()]
+
+
+def _difference(arrays, reference):
+    """Largest difference between matching arrays, relative to the largest value (at least 1)"""
+    import numpy as np
+
+    return max(float(np.max(np.abs(np.asarray(a) - np.asarray(b)), initial=0.0)
+                     / max(1.0, float(np.max(np.abs(b), initial=0.0)))) for a, b in zip(arrays, reference))
+
+
+def check(count=300, steps=5, seed=0):
+    """Rows (kernel, comparison, largest relative difference): plain Python against compiled and the originals.
+
+    Compiled code squares with x*x, while CPython's x**2 calls the C pow(),
+    which can round the last bit differently. The ball kernels therefore
+    run only a few steps: colliding balls are chaotic, and over a long run
+    such a bit grows like any other rounding change. The scripts' original
+    loops are compared with their kernel path run uncompiled (the
+    interpreted backend), which does the same arithmetic, so those runs
+    can be long and must match in every step.
+    """
+    rows = []
+    for kernel in KERNELS:
+        runs = 1 if kernel is dipole_forces else steps
+        plain, plain_contacts = _run(kernel, kernel.py_func, count, seed, runs)
+        if importlib.util.find_spec("numba") is not None:
+            fast, fast_contacts = _run(kernel, kernel.compile(), count, seed, runs)
+            difference = _difference(plain, fast)
+            if plain_contacts != fast_contacts:
+                difference = math.inf
+            rows.append((kernel.__name__, "compiled vs plain Python", difference))
+        if kernel is elastic_collisions:
+            function = kernel.compile() if BACKEND == "numba" else kernel.py_func
+            reference, reference_contacts = _run(kernel, function, count, seed, runs)
+            listed, listed_contacts = _run(kernel, function, count, seed, runs, listed=True)
+            difference = _difference(listed, reference) if listed_contacts == reference_contacts else math.inf
+            rows.append((kernel.__name__, "listed pairs vs all pairs", difference))
+        if kernel is dipole_forces:
+            reference = _filing_field_forces(count, seed)
+            if reference is not None:
+                rows.append((kernel.__name__, "plain Python vs FilingField loop", _difference(plain, reference)))
+    for script, steps, arguments in SCRIPT_CHECKS:
+        original = _script_run(script, steps, arguments, "python")
+        kernel_path = _script_run(script, steps, arguments, "interpreted")
+        same_length = all(len(a) == len(b) for a, b in zip(kernel_path, original))
+        difference = _difference(kernel_path, original) if same_length else math.inf
+        rows.append((script.replace(" Simulator.py", ""), "kernel path vs original loop", difference))
+    return rows
+
+
+def bench(sizes=(100, 400, 1600), seed=0, repeats=3):
+    """Rows (kernel, size, plain Python seconds, compiled seconds or None) per call"""
+    rows = []
+    can_compile = importlib.util.find_spec("numba") is not None
+    for kernel in KERNELS:
+        functions = [kernel.py_func] + ([kernel.compile()] if can_compile else [])
+        if can_compile:
+            _run(kernel, functions[1], 8, seed)  # Compile (or load from the cache) outside the timing
+        for size in sizes:
+            times = []
+            for function in functions:
+                best = math.inf
+                for _ in range(repeats):
+                    started = time.perf_counter()
+                    _run(kernel, function, size, seed)
+                    best = min(best, time.perf_counter() - started)
+                times.append(best)
+            rows.append((kernel.__name__, size, times[0], times[1] if can_compile else None))
+    return rows
+
+
+def label():
+    return f"{BACKEND} kernels"
+
+
+def add_arguments(parser):
+    parser.add_argument("--kernels", choices=BACKENDS,
+                        help="compiled loops: numba, plain python, interpreted (the kernels uncompiled, for "
+                             "checks) or auto (numba when installed; default $SIMCORE_KERNELS or auto)")
+
+
+def from_args(args):
+    return select(args.kernels)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and time the optional compiled kernels")
+    parser.add_argument("command", choices=("check", "bench"))
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    from_args(args)
+    numba = importlib.util.find_spec("numba") is not None
+    print(f"Kernel backend: {BACKEND}" + ("" if numba else " (Numba is not installed)"))
+
+    if args.command == "check":
+        failed = 0
+        for name, comparison, difference in check():
+            ok = difference <= 1e-9
+            failed += not ok
+            print(f"{name:20} {comparison:34} largest difference {difference:.3g}{'' if ok else '  MISMATCH'}")
+        return 1 if failed else 0
+
+    for name, size, plain, fast in bench():
+        line = f"{name:20} n={size:<5} plain Python {plain * 1000:9.2f} ms"
+        if fast is not None:
+            line += f", compiled {fast * 1000:8.3f} ms ({plain / fast:6.1f}x)"
+        print(line)
+    return 0
+
+
+select()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,642 @@
+"""Iron filings in the field of bar magnets.
+
+Magnets give a simplified dipole field (inverse square strength, straight
+up or down inside the bar). Every filing is a small pymunk circle with a
+dipole angle that turns towards the local field; nearby filings also
+attract or repel each other as dipoles. Positions are in pixels.
+
+pymunk is imported when the first FilingField is built, so the module
+itself can be imported without it.
+
+FilingArrays is the same model without pymunk: positions, velocities,
+dipole angles and angular velocities live in NumPy arrays and every force
+is one vectorized pass, so no Python runs per filing. Nearby pairs come
+from a uniform grid of DIPOLE_RANGE + SKIN cells. The pair list is kept
+until the two filings that moved most have together moved SKIN, which
+takes many steps for slow filings. Filings closer than two radii are pushed apart along the same
+pairs, standing in for pymunk's circle collisions.
+
+With long_range=True FilingArrays couples every pair of filings, not
+just those within DIPOLE_RANGE, on a particle mesh. Each filing's dipole
+moment is spread over the four nodes of a MESH_SPACING grid around it
+(cloud in cell), the moment grids are convolved with the pair force
+kernel by FFT, and the result is interpolated back to the filings with
+the same weights. The grid is zero-padded to twice its size so the
+convolution does not wrap around. The mesh cannot resolve pairs a few
+nodes apart, so the pair list keeps them: between DIPOLE_RANGE and
+MESH_CUTOFF its share of the force fades out smoothly while the mesh
+kernel's fades in. All-pairs coupling then costs O(N + G log G) for G
+grid nodes instead of O(N^2); compare_mesh() measures the error against
+direct_dipole_forces().
+"""
+
+import math
+import random
+
+from simcore import kernels
+
+IRON_RADIUS = 2
+IRON_MASS = 1
+MAGNET_STRENGTH = 5000
+DAMPING = 0.7  # Air resistance
+DIPOLE_STRENGTH = 10  # Strength of dipole-dipole interaction
+DIPOLE_RANGE = 10  # Filings closer than this (pixels) interact
+SKIN = 4  # FilingArrays: extra pair list range (pixels)
+MESH_SPACING = 4  # FilingArrays: long-range grid spacing (pixels)
+MESH_CUTOFF = 2 * DIPOLE_RANGE  # FilingArrays: pairs hand over to the long-range mesh up to here
+
+
+class Magnet:
+    def __init__(self, pos, strength=MAGNET_STRENGTH, width=100, height=30, is_north_up=True):
+        self.pos = pos
+        self.strength = strength
+        self.width = width
+        self.height = height
+        self.is_north_up = is_north_up
+
+    @property
+    def bounds(self):
+        """(left, top, width, height) of the bar"""
+        return (self.pos[0] - self.width/2, self.pos[1] - self.height/2, self.width, self.height)
+
+    def field_arrays(self, x, y):
+        """get_field_at() for arrays of positions; returns (fx, fy) arrays"""
+        import numpy as np
+
+        dx = x - self.pos[0]
+        dy = y - self.pos[1]
+        distance_squared = np.maximum(dx*dx + dy*dy, 1)
+        strength = self.strength / distance_squared
+        direction = 1 if self.is_north_up else -1
+
+        # Outside: the dipole direction (3 dx dy, 3 dy^2 - r^2) / r^5, scaled to `strength`
+        fx = 3 * dx * dy
+        fy = 3 * dy * dy - distance_squared
+        scale = direction * strength / np.maximum(np.sqrt(fx*fx + fy*fy), 1e-300)
+        fx *= scale
+        fy *= scale
+        inside = (np.abs(dx) < self.width/2) & (np.abs(dy) < self.height/2)
+        fx[inside] = 0
+        fy[inside] = (direction * strength)[inside]
+        return fx, fy
+
+    def get_field_at(self, pos):
+        """Calculate magnetic field vector at given position"""
+        dx = pos[0] - self.pos[0]
+        dy = pos[1] - self.pos[1]
+        distance_squared = dx*dx + dy*dy
+
+        # Avoid division by zero
+        if distance_squared < 1:
+            distance_squared = 1
+
+        # Simple inverse square law for field strength
+        strength = self.strength / distance_squared
+
+        # Field direction depends on pole orientation
+        direction = 1 if self.is_north_up else -1
+
+        # Calculate field components
+        if abs(dx) < self.width/2 and abs(dy) < self.height/2:
+            # Inside the magnet, field points straight up or down
+            return (0, direction * strength)
+        else:
+            # Outside the magnet, field curves from north to south
+            r = math.sqrt(distance_squared)
+            # Simplified dipole field
+            fx = 3 * dx * dy * strength / (r**5) * direction
+            fy = strength * (3 * dy * dy / (r**5) - 1 / (r**3)) * direction
+
+            # Normalize and scale
+            mag = math.sqrt(fx*fx + fy*fy)
+            if mag > 0:
+                fx = fx / mag * strength
+                fy = fy / mag * strength
+
+            return (fx, fy)
+
+
+class Filing:
+    def __init__(self, space, pos):
+        import pymunk
+
+        self.body = pymunk.Body(IRON_MASS, pymunk.moment_for_circle(IRON_MASS, 0, IRON_RADIUS))
+        self.body.position = pos
+        self.shape = pymunk.Circle(self.body, IRON_RADIUS)
+        self.shape.friction = 0.5
+        self.shape.elasticity = 0.1
+
+        # Add damping to simulate air resistance
+        self.body.velocity_func = self.damping_velocity_func
+
+        # Dipole moment - initially random
+        self.dipole_angle = random.uniform(0, 2*math.pi)
+        self.dipole_strength = DIPOLE_STRENGTH
+
+        space.add(self.body, self.shape)
+
+    def damping_velocity_func(self, body, gravity, damping, dt):
+        # Custom damping function (pymunk's default integration with our damping)
+        type(body).update_velocity(body, gravity, DAMPING, dt)
+
+    def apply_magnetic_force(self, field_vector):
+        # Calculate torque to align with field
+        field_angle = math.atan2(field_vector[1], field_vector[0])
+        angle_diff = ((field_angle - self.dipole_angle + math.pi) % (2*math.pi)) - math.pi
+
+        # Torque is proportional to sine of angle difference
+        torque = self.dipole_strength * math.sin(angle_diff) * 5
+        self.body.angular_velocity += torque
+
+        # Update dipole angle based on body rotation
+        self.dipole_angle = (self.dipole_angle + self.body.angular_velocity * 0.1) % (2*math.pi)
+
+        # Apply force in direction of field gradient
+        field_strength = math.sqrt(field_vector[0]**2 + field_vector[1]**2)
+        force_scale = field_strength * 0.5
+        force = (field_vector[0] * force_scale, field_vector[1] * force_scale)
+        self.body.apply_force_at_local_point(force, (0, 0))
+
+    def apply_dipole_interaction(self, other):
+        # Calculate vector between filings
+        dx = other.body.position.x - self.body.position.x
+        dy = other.body.position.y - self.body.position.y
+        r_squared = dx*dx + dy*dy
+
+        if r_squared < 1:
+            return  # Avoid division by zero
+
+        # Calculate dipole-dipole interaction force
+        r = math.sqrt(r_squared)
+
+        # Get unit vector in direction of other filing
+        nx = dx / r
+        ny = dy / r
+
+        # Calculate dot products of dipole orientations with separation vector
+        dot1 = nx * math.cos(self.dipole_angle) + ny * math.sin(self.dipole_angle)
+        dot2 = nx * math.cos(other.dipole_angle) + ny * math.sin(other.dipole_angle)
+
+        # Calculate dipole-dipole interaction (simplified)
+        strength = (3 * dot1 * dot2 - math.cos(self.dipole_angle - other.dipole_angle)) / (r_squared * r)
+        strength *= self.dipole_strength * other.dipole_strength * 0.01
+
+        force = (nx * strength, ny * strength)
+        self.body.apply_force_at_local_point(force, (0, 0))
+
+
+class FilingField:
+    """Filings scattered over a width x height area around a list of magnets"""
+
+    def __init__(self, width, height, filings=0, magnets=(), margin=100):
+        import pymunk
+
+        self.width = width
+        self.height = height
+        self.margin = margin  # Filings are scattered at least this far from the edges
+        self.space = pymunk.Space()
+        self.space.gravity = (0, 0)  # No gravity
+        self.magnets = list(magnets)
+        self.filings = []
+        self.add_filings(filings)
+
+    def add_filings(self, count):
+        """Scatter `count` new filings with random positions and dipole angles"""
+        added = []
+        for _ in range(count):
+            x = random.uniform(self.margin, self.width - self.margin)
+            y = random.uniform(self.margin, self.height - self.margin)
+            added.append(Filing(self.space, (x, y)))
+        self.filings.extend(added)
+        return added
+
+    def set_magnets(self, magnets):
+        self.magnets[:] = magnets
+
+    def clear(self):
+        for filing in self.filings:
+            self.space.remove(filing.body, filing.shape)
+        self.filings.clear()
+
+    def apply_field_forces(self):
+        # Calculate total field at each filing position
+        for filing in self.filings:
+            total_field = [0, 0]
+            for magnet in self.magnets:
+                field = magnet.get_field_at(filing.body.position)
+                total_field[0] += field[0]
+                total_field[1] += field[1]
+
+            filing.apply_magnetic_force(total_field)
+
+    def apply_dipole_forces(self):
+        if kernels.compiled():
+            return self._apply_dipole_kernel()
+        # Dipole-dipole interactions between nearby filings
+        filings = self.filings
+        range_squared = DIPOLE_RANGE * DIPOLE_RANGE
+        for i, filing1 in enumerate(filings):
+            pos1 = filing1.body.position
+            # Only check filings that haven't been checked yet
+            for filing2 in filings[i+1:]:
+                pos2 = filing2.body.position
+                dist_squared = (pos1.x - pos2.x)**2 + (pos1.y - pos2.y)**2
+                if dist_squared < range_squared:  # Only interact with nearby filings
+                    filing1.apply_dipole_interaction(filing2)
+                    filing2.apply_dipole_interaction(filing1)
+
+    def _apply_dipole_kernel(self):
+        """The loop above as simcore.kernels.dipole_forces, one force per filing instead of one per pair"""
+        import numpy as np
+
+        filings = self.filings
+        x = np.array([filing.body.position.x for filing in filings], dtype=float)
+        y = np.array([filing.body.position.y for filing in filings], dtype=float)
+        angle = np.array([filing.dipole_angle for filing in filings], dtype=float)
+        fx, fy = np.zeros(len(filings)), np.zeros(len(filings))
+        kernels.dipole_forces(x, y, angle, fx, fy, float(DIPOLE_STRENGTH), float(DIPOLE_RANGE))
+        for filing, force in zip(filings, zip(fx.tolist(), fy.tolist())):
+            filing.body.apply_force_at_local_point(force, (0, 0))
+
+    def integrate(self, dt):
+        self.space.step(dt)
+
+    def step(self, dt=1/60.0):
+        self.apply_field_forces()
+        self.apply_dipole_forces()
+        self.integrate(dt)
+
+    def __len__(self):
+        return len(self.filings)
+
+    def state(self):
+        """Filing positions (n, 2) and dipole angles (n,)"""
+        import numpy as np
+
+        positions = [tuple(filing.body.position) for filing in self.filings]
+        return {"position": np.array(positions, dtype=float).reshape(-1, 2),
+                "angle": np.array([filing.dipole_angle for filing in self.filings], dtype=float)}
+
+    def restore(self, state):
+        for filing, position, angle in zip(self.filings, state["position"].tolist(), state["angle"].tolist()):
+            filing.body.position = position
+            filing.dipole_angle = angle
+
+
+class FilingArrays:
+    """FilingField's filings and forces in NumPy arrays, without pymunk or per-filing Python"""
+
+    def __init__(self, width, height, filings=0, magnets=(), margin=100, long_range=False,
+                 mesh_spacing=MESH_SPACING):
+        """`long_range` adds the dipole coupling beyond DIPOLE_RANGE on a particle mesh"""
+        import numpy as np
+
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.magnets = list(magnets)
+        self.long_range = long_range
+        self.mesh_spacing = mesh_spacing
+        self.cutoff = MESH_CUTOFF if long_range else DIPOLE_RANGE  # Pair list interaction range
+        self._kernels = None  # FFTs of the long-range kernel components
+        self._kernels_for = None  # (padded shape, spacing) they were built for
+        self.position = np.empty((0, 2))
+        self.velocity = np.empty((0, 2))
+        self.angle = np.empty(0)
+        self.angular_velocity = np.empty(0)
+        self.force = np.empty((0, 2))
+        self.pair_builds = 0
+        self._pairs = None  # (i, j) index arrays of the filings within DIPOLE_RANGE + SKIN
+        self._built_at = None  # Positions when the pair list was built
+        self.add_filings(filings)
+
+    def __len__(self):
+        return len(self.position)
+
+    def add_filings(self, count):
+        """Scatter `count` new filings with random positions and dipole angles; returns their indices"""
+        import numpy as np
+
+        start = len(self)
+        x = np.random.uniform(self.margin, self.width - self.margin, count)
+        y = np.random.uniform(self.margin, self.height - self.margin, count)
+        self.position = np.concatenate((self.position, np.column_stack((x, y))))
+        self.velocity = np.concatenate((self.velocity, np.zeros((count, 2))))
+        self.angle = np.concatenate((self.angle, np.random.uniform(0, 2*math.pi, count)))
+        self.angular_velocity = np.concatenate((self.angular_velocity, np.zeros(count)))
+        self.force = np.zeros_like(self.position)
+        self._pairs = None
+        return np.arange(start, len(self))
+
+    def set_magnets(self, magnets):
+        self.magnets[:] = magnets
+
+    def clear(self):
+        self.position, self.velocity = self.position[:0], self.velocity[:0]
+        self.angle, self.angular_velocity = self.angle[:0], self.angular_velocity[:0]
+        self.force = self.force[:0]
+        self._pairs = None
+
+    def apply_field_forces(self):
+        """Filing.apply_magnetic_force for every filing"""
+        import numpy as np
+
+        x, y = self.position[:, 0], self.position[:, 1]
+        fx = np.zeros(len(self))
+        fy = np.zeros(len(self))
+        for magnet in self.magnets:
+            mx, my = magnet.field_arrays(x, y)
+            fx += mx
+            fy += my
+
+        # Torque towards the field: sin(field angle - dipole angle), from the field's components
+        strength = np.sqrt(fx*fx + fy*fy)
+        no_field = strength == 0
+        cos_field = np.where(no_field, 1, fx / np.where(no_field, 1, strength))
+        sin_field = np.where(no_field, 0, fy / np.where(no_field, 1, strength))
+        torque = DIPOLE_STRENGTH * (sin_field * np.cos(self.angle) - cos_field * np.sin(self.angle)) * 5
+        self.angular_velocity += torque
+        self.angle += self.angular_velocity * 0.1
+        np.remainder(self.angle, 2*math.pi, out=self.angle)
+
+        force_scale = strength * 0.5
+        self.force[:, 0] = fx * force_scale
+        self.force[:, 1] = fy * force_scale
+
+    def _build_pairs(self):
+        """All pairs closer than cutoff + SKIN, from a grid of cells that size"""
+        import numpy as np
+
+        reach = self.cutoff + SKIN
+        cells = np.floor(self.position / reach).astype(np.int64)
+        cells -= cells.min(axis=0) - 1 if len(cells) else 0
+        rows = int(cells[:, 1].max()) + 2 if len(cells) else 1
+        keys = cells[:, 0] * rows + cells[:, 1]
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        x, y = self.position[order, 0], self.position[order, 1]  # In cell order, so the gathers below stay local
+        here = np.arange(len(keys))
+        first, second = [], []
+        # This cell (later filings only) and four neighbours, so every pair is found once
+        for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+            wanted = sorted_keys + dx * rows + dy
+            start = np.searchsorted(sorted_keys, wanted, "left")
+            end = np.searchsorted(sorted_keys, wanted, "right")
+            if dx == dy == 0:
+                start = here + 1
+            counts = np.maximum(end - start, 0)
+            total = int(counts.sum())
+            if not total:
+                continue
+            i = np.repeat(here, counts)
+            j = np.arange(total) + np.repeat(start - np.cumsum(counts) + counts, counts)
+            near = (x[j] - x[i]) ** 2 + (y[j] - y[i]) ** 2 < reach * reach
+            first.append(order[i[near]])
+            second.append(order[j[near]])
+        if first:
+            self._pairs = (np.concatenate(first), np.concatenate(second))
+        else:
+            self._pairs = (np.empty(0, np.intp), np.empty(0, np.intp))
+        self._built_at = self.position.copy()
+        self.pair_builds += 1
+
+    def pairs(self):
+        """Index arrays (i, j) of every pair that may be within the cutoff"""
+        import numpy as np
+
+        if self._pairs is not None and len(self) > 1:
+            # A pair can only have come within range if its two filings moved SKIN together
+            moved = self.position - self._built_at
+            moved = np.sqrt(np.einsum("ij,ij->i", moved, moved))
+            if np.sum(np.partition(moved, -2)[-2:]) > SKIN:
+                self._pairs = None
+        if self._pairs is None:
+            self._build_pairs()
+        return self._pairs
+
+    def apply_dipole_forces(self):
+        """Filing.apply_dipole_interaction for every pair within DIPOLE_RANGE, and overlap repulsion.
+
+        With long_range the pairs out to MESH_CUTOFF and mesh_forces() add the rest.
+        """
+        import numpy as np
+
+        pairs_i, pairs_j = self.pairs()
+        n = len(self)
+        x, y = self.position[:, 0], self.position[:, 1]
+        all_dx = x[pairs_j] - x[pairs_i]
+        all_dy = y[pairs_j] - y[pairs_i]
+        all_r_squared = all_dx*all_dx + all_dy*all_dy
+
+        # With d = (dx, dy) and p = d . dipole, the pairwise loop's force on i is
+        # d (3 p_i p_j / r^2 - cos(angle_i - angle_j)) / r^4 (times the strengths), and -that on j
+        keep = np.flatnonzero((all_r_squared < self.cutoff * self.cutoff) & (all_r_squared >= 1))
+        i, j = pairs_i[keep], pairs_j[keep]
+        dx, dy = all_dx[keep], all_dy[keep]
+        inverse = 1 / all_r_squared[keep]
+        cos_angle, sin_angle = np.cos(self.angle), np.sin(self.angle)
+        cos_i, sin_i, cos_j, sin_j = cos_angle[i], sin_angle[i], cos_angle[j], sin_angle[j]
+        strength = (3 * (dx*cos_i + dy*sin_i) * (dx*cos_j + dy*sin_j) * inverse - (cos_i*cos_j + sin_i*sin_j))
+        strength *= inverse * inverse * (DIPOLE_STRENGTH * DIPOLE_STRENGTH * 0.01)
+        if self.long_range:
+            handed_over = np.flatnonzero(all_r_squared[keep] >= DIPOLE_RANGE * DIPOLE_RANGE)
+            strength[handed_over] *= 1 - _mesh_share(np.sqrt(all_r_squared[keep[handed_over]]))
+        fx = dx * strength
+        fy = dy * strength
+        self.force[:, 0] += np.bincount(i, fx, n) - np.bincount(j, fx, n)
+        self.force[:, 1] += np.bincount(i, fy, n) - np.bincount(j, fy, n)
+        if self.long_range:
+            self.force += self.mesh_forces()
+
+        # Overlapping filings: move each half of the overlap apart (pymunk's collisions)
+        overlap = np.flatnonzero(all_r_squared < (2 * IRON_RADIUS) ** 2)
+        if len(overlap):
+            oi, oj = pairs_i[overlap], pairs_j[overlap]
+            r = np.sqrt(all_r_squared[overlap])
+            apart = r > 1e-9
+            depth = (2 * IRON_RADIUS - r) * 0.5 / np.where(apart, r, 1)
+            # Coincident filings are split along x
+            push_x = np.where(apart, all_dx[overlap] * depth, 2 * IRON_RADIUS * 0.5)
+            push_y = np.where(apart, all_dy[overlap] * depth, 0)
+            self.position[:, 0] += np.bincount(oj, push_x, n) - np.bincount(oi, push_x, n)
+            self.position[:, 1] += np.bincount(oj, push_y, n) - np.bincount(oi, push_y, n)
+
+    @property
+    def mesh_shape(self):
+        """Grid nodes (x, y) covering the window at mesh_spacing"""
+        return (int(math.ceil(self.width / self.mesh_spacing)) + 1,
+                int(math.ceil(self.height / self.mesh_spacing)) + 1)
+
+    @property
+    def padded_shape(self):
+        """The FFT grid: at least 2n - 1 nodes per axis, so the convolution never wraps around"""
+        return tuple(_fast_length(2 * nodes - 1) for nodes in self.mesh_shape)
+
+    def _mesh_kernels(self):
+        """rfft2 of the kernel T[a, b, c] with F_i[a] = sum_j T[a, b, c](x_j - x_i) m_i[b] m_j[c]"""
+        import numpy as np
+
+        px, py = self.padded_shape
+        h = self.mesh_spacing
+        # Separations of the padded grid in FFT order: 0, h, 2h, ..., then the negative ones
+        sx = np.fft.fftfreq(px, 1 / px)[:, None] * h
+        sy = np.fft.fftfreq(py, 1 / py)[None, :] * h
+        r_squared = sx*sx + sy*sy
+        share = _mesh_share(np.sqrt(r_squared))  # Zero for the pairs the pair list handles alone
+        inverse = 1 / np.where(r_squared > 0, r_squared, 1)
+        # The convolution sums T(x_j - x) over sources x_j, so the kernel at separation s is T(-s) = -T(s)
+        d = (-sx, -sy)
+        scale = DIPOLE_STRENGTH * DIPOLE_STRENGTH * 0.01
+        kernels = np.empty((2, 2, 2, px, py // 2 + 1), dtype=complex)
+        for a in range(2):
+            for b in range(2):
+                for c in range(2):
+                    kernel = 3 * d[a] * d[b] * d[c] * inverse**3
+                    if b == c:
+                        kernel = kernel - d[a] * inverse**2
+                    kernels[a, b, c] = np.fft.rfft2(np.broadcast_to(kernel * share * scale, r_squared.shape))
+        # Undo the smoothing of spreading and gathering with cloud in cell weights
+        kernels /= (np.sinc(np.fft.fftfreq(px))[:, None] * np.sinc(np.fft.rfftfreq(py))[None, :]) ** 2
+        return kernels
+
+    def mesh_forces(self):
+        """The long-range part (n, 2) of every filing's dipole force, by particle-mesh convolution"""
+        import numpy as np
+
+        nx, ny = self.mesh_shape
+        px, py = self.padded_shape
+        if self._kernels_for != ((px, py), self.mesh_spacing):
+            self._kernels = self._mesh_kernels()
+            self._kernels_for = ((px, py), self.mesh_spacing)
+        forces = np.zeros((len(self), 2))
+        grid = self.position / self.mesh_spacing
+        # Filings blown off the window are left out of the mesh
+        inside = np.flatnonzero((grid[:, 0] >= 0) & (grid[:, 0] < nx - 1) & (grid[:, 1] >= 0) & (grid[:, 1] < ny - 1))
+        if not len(inside):
+            return forces
+        grid = grid[inside]
+        base = grid.astype(np.intp)
+        fx, fy = (grid - base).T
+        # Cloud in cell: the four surrounding nodes of the padded grid and their weights
+        node = base[:, 0] * py + base[:, 1]
+        nodes = np.concatenate((node, node + py, node + 1, node + py + 1))
+        weights = np.concatenate(((1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy))
+        moment = (np.cos(self.angle[inside]), np.sin(self.angle[inside]))
+
+        moment_ffts = [np.fft.rfft2(np.bincount(nodes, weights * np.tile(m, 4), px * py).reshape(px, py))
+                       for m in moment]
+        for a in range(2):
+            for b in range(2):
+                spectrum = self._kernels[a, b, 0] * moment_ffts[0] + self._kernels[a, b, 1] * moment_ffts[1]
+                field = np.fft.irfft2(spectrum, s=(px, py))
+                at_filings = (field.ravel()[nodes] * weights).reshape(4, -1).sum(axis=0)
+                forces[inside, a] += moment[b] * at_filings
+        return forces
+
+    def integrate(self, dt):
+        """pymunk's step with the filings' damping: move with the old velocity, then damp and accelerate"""
+        self.position += self.velocity * dt
+        self.velocity *= DAMPING
+        self.velocity += self.force * (dt / IRON_MASS)
+        self.angular_velocity *= DAMPING
+        self.force[:] = 0
+
+    def step(self, dt=1/60.0):
+        self.apply_field_forces()
+        self.apply_dipole_forces()
+        self.integrate(dt)
+
+    def state(self):
+        """Filing positions (n, 2) and dipole angles (n,)"""
+        return {"position": self.position.copy(), "angle": self.angle.copy()}
+
+    def restore(self, state):
+        self.position[...] = state["position"]
+        self.angle[...] = state["angle"]
+
+
+def _fast_length(n):
+    """The smallest length of at least n with no prime factor above 5, which FFTs handle quickly"""
+    best = 2 * n
+    power_of_five = 1
+    while power_of_five < best:
+        power_of_three = power_of_five
+        while power_of_three < best:
+            length = power_of_three
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            power_of_three *= 3
+        power_of_five *= 5
+    return best
+
+
+def _mesh_share(r):
+    """Fraction of the pair force at distance `r` left to the mesh: 0 up to DIPOLE_RANGE, 1 from MESH_CUTOFF"""
+    import numpy as np
+
+    t = np.clip((r - DIPOLE_RANGE) / (MESH_CUTOFF - DIPOLE_RANGE), 0, 1)
+    return t * t * (3 - 2 * t)
+
+
+def direct_dipole_forces(position, angle, chunk=1024):
+    """Pair dipole forces (n, 2) summed over all pairs of filings, O(n^2)"""
+    import numpy as np
+
+    n = len(position)
+    forces = np.zeros((n, 2))
+    cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+    for start in range(0, n, chunk):
+        rows = slice(start, min(start + chunk, n))
+        dx = position[None, :, 0] - position[rows, 0, None]
+        dy = position[None, :, 1] - position[rows, 1, None]
+        r_squared = dx*dx + dy*dy
+        near = r_squared >= 1  # Like the pair loop, which also skips a filing paired with itself
+        inverse = np.where(near, 1 / np.where(near, r_squared, 1), 0)
+        cos_i, sin_i = cos_angle[rows, None], sin_angle[rows, None]
+        strength = (3 * (dx*cos_i + dy*sin_i) * (dx*cos_angle + dy*sin_angle) * inverse
+                    - (cos_i*cos_angle + sin_i*sin_angle))
+        strength *= inverse * inverse * (DIPOLE_STRENGTH * DIPOLE_STRENGTH * 0.01)
+        forces[rows, 0] = (dx * strength).sum(axis=1)
+        forces[rows, 1] = (dy * strength).sum(axis=1)
+    return forces
+
+
+def compare_mesh(filings):
+    """Errors of the cut-off and particle-mesh dipole forces of FilingArrays `filings` against direct summation.
+
+    Returns relative RMS errors over all filings and the time each method took.
+    """
+    import time
+
+    import numpy as np
+
+    def dipole_forces(probe):
+        probe.position, probe.angle = filings.position.copy(), filings.angle.copy()
+        probe.force = np.zeros_like(probe.position)
+        probe._pairs = None
+        started = time.perf_counter()
+        probe.apply_dipole_forces()  # Forces come from the positions before the overlap push
+        return probe.force, time.perf_counter() - started
+
+    started = time.perf_counter()
+    exact = direct_dipole_forces(filings.position, filings.angle)
+    direct_seconds = time.perf_counter() - started
+    cut_off, cut_off_seconds = dipole_forces(FilingArrays(filings.width, filings.height))
+    probe = FilingArrays(filings.width, filings.height, long_range=True, mesh_spacing=filings.mesh_spacing)
+    dipole_forces(probe)  # Builds the kernels
+    mesh, mesh_seconds = dipole_forces(probe)
+    norm = np.sqrt(np.mean(np.sum(exact * exact, axis=1)))
+
+    def error(forces):
+        difference = forces - exact
+        return float(np.sqrt(np.mean(np.sum(difference * difference, axis=1))) / norm) if norm else 0.0
+
+    return {
+        "filings": len(filings),
+        "cut_off_error": error(cut_off),
+        "mesh_error": error(mesh),
+        "direct_seconds": direct_seconds,
+        "cut_off_seconds": cut_off_seconds,
+        "mesh_seconds": mesh_seconds,
+    }
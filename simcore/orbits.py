@@ -0,0 +1,258 @@
+"""Planets and asteroids orbiting the Sun.
+
+Positions are in metres and velocities in m/s with the Sun at the origin.
+Every body feels the Sun only (planet-planet forces are left out) and is
+advanced with semi-implicit Euler steps. `radius` is the body's drawing
+radius in pixels; it is also the close-encounter cutoff of the force,
+as in the original simulator.
+
+With block_timesteps=True every body gets its own step of dt * 2**level
+(level 0 to MAX_LEVEL), the largest power of two that still gives it
+STEPS_PER_ORBIT steps per local dynamical period 2 pi sqrt(r / |a|), the
+orbital period on a circular orbit. Drifts stay global: all bodies move
+with their velocity every step, so positions are always in sync. Kicks
+(and so force evaluations) happen only at the ends of each body's own
+step, as a closing half kick with the old step and an opening half kick
+with the new one (kick-drift-kick leapfrog). A body may move to a longer
+step only where the longer step starts, so the hierarchy stays aligned.
+Mercury keeps the base step, and the outer planets and the belt are
+kicked 8 to 128 times less often.
+
+TestParticles is a population of massless bodies (a belt or debris cloud)
+kept as NumPy arrays rather than Body objects. The particles feel the Sun
+and the planets but exert no force, so a step costs O(particles x
+massive bodies) in vectorized passes, and a particle takes four numbers
+(16 bytes in float32, 32 in float64) instead of a Python object.
+"""
+
+import math
+import random
+
+G = 6.67430e-11  # Gravitational constant
+SUN_MASS = 1.989e30  # kg
+
+# name, orbital radius (m), mass (kg), drawing radius (px), orbital speed (m/s)
+PLANETS = [
+    ("Mercury", 5.79e10, 3.285e23, 5, 47.87e3),
+    ("Venus", 1.082e11, 4.867e24, 7, 35.02e3),
+    ("Earth", 1.496e11, 5.972e24, 8, 29.78e3),
+    ("Mars", 2.279e11, 6.39e23, 6, 24.07e3),
+    ("Jupiter", 7.785e11, 1.898e27, 12, 13.07e3),
+    ("Saturn", 1.429e12, 5.683e26, 10, 9.69e3),
+    # Adjusted distances for Uranus and Neptune to fit on screen
+    ("Uranus", 1.8e12, 8.681e25, 11, 6.81e3),
+    ("Neptune", 2.2e12, 1.024e26, 9, 5.43e3),
+]
+BELT = (3.3e11, 4.9e11)  # Asteroid belt between Mars and Jupiter (m)
+PARTICLE_CHUNK = 16384  # Test particles per vectorized pass; the scratch arrays stay in cache
+SOFTENING = 1e8  # m; keeps the pull of a close planet finite for test particles
+STEPS_PER_ORBIT = 2000  # Block timesteps: least steps per dynamical period (Mercury gets 2100 at 1 hour)
+MAX_LEVEL = 10  # Block timesteps: longest step is dt * 2**MAX_LEVEL
+
+
+class Body:
+    def __init__(self, x, y, mass, radius, name="", vx=0, vy=0):
+        self.x = x
+        self.y = y
+        self.mass = mass
+        self.radius = max(radius, 3)  # Ensure minimum visibility
+        self.name = name
+        self.vx = vx
+        self.vy = vy
+        self.ax = 0
+        self.ay = 0
+
+    def update_position(self, dt):
+        # Update velocity based on acceleration
+        self.vx += self.ax * dt
+        self.vy += self.ay * dt
+        # Update position based on velocity
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+
+    def apply_gravity(self, other):
+        dx = other.x - self.x
+        dy = other.y - self.y
+        r = math.sqrt(dx**2 + dy**2)
+
+        if r < self.radius + other.radius:
+            return  # Prevent extreme forces in case of collision
+
+        force = G * self.mass * other.mass / r**2
+        ax = force / self.mass * (dx / r)
+        ay = force / self.mass * (dy / r)
+
+        self.ax += ax
+        self.ay += ay
+
+
+class TestParticles:
+    """Massless bodies in one (4, n) array `state` of `dtype`; x, y, vx and vy are its rows"""
+
+    def __init__(self, x, y, vx, vy, dtype="float64"):
+        import numpy as np
+
+        self.state = np.array([x, y, vx, vy], dtype=dtype).reshape(4, -1)
+        self.x, self.y, self.vx, self.vy = self.state
+        self.dtype = self.state.dtype
+        self._scratch = None
+
+    @classmethod
+    def belt(cls, count, inner=BELT[0], outer=BELT[1], dtype="float64"):
+        """`count` particles on circular orbits around the Sun between `inner` and `outer` (m)"""
+        import numpy as np
+
+        r = np.random.uniform(inner, outer, count)
+        phase = np.random.uniform(0, 2 * np.pi, count)
+        speed = np.sqrt(G * SUN_MASS / r)
+        return cls(r * np.cos(phase), r * np.sin(phase), -speed * np.sin(phase), speed * np.cos(phase), dtype)
+
+    def __len__(self):
+        return self.state.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.state.nbytes
+
+    @property
+    def bytes_per_particle(self):
+        return 4 * self.dtype.itemsize
+
+    def step(self, dt, sources):
+        """Advance by `dt` under the gravity of `sources`, a list of (x, y, mass)"""
+        import numpy as np
+
+        if self._scratch is None:
+            self._scratch = np.empty((6, min(len(self), PARTICLE_CHUNK)), self.dtype)
+        number = self.dtype.type
+        dt = number(dt)
+        softening = number(SOFTENING ** 2)
+        sources = [(number(x), number(y), number(G * mass)) for x, y, mass in sources]
+        for start in range(0, len(self), PARTICLE_CHUNK):
+            chunk = slice(start, start + PARTICLE_CHUNK)
+            x, y, vx, vy = self.x[chunk], self.y[chunk], self.vx[chunk], self.vy[chunk]
+            ax, ay, dx, dy, r2, factor = self._scratch[:, :len(x)]
+            ax.fill(0)
+            ay.fill(0)
+            for source_x, source_y, gm in sources:
+                np.subtract(source_x, x, out=dx)
+                np.subtract(source_y, y, out=dy)
+                np.multiply(dx, dx, out=r2)
+                np.multiply(dy, dy, out=factor)
+                r2 += factor
+                r2 += softening
+                np.sqrt(r2, out=factor)
+                factor *= r2  # r^3
+                np.divide(gm, factor, out=factor)
+                dx *= factor
+                dy *= factor
+                ax += dx
+                ay += dy
+            # Semi-implicit Euler, as Body.update_position
+            ax *= dt
+            ay *= dt
+            vx += ax
+            vy += ay
+            np.multiply(vx, dt, out=dx)
+            np.multiply(vy, dt, out=dy)
+            x += dx
+            y += dy
+
+
+class SolarSystem:
+    def __init__(self, asteroids=0, particles=0, particle_dtype="float64", block_timesteps=False):
+        self.sun = Body(0, 0, SUN_MASS, 15, "Sun")
+        self.planets = [Body(distance, 0, mass, radius, name, 0, speed)
+                        for name, distance, mass, radius, speed in PLANETS]
+        self.massive = [self.sun] + self.planets  # Bodies the test particles feel
+        self.add_asteroid_belt(asteroids)
+        self.particles = TestParticles.belt(particles, dtype=particle_dtype) if particles else None
+        self.block_timesteps = block_timesteps
+        self.ticks = 0  # Steps taken
+        self.force_evaluations = 0
+        self._bins = None  # Block timesteps: the bodies on each level
+
+    def add_asteroid_belt(self, count, mass=1e18):
+        """Add `count` small bodies on circular orbits in the asteroid belt"""
+        for _ in range(count):
+            r = random.uniform(*BELT)
+            phase = random.uniform(0, 2 * math.pi)
+            speed = math.sqrt(G * self.sun.mass / r)
+            self.planets.append(Body(r * math.cos(phase), r * math.sin(phase), mass, 1, "",
+                                     -speed * math.sin(phase), speed * math.cos(phase)))
+
+    def __len__(self):
+        return len(self.planets) + 1 + (len(self.particles) if self.particles is not None else 0)
+
+    def step(self, dt):
+        if self.particles is not None:
+            # Pulled towards where the planets are at the start of the step
+            self.particles.step(dt, [(body.x, body.y, body.mass) for body in self.massive])
+        if self.block_timesteps:
+            self._block_step(dt)
+            return
+        sun = self.sun
+        for planet in self.planets:
+            planet.ax, planet.ay = 0, 0  # Reset acceleration
+            planet.apply_gravity(sun)  # Apply Sun's gravity
+            planet.update_position(dt)
+        self.ticks += 1
+        self.force_evaluations += len(self.planets)
+
+    def _accelerate(self, body):
+        body.ax, body.ay = 0, 0
+        body.apply_gravity(self.sun)
+        self.force_evaluations += 1
+
+    def _level(self, body, dt, ticks):
+        """Longest step level allowed by the body's dynamical time that starts at `ticks`"""
+        acceleration = math.hypot(body.ax, body.ay)
+        if acceleration == 0:
+            longest = math.inf
+        else:
+            longest = 2 * math.pi * math.sqrt(math.hypot(body.x - self.sun.x, body.y - self.sun.y) / acceleration)
+            longest /= STEPS_PER_ORBIT
+        level = 0
+        while level < MAX_LEVEL and dt * 2 ** (level + 1) <= longest and ticks % 2 ** (level + 1) == 0:
+            level += 1
+        return level
+
+    def _block_step(self, dt):
+        if self._bins is None:
+            # Opening half kicks from the forces at the start
+            self._bins = [[] for _ in range(MAX_LEVEL + 1)]
+            for body in self.planets:
+                self._accelerate(body)
+                level = self._level(body, dt, self.ticks)
+                half = dt * 2 ** level / 2
+                body.vx += body.ax * half
+                body.vy += body.ay * half
+                self._bins[level].append(body)
+
+        for body in self.planets:
+            body.x += body.vx * dt
+            body.y += body.vy * dt
+        self.ticks += 1
+
+        # Levels whose steps end now: closing half kick, new level, opening half kick
+        last = min((self.ticks & -self.ticks).bit_length() - 1, MAX_LEVEL)
+        ending = [(level, self._bins[level]) for level in range(last + 1)]
+        for level in range(last + 1):
+            self._bins[level] = []
+        for level, bodies in ending:
+            for body in bodies:
+                self._accelerate(body)
+                new_level = self._level(body, dt, self.ticks)
+                half = dt * (2 ** level + 2 ** new_level) / 2
+                body.vx += body.ax * half
+                body.vy += body.ay * half
+                self._bins[new_level].append(body)
+
+    def level_counts(self):
+        """Bodies on each block timestep level (empty levels above the highest left out)"""
+        if self._bins is None:
+            return []
+        counts = [len(bodies) for bodies in self._bins]
+        while counts and not counts[-1]:
+            counts.pop()
+        return counts
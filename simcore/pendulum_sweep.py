@@ -0,0 +1,142 @@
+"""Parameter sweeps and decay analysis for the damped pendulum.
+
+sweep() integrates every combination of initial angle, mass, length and
+damping at once as a PendulumEnsemble and measures, for each run:
+
+* period: mean time between upward zero crossings of the angle (s)
+* decay: amplitude decay constant, the least-squares slope of
+  -ln(peak angle) against peak time (1/s). For small angles this is
+  damping / (2 * mass).
+
+Both are extracted while integrating, so no trajectories are stored.
+Results are memoised per parameter combination in an on-disk cache, so
+repeated or overlapping sweeps only integrate the new points.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from simcore.pendulum import GRAVITY, PendulumEnsemble
+
+CACHE_DIR = ".sweep_cache"
+MIN_AMPLITUDE = 1e-6  # Peaks below this (rad) are numerical noise
+
+
+def analyse(ensemble, duration, dt):
+    """Integrate an ensemble for `duration` seconds and return (period, decay) arrays"""
+    n = len(ensemble)
+    first_crossing = np.full(n, np.nan)
+    last_crossing = np.full(n, np.nan)
+    crossings = np.zeros(n)
+
+    # Running sums for the least-squares fit of ln(peak) against time
+    peaks = np.zeros(n)
+    sum_t = np.zeros(n)
+    sum_tt = np.zeros(n)
+    sum_y = np.zeros(n)
+    sum_ty = np.zeros(n)
+
+    for _ in range(int(round(duration / dt))):
+        t0 = ensemble.time
+        theta0, omega0 = ensemble.angle, ensemble.angular_velocity
+        ensemble.step(dt)
+        theta1, omega1 = ensemble.angle, ensemble.angular_velocity
+
+        # Upward zero crossings of the angle, linearly interpolated
+        up = (theta0 < 0) & (theta1 >= 0)
+        if up.any():
+            t_cross = t0 + dt * theta0[up] / (theta0[up] - theta1[up])
+            first_crossing[up] = np.where(np.isnan(first_crossing[up]), t_cross, first_crossing[up])
+            last_crossing[up] = t_cross
+            crossings[up] += 1
+
+        # Positive turning points (angular velocity changes from + to -)
+        turn = (omega0 > 0) & (omega1 <= 0)
+        if turn.any():
+            fraction = omega0[turn] / (omega0[turn] - omega1[turn])
+            peak = theta0[turn] + 0.5 * fraction * dt * omega0[turn]
+            t_peak = t0 + fraction * dt
+            valid = peak > MIN_AMPLITUDE
+            index = np.flatnonzero(turn)[valid]
+            y = np.log(peak[valid])
+            t_peak = t_peak[valid]
+            peaks[index] += 1
+            sum_t[index] += t_peak
+            sum_tt[index] += t_peak * t_peak
+            sum_y[index] += y
+            sum_ty[index] += t_peak * y
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        period = np.where(crossings >= 2, (last_crossing - first_crossing) / (crossings - 1), np.nan)
+        denominator = peaks * sum_tt - sum_t * sum_t
+        slope = (peaks * sum_ty - sum_t * sum_y) / denominator
+        decay = np.where((peaks >= 2) & (denominator > 0), -slope, np.nan)
+    return period, decay
+
+
+def _cache_file(cache_dir, duration, dt, gravity):
+    key = hashlib.sha1(repr((float(duration), float(dt), float(gravity))).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"pendulum_sweep_{key}.npz")
+
+
+def _load_cache(path):
+    if not os.path.exists(path):
+        return np.empty((0, 4)), np.empty((0, 2))
+    with np.load(path) as data:
+        return data["params"], data["results"]
+
+
+def sweep(angles_deg, masses, lengths, dampings, duration=20.0, dt=0.01,
+          gravity=GRAVITY, cache_dir=CACHE_DIR):
+    """Run every (angle, mass, length, damping) combination.
+
+    Returns a dict of flat arrays: angle_deg, mass, length, damping, period,
+    decay, plus the number of points served from the cache.
+    """
+    grids = np.meshgrid(np.atleast_1d(angles_deg), np.atleast_1d(masses),
+                        np.atleast_1d(lengths), np.atleast_1d(dampings), indexing="ij")
+    params = np.column_stack([g.ravel().astype(float) for g in grids])
+    results = np.full((len(params), 2), np.nan)
+
+    path = None
+    cached = np.zeros(len(params), dtype=bool)
+    if cache_dir is not None:
+        path = _cache_file(cache_dir, duration, dt, gravity)
+        cached_params, cached_results = _load_cache(path)
+        lookup = {tuple(row): i for i, row in enumerate(cached_params.tolist())}
+        for i, row in enumerate(params.tolist()):
+            hit = lookup.get(tuple(row))
+            if hit is not None:
+                results[i] = cached_results[hit]
+                cached[i] = True
+
+    missing = ~cached
+    if missing.any():
+        todo = params[missing]
+        ensemble = PendulumEnsemble(np.radians(todo[:, 0]), todo[:, 2], mass=todo[:, 1],
+                                    damping=todo[:, 3], gravity=gravity)
+        period, decay = analyse(ensemble, duration, dt)
+        results[missing] = np.column_stack([period, decay])
+
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(path, params=np.concatenate([cached_params, todo]),
+                     results=np.concatenate([cached_results, results[missing]]))
+
+    return {
+        "angle_deg": params[:, 0],
+        "mass": params[:, 1],
+        "length": params[:, 2],
+        "damping": params[:, 3],
+        "period": results[:, 0],
+        "decay": results[:, 1],
+        "cached": int(cached.sum()),
+    }
+
+
+def write_csv(result, path):
+    columns = ["angle_deg", "mass", "length", "damping", "period", "decay"]
+    table = np.column_stack([result[name] for name in columns])
+    np.savetxt(path, table, delimiter=",", header=",".join(columns), comments="", fmt="%.6g")
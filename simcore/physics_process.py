@@ -0,0 +1,240 @@
+"""Run a physics engine in its own process next to the pygame front end.
+
+The engine process steps the engine in real time and publishes its state
+(a dict of arrays, `engine.state()`) into one of two slots of a
+`multiprocessing.shared_memory` block. The front end copies the latest
+complete slot whenever it draws, so a slow step no longer stalls the
+window and slow drawing no longer limits the physics rate.
+
+Each slot has a sequence counter that is odd while the slot is written:
+
+    writer: seq += 1 (odd), write the arrays, seq += 1 (even), latest = slot
+    reader: read seq of the latest slot, copy, re-read seq; retry if it
+            was odd or changed (the writer came round to this slot again)
+
+The writer always fills the slot that is not `latest`, so a reader only
+has to retry when the engine finished two whole steps during one copy.
+
+Input reaches the engine through a command queue: call("add_filings", 100)
+runs engine.add_filings(100) and set("wind", 500) sets engine.wind in the
+engine process before its next step. The engine process is forked from
+the front end, so it starts with the engine exactly as it was built;
+platforms without fork (Windows) cannot use this mode.
+"""
+
+import multiprocessing
+import queue
+import time
+
+ALIGNMENT = 64
+HEADER_SIZE = 128  # int64 counters, then float64 statistics
+MAX_LAG = 0.25  # Seconds the engine may fall behind real time before it stops catching up
+
+# int64 header fields
+LATEST, SEQUENCE, STEPS, STOP, PAUSED = 0, 1, 3, 4, 5  # SEQUENCE + slot is that slot's counter
+# float64 header fields
+STEPS_PER_SECOND, STEP_SECONDS = 0, 1
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SharedFrames:
+    """Two slots of `fields` ({name: (shape, dtype)}) in one shared memory block"""
+
+    def __init__(self, fields, name=None):
+        import numpy as np
+        from multiprocessing import shared_memory
+
+        self.fields = {name: (tuple(shape), np.dtype(dtype)) for name, (shape, dtype) in fields.items()}
+        offsets = {}
+        slot_bytes = 0
+        for field, (shape, dtype) in self.fields.items():
+            offsets[field] = slot_bytes
+            slot_bytes = _align(slot_bytes + int(np.prod(shape, dtype=np.int64)) * dtype.itemsize)
+        size = HEADER_SIZE + 2 * max(slot_bytes, ALIGNMENT)
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        buffer = self.memory.buf
+        self.counters = np.ndarray(8, dtype=np.int64, buffer=buffer)
+        self.stats = np.ndarray(8, dtype=np.float64, buffer=buffer, offset=64)
+        if self.owner:
+            self.counters[:] = 0
+            self.stats[:] = 0
+        self.slots = [{field: np.ndarray(shape, dtype=dtype, buffer=buffer,
+                                         offset=HEADER_SIZE + slot * slot_bytes + offsets[field])
+                       for field, (shape, dtype) in self.fields.items()} for slot in (0, 1)]
+        self._read_steps = -1
+
+    def publish(self, state):
+        """Write one step's state into the free slot and make it the latest"""
+        counters = self.counters
+        slot = 1 - int(counters[LATEST])
+        counters[SEQUENCE + slot] += 1  # Odd: being written
+        for field, array in self.slots[slot].items():
+            array[...] = state[field]
+        counters[SEQUENCE + slot] += 1
+        counters[LATEST] = slot
+        counters[STEPS] += 1
+
+    def read(self, out):
+        """Copy the latest complete state into the arrays of `out`.
+
+        Returns the step number, or None when nothing was published since the
+        last read (or the writer kept overwriting the slot being copied).
+        """
+        counters = self.counters
+        for _ in range(8):
+            steps = int(counters[STEPS])
+            if steps == self._read_steps:
+                return None
+            slot = int(counters[LATEST])
+            sequence = int(counters[SEQUENCE + slot])
+            if sequence % 2:
+                continue
+            for field, array in self.slots[slot].items():
+                out[field][...] = array
+            if int(counters[SEQUENCE + slot]) == sequence:
+                self._read_steps = steps
+                return steps
+        return None
+
+    def close(self):
+        self.slots = self.counters = self.stats = None  # Views must go before the buffer closes
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def _run(engine, frames, commands, dt):
+    counters, stats = frames.counters, frames.stats
+    frames.publish(engine.state())
+    started = time.perf_counter()
+    done = 0  # Steps since `started`, for pacing
+    window_start, window_steps = started, 0
+    while not counters[STOP]:
+        changed = False
+        try:
+            while True:
+                kind, name, values = commands.get_nowait()
+                if kind == "call":
+                    getattr(engine, name)(*values)
+                else:
+                    setattr(engine, name, values)
+                changed = True
+        except queue.Empty:
+            pass
+        if counters[PAUSED]:
+            if changed:
+                frames.publish(engine.state())  # Show a reset or other change while paused
+            time.sleep(dt)
+            started, done = time.perf_counter(), 0
+            continue
+
+        step_start = time.perf_counter()
+        engine.step(dt)
+        frames.publish(engine.state())
+        now = time.perf_counter()
+        stats[STEP_SECONDS] = now - step_start
+        done += 1
+        window_steps += 1
+        if now - window_start >= 0.5:
+            stats[STEPS_PER_SECOND] = window_steps / (now - window_start)
+            window_start, window_steps = now, 0
+
+        # Keep to real time; after a long stall start counting again instead of rushing
+        ahead = started + done * dt - now
+        if ahead > 0:
+            time.sleep(ahead)
+        elif ahead < -MAX_LAG:
+            started, done = now, 0
+
+
+class PhysicsProcess:
+    """Steps `engine` every `dt` seconds of real time in a forked process.
+
+    The engine needs step(dt) and state(); `fields` describes state() as
+    {name: (shape, dtype)}.
+    """
+
+    def __init__(self, engine, fields, dt):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("A separate physics process needs the fork start method")
+        context = multiprocessing.get_context("fork")
+        self.dt = dt
+        self.frames = SharedFrames(fields)
+        self.state = {field: array.copy() for field, array in self.frames.slots[0].items()}
+        self.frames_drawn = 0
+        self.steps_skipped = 0  # Published steps the front end never drew
+        self._last_step = None
+        self._commands = context.Queue()
+        self._process = context.Process(target=_run, args=(engine, self.frames, self._commands, dt), daemon=True)
+        self._process.start()
+
+    def call(self, name, *values):
+        """Run engine.name(*values) in the engine process before its next step"""
+        self._commands.put(("call", name, values))
+
+    def set(self, name, value):
+        self._commands.put(("set", name, value))
+
+    @property
+    def paused(self):
+        return bool(self.frames.counters[PAUSED])
+
+    @paused.setter
+    def paused(self, value):
+        self.frames.counters[PAUSED] = int(value)
+
+    def latest(self):
+        """The newest published state (copied into `self.state`), or None if there is no new one"""
+        step = self.frames.read(self.state)
+        if step is None:
+            return None
+        if self._last_step is not None:
+            self.steps_skipped += max(0, step - self._last_step - 1)
+        self._last_step = step
+        self.frames_drawn += 1
+        return self.state
+
+    @property
+    def steps(self):
+        return int(self.frames.counters[STEPS])
+
+    @property
+    def steps_per_second(self):
+        return float(self.frames.stats[STEPS_PER_SECOND])
+
+    def label(self):
+        step_ms = self.frames.stats[STEP_SECONDS] * 1000
+        return (f"Physics process: {self.steps_per_second:.1f} steps/s ({step_ms:.1f} ms/step), "
+                f"{self.steps_skipped} steps not drawn")
+
+    def close(self):
+        if self._process is None:
+            return
+        self.frames.counters[STOP] = 1
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+        self._commands.close()
+        self.state = None
+        self.frames.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--physics-process", action="store_true",
+                        help="step the physics in a separate process and draw its latest state")
+
+
+def from_args(args, engine, fields, dt):
+    """A PhysicsProcess for --physics-process (stopped at exit), or None"""
+    if not args.physics_process:
+        return None
+    import atexit
+
+    physics = PhysicsProcess(engine, fields, dt)
+    atexit.register(physics.close)
+    return physics
@@ -0,0 +1,211 @@
+"""Per-phase frame profiler for the simulator main loops.
+
+A main loop marks the start of each phase and the end of the frame:
+
+    profiler.start("events")
+    ...
+    profiler.start("physics")
+    ...
+    profiler.end_frame()
+
+Each start() closes the previous phase, so phases need no indentation or
+context managers. While profiling is off, start() and end_frame() return
+after a single attribute test (well under a microsecond per frame, see
+overhead()).
+
+F3 shows an overlay with rolling 50th/95th/99th percentiles per phase over
+the last `window` frames, and F4 starts and stops recording a Chrome
+trace-event file (open it in chrome://tracing or https://ui.perfetto.dev).
+`--profile` and `--trace PATH` do the same from the command line.
+"""
+
+import atexit
+import json
+import time
+
+WINDOW = 240  # Frames in the rolling percentile window
+REFRESH_FRAMES = 15  # Frames between overlay text updates
+MAX_TRACE_EVENTS = 1_000_000
+
+
+class FrameProfiler:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.show = False
+        self.enabled = False  # True while showing the overlay or recording a trace
+        self.trace_path = None
+        self._phase = None
+        self._phase_start = 0.0
+        self._frame_start = None
+        self._current = {}  # Phase -> seconds spent in it this frame
+        self._history = {}  # Phase -> ring buffer of per-frame seconds
+        self._frames = 0
+        self._trace = None
+        self._trace_origin = 0.0
+        self._surfaces = []
+        self._font = None
+
+    def _update_enabled(self):
+        self.enabled = self.show or self._trace is not None
+        if not self.enabled:
+            self._phase = None
+            self._frame_start = None
+            self._current.clear()
+
+    def start(self, name):
+        """Close the running phase (if any) and start phase `name`"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._phase is not None:
+            self._close(now)
+        elif self._frame_start is None:
+            self._frame_start = now
+        self._phase = name
+        self._phase_start = now
+
+    def _close(self, now):
+        duration = now - self._phase_start
+        self._current[self._phase] = self._current.get(self._phase, 0.0) + duration
+        if self._trace is not None and len(self._trace) < MAX_TRACE_EVENTS:
+            self._trace.append((self._phase, self._phase_start, duration))
+
+    def end_frame(self):
+        """Close the running phase and store this frame's phase times"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._phase is not None:
+            self._close(now)
+            self._phase = None
+        if self._frame_start is not None:
+            self._current["frame"] = now - self._frame_start
+            if self._trace is not None and len(self._trace) < MAX_TRACE_EVENTS:
+                self._trace.append(("frame", self._frame_start, now - self._frame_start))
+        self._frame_start = None
+
+        slot = self._frames % self.window
+        for name, history in self._history.items():
+            history[slot] = self._current.pop(name, 0.0)
+        for name, seconds in self._current.items():
+            import numpy as np  # Only needed once profiling is switched on
+
+            history = np.zeros(self.window)
+            history[slot] = seconds
+            self._history[name] = history
+        self._current.clear()
+        self._frames += 1
+
+    def percentiles(self):
+        """{phase: (p50, p95, p99)} in milliseconds over the rolling window"""
+        count = min(self._frames, self.window)
+        if count == 0:
+            return {}
+        import numpy as np
+
+        result = {}
+        for name, history in self._history.items():
+            p50, p95, p99 = np.percentile(history[:count], (50, 95, 99)) * 1000
+            result[name] = (p50, p95, p99)
+        return result
+
+    def toggle_overlay(self):
+        self.show = not self.show
+        self._update_enabled()
+
+    def start_trace(self, path=None):
+        self.trace_path = path or time.strftime("trace-%Y%m%d-%H%M%S.json")
+        self._trace = []
+        self._trace_origin = time.perf_counter()
+        self._update_enabled()
+
+    def stop_trace(self):
+        """Write the recorded events as Chrome trace-event JSON and return the path"""
+        if self._trace is None:
+            return None
+        events = [{"name": name, "cat": "frame" if name == "frame" else "phase", "ph": "X",
+                   "ts": (start - self._trace_origin) * 1e6, "dur": duration * 1e6,
+                   "pid": 1, "tid": 0 if name == "frame" else 1}
+                  for name, start, duration in self._trace]
+        with open(self.trace_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        self._trace = None
+        self._update_enabled()
+        print(f"Trace with {len(events)} events written to {self.trace_path}")
+        return self.trace_path
+
+    def handle_event(self, event):
+        """F3 toggles the overlay, F4 starts/stops a trace; True if the event was used"""
+        import pygame
+
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == pygame.K_F3:
+            self.toggle_overlay()
+            return True
+        if event.key == pygame.K_F4:
+            if self._trace is None:
+                self.start_trace()
+            else:
+                self.stop_trace()
+            return True
+        return False
+
+    def draw(self, surface, position=(10, None)):
+        """Draw the percentile table (bottom-left by default) if the overlay is shown"""
+        if not self.show:
+            return
+        import pygame
+
+        if self._font is None:
+            self._font = pygame.font.Font(None, 20)
+        if self._frames % REFRESH_FRAMES == 0 or not self._surfaces:
+            rows = [("phase", "p50", "p95", "p99 ms")]
+            for name, values in self.percentiles().items():
+                rows.append((name, *(f"{value:.2f}" for value in values)))
+            if self._trace is not None:
+                rows.append(("recording trace (F4 to stop)", "", "", ""))
+            from simcore import textcache
+
+            if textcache.cache.hits or textcache.cache.misses:
+                rows.append((textcache.label(), "", "", ""))
+            self._surfaces = [[self._font.render(cell, True, (255, 255, 0)) for cell in row] for row in rows]
+
+        columns = (0, 150, 210, 270)
+        height = 16 * len(self._surfaces) + 8
+        x = position[0]
+        y = position[1] if position[1] is not None else surface.get_height() - height - 10
+        background = pygame.Surface((340, height), pygame.SRCALPHA)
+        background.fill((0, 0, 0, 170))
+        surface.blit(background, (x, y))
+        for i, row in enumerate(self._surfaces):
+            for column, cell in zip(columns, row):
+                surface.blit(cell, (x + 4 + column, y + 4 + 16 * i))
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", action="store_true", help="show the per-phase frame profiler (F3)")
+    parser.add_argument("--trace", metavar="PATH", help="record a Chrome trace of the frame phases to PATH (F4)")
+
+
+def from_args(args):
+    """A profiler configured by --profile/--trace; a --trace file is written at exit"""
+    profiler = FrameProfiler()
+    if args.profile:
+        profiler.toggle_overlay()
+    if args.trace:
+        profiler.start_trace(args.trace)
+    atexit.register(profiler.stop_trace)
+    return profiler
+
+
+def overhead(frames=100_000, phases=8):
+    """Seconds per frame spent in start()/end_frame() calls while profiling is off"""
+    profiler = FrameProfiler()
+    names = [f"phase{i}" for i in range(phases)]
+    begin = time.perf_counter()
+    for _ in range(frames):
+        for name in names:
+            profiler.start(name)
+        profiler.end_frame()
+    return (time.perf_counter() - begin) / frames
@@ -0,0 +1,91 @@
+"""Exact discrete propagators for damped linear oscillators.
+
+Both the spring-mass system and the small-angle pendulum follow
+
+    mass * x'' = -k * x - damping * x' + force
+
+which is linear, so one timestep is an exact 2x2 state-transition matrix
+Phi = exp(A * dt) acting on (x - x_eq, v). The matrix is cached for the
+current (k, mass, damping, dt) and only rebuilt when one of them changes.
+Parameters may be scalars or arrays, in which case every oscillator in the
+batch gets its own matrix and states of shape (..., 2) are advanced at once.
+"""
+
+import numpy as np
+
+
+def transition_matrix(k, mass, damping, t):
+    """exp(A * t) for A = [[0, 1], [-k/mass, -damping/mass]], shape (..., 2, 2)"""
+    k, mass, damping, t = np.broadcast_arrays(*(np.asarray(p, dtype=float)
+                                                for p in (k, mass, damping, t)))
+    w2 = k / mass
+    s = -0.5 * damping / mass  # Half the trace of A
+    q2 = s * s - w2
+    beta = np.sqrt(np.abs(q2))
+    bt = beta * t
+    safe_beta = np.where(beta > 0, beta, 1.0)
+
+    # Phi = exp(s t) * (C I + S (A - s I)), with C and S depending on the damping regime
+    with np.errstate(over="ignore", invalid="ignore"):
+        over_c = 0.5 * (np.exp((s + beta) * t) + np.exp((s - beta) * t))
+        over_s = 0.5 * (np.exp((s + beta) * t) - np.exp((s - beta) * t)) / safe_beta
+    decay = np.exp(s * t)
+    under_c = decay * np.cos(bt)
+    under_s = decay * np.sin(bt) / safe_beta
+
+    overdamped = q2 > 0
+    ec = np.where(overdamped, over_c, under_c)
+    es = np.where(overdamped, over_s, under_s)
+    es = np.where(bt < 1e-8, decay * t, es)  # Critical damping limit
+
+    phi = np.empty(k.shape + (2, 2))
+    phi[..., 0, 0] = ec - s * es
+    phi[..., 0, 1] = es
+    phi[..., 1, 0] = -w2 * es
+    phi[..., 1, 1] = ec + s * es
+    return phi
+
+
+def _freeze(value):
+    value = np.asarray(value, dtype=float)
+    return value.shape, value.tobytes()
+
+
+class OscillatorPropagator:
+    def __init__(self, k, mass, damping, dt, force=0.0):
+        self._key = None
+        self.recomputes = 0  # Number of times the matrix has been rebuilt
+        self.set_parameters(k, mass, damping, dt, force)
+
+    def set_parameters(self, k, mass, damping, dt, force=0.0):
+        """Update the oscillator; the matrix is only rebuilt if something changed"""
+        key = (_freeze(k), _freeze(mass), _freeze(damping), _freeze(dt))
+        self.k, self.mass, self.damping, self.dt = k, mass, damping, dt
+        self.equilibrium = np.asarray(force, dtype=float) / np.asarray(k, dtype=float)
+        if key != self._key:
+            self._key = key
+            self.matrix = transition_matrix(k, mass, damping, dt)
+            self._powers = {}
+            self.recomputes += 1
+
+    def _apply(self, phi, state):
+        state = np.asarray(state, dtype=float)
+        offset = np.stack(np.broadcast_arrays(self.equilibrium, 0.0), axis=-1)
+        deviation = state - offset
+        return np.einsum('...ij,...j->...i', phi, deviation) + offset
+
+    def step(self, state):
+        """Advance (x, v) states by one dt"""
+        return self._apply(self.matrix, state)
+
+    def advance(self, state, steps):
+        """Jump `steps` timesteps ahead with a single matrix power"""
+        if steps not in self._powers:
+            if len(self._powers) >= 32:
+                self._powers.clear()
+            self._powers[steps] = np.linalg.matrix_power(self.matrix, steps)
+        return self._apply(self._powers[steps], state)
+
+    def at_time(self, state, t):
+        """Jump to an arbitrary time t (not necessarily a multiple of dt)"""
+        return self._apply(transition_matrix(self.k, self.mass, self.damping, t), state)
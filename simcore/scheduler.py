@@ -0,0 +1,141 @@
+"""Fixed-timestep physics scheduling for the render loops.
+
+Each frame the loop passes the real time the last frame took to
+advance(). The time goes into an accumulator, and the physics runs as many
+fixed steps of 1 / rate seconds as fit, so simulated time keeps pace with
+the wall clock whatever the display rate. The physics rate (--physics-hz)
+is independent of the frame cap (--fps).
+
+A frame never runs more than `max_substeps` steps. When the physics cannot
+keep up, the extra time is dropped rather than carried into the next frame,
+where it would need even more steps (the "spiral of death"). The dropped
+time is reported as the lag of simulated time behind real time.
+
+With `state` and `apply` callables the scheduler also interpolates for
+drawing. It keeps the state before the last step; show_interpolated()
+writes the blend between that state and the current one into the engine,
+weighted by the fraction of a step left in the accumulator, and
+show_current() puts the current state back before the next step:
+
+    timestep.advance(clock.get_time() / 1000)
+    timestep.show_interpolated()
+    ...draw...
+    timestep.show_current()
+"""
+
+import math
+
+MAX_SUBSTEPS = 8
+MAX_FRAME_TIME = 0.25  # Longer frames (a dragged window, a breakpoint) are dropped beyond this
+
+
+class FixedTimestep:
+    def __init__(self, step, rate=60, max_substeps=MAX_SUBSTEPS, state=None, apply=None, wrap=()):
+        """`step()` advances the physics by one step of 1 / rate seconds of real time.
+
+        `state()` returns {name: value or array} and `apply(state)` writes one
+        back; fields named in `wrap` are angles and blend along the shorter arc.
+        """
+        self.step = step
+        self.rate = rate
+        self.dt = 1.0 / rate
+        self.max_substeps = max_substeps
+        self.state = state
+        self.apply = apply
+        self.wrap = tuple(wrap)
+        self.accumulator = 0.0
+        self.steps = 0
+        self.wall_time = 0.0  # Real time handed to advance()
+        self.dropped = 0.0  # Real time skipped because of the substep cap
+        self.substeps = 0  # Steps run by the last advance()
+        self.previous = None  # State before the last step
+        self._shown = None  # Current state while the interpolated one is shown
+
+    def advance(self, frame_time):
+        """Run the physics steps that fit in the accumulated time; returns how many ran"""
+        frame_time = max(frame_time, 0.0)
+        self.wall_time += frame_time
+        self.dropped += max(0.0, frame_time - MAX_FRAME_TIME)
+        self.accumulator += min(frame_time, MAX_FRAME_TIME)
+        count = int(self.accumulator * self.rate + 1e-9)
+        if count > self.max_substeps:
+            skipped = count - self.max_substeps
+            self.accumulator -= skipped * self.dt
+            self.dropped += skipped * self.dt
+            count = self.max_substeps
+        for substep in range(count):
+            if substep == count - 1 and self.state is not None:
+                self.previous = self.state()
+            self.step()
+        self.accumulator = max(0.0, self.accumulator - count * self.dt)
+        self.steps += count
+        self.substeps = count
+        return count
+
+    @property
+    def alpha(self):
+        """Fraction of a step accumulated but not yet simulated (0 to 1)"""
+        return min(self.accumulator * self.rate, 1.0)
+
+    @property
+    def sim_time(self):
+        """Real time covered by the steps run so far"""
+        return self.steps * self.dt
+
+    @property
+    def lag(self):
+        """How far simulated time is behind the wall clock, in seconds"""
+        return self.wall_time - self.sim_time
+
+    def blend(self, previous, current, alpha):
+        import numpy as np
+
+        mixed = {}
+        for name, value in current.items():
+            old = previous[name]
+            if name in self.wrap:
+                difference = np.remainder(np.subtract(value, old) + math.pi, 2 * math.pi) - math.pi
+                mixed[name] = np.add(old, difference * alpha)
+            else:
+                mixed[name] = np.add(old, np.subtract(value, old) * alpha)
+        return mixed
+
+    def show_interpolated(self):
+        """Write the state between the last two steps into the engine for drawing"""
+        if self.apply is None or self.previous is None or self.alpha == 0:
+            return
+        import numpy as np
+
+        current = {name: np.asarray(value) for name, value in self.state().items()}  # Applied as arrays
+        if any(np.shape(current[name]) != np.shape(self.previous[name]) for name in current):
+            return  # Bodies were added or removed since the last step
+        self.apply(self.blend(self.previous, current, self.alpha))
+        self._shown = current
+
+    def snap(self):
+        """Draw the current state as is until the next step (after a reset or a jump)"""
+        self.previous = None
+
+    def show_current(self):
+        """Undo show_interpolated(); call after drawing, before the next advance()"""
+        if self._shown is not None:
+            self.apply(self._shown)
+            self._shown = None
+
+    def label(self):
+        behind = self.lag * 1000
+        dropped = self.dropped / self.wall_time * 100 if self.wall_time else 0.0
+        return (f"Physics: {self.rate:g} Hz, {self.substeps} steps this frame (max {self.max_substeps}), "
+                f"{behind:.0f} ms behind real time ({dropped:.1f}% dropped)")
+
+
+def add_arguments(parser, rate=60):
+    parser.add_argument("--physics-hz", type=float, default=rate,
+                        help=f"physics steps per second of real time (default {rate:g})")
+    parser.add_argument("--max-substeps", type=int, default=MAX_SUBSTEPS,
+                        help="most physics steps per frame before time is dropped")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate cap of the window")
+
+
+def from_args(args, step, state=None, apply=None, wrap=()):
+    return FixedTimestep(step, args.physics_hz, args.max_substeps, state, apply, wrap)
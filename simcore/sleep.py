@@ -0,0 +1,173 @@
+"""Resting-body sleep islands for the ball simulators.
+
+Balls that have moved slower than `sleep_speed` for `time_to_sleep`
+seconds are put to sleep. Sleeping balls are skipped by integration and by
+pair tests against other sleeping balls, so a settled pile costs almost
+nothing.
+
+Sleep works on contact islands (connected groups of touching balls): an
+island only falls asleep once every ball in it has been resting long
+enough, and waking any ball in an island wakes all of it. A sleeping island
+is woken when an awake ball hits it faster than `sleep_speed`; slower
+contacts treat the sleeping balls as static and merge the newcomer into the
+island when it falls asleep too.
+
+Balls need `vx`, `vy`, `asleep`, `rest_time` and `island` attributes
+(see reset()).
+"""
+
+import math
+
+SLEEP_SPEED = 0.2  # m/s
+TIME_TO_SLEEP = 0.5  # s
+CONTACT_MARGIN = 1.0  # Gap (pixels) that still counts as touching
+
+
+def reset(ball):
+    """Give a ball the attributes the sleep manager uses"""
+    ball.asleep = False
+    ball.rest_time = 0.0
+    ball.island = None
+
+
+def touching(a, b, margin=CONTACT_MARGIN):
+    dx = a.x - b.x
+    dy = a.y - b.y
+    reach = a.radius + b.radius + margin
+    return dx * dx + dy * dy < reach * reach
+
+
+def find_contacts(balls, margin=CONTACT_MARGIN):
+    """Touching pairs that involve at least one awake ball.
+
+    Balls are binned into a uniform grid with cells as wide as the largest
+    ball plus the margin, and only the cells around awake balls are
+    searched, so a settled pile costs nothing and the rest about O(n).
+    """
+    awake = [i for i, ball in enumerate(balls) if not ball.asleep]
+    if not awake:
+        return []
+    cell = 2 * max(ball.radius for ball in balls) + margin
+    grid = {}
+    for i, ball in enumerate(balls):
+        grid.setdefault((int(ball.x // cell), int(ball.y // cell)), []).append(i)
+    contacts = []
+    for i in awake:
+        a = balls[i]
+        cx, cy = int(a.x // cell), int(a.y // cell)
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in grid.get((gx, gy), ()):
+                    b = balls[j]
+                    # Pairs of awake balls are met from both ends: keep the one from the lower index
+                    if (j > i or (b.asleep and j != i)) and touching(a, b, margin):
+                        contacts.append((a, b) if i < j else (b, a))
+    return contacts
+
+
+def static_response(ball, obstacle):
+    """Push an awake ball out of a sleeping one and remove its approach velocity"""
+    dx = ball.x - obstacle.x
+    dy = ball.y - obstacle.y
+    distance = math.sqrt(dx * dx + dy * dy) or 1e-9
+    nx, ny = dx / distance, dy / distance
+    overlap = ball.radius + obstacle.radius - distance
+    if overlap > 0:
+        ball.x += overlap * nx
+        ball.y += overlap * ny
+    approach = ball.vx * nx + ball.vy * ny
+    if approach < 0:
+        ball.vx -= approach * nx
+        ball.vy -= approach * ny
+
+
+class SleepManager:
+    def __init__(self, sleep_speed=SLEEP_SPEED, time_to_sleep=TIME_TO_SLEEP):
+        self.sleep_speed = sleep_speed
+        self.time_to_sleep = time_to_sleep
+        self.enabled = True
+        self.islands = {}  # Island id -> balls sleeping together
+        self._next_island = 0
+
+    @property
+    def sleeping(self):
+        return sum(len(island) for island in self.islands.values())
+
+    def is_fast(self, ball):
+        return ball.vx * ball.vx + ball.vy * ball.vy > self.sleep_speed * self.sleep_speed
+
+    def wake(self, ball):
+        """Wake the whole island a sleeping ball belongs to; returns the balls woken"""
+        if not ball.asleep:
+            return []
+        members = self.islands.pop(ball.island, [])
+        for member in members:
+            member.asleep = False
+            member.island = None
+            member.rest_time = 0.0
+        return members
+
+    def wake_all(self):
+        for island in list(self.islands):
+            for member in self.islands.pop(island):
+                member.asleep = False
+                member.island = None
+                member.rest_time = 0.0
+
+    def on_contact(self, awake, sleeping):
+        """Called when an awake ball touches a sleeping one; the balls woken (none if the island stays asleep)"""
+        if self.is_fast(awake):
+            return self.wake(sleeping)
+        return []
+
+    def update(self, balls, contacts, dt):
+        """Advance rest timers and put fully resting islands to sleep"""
+        if not self.enabled:
+            if self.islands:
+                self.wake_all()
+            return
+
+        awake = [ball for ball in balls if not ball.asleep]
+        for ball in awake:
+            ball.rest_time = 0.0 if self.is_fast(ball) else ball.rest_time + dt
+
+        # Union-find over awake balls and the sleeping islands they touch
+        parent = {}
+
+        def node(ball):
+            return ("island", ball.island) if ball.asleep else id(ball)
+
+        def find(key):
+            parent.setdefault(key, key)
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        for ball in awake:
+            find(id(ball))
+        for a, b in contacts:
+            root_a, root_b = find(node(a)), find(node(b))
+            if root_a != root_b:
+                parent[root_a] = root_b
+
+        groups = {}
+        for ball in awake:
+            groups.setdefault(find(id(ball)), []).append(ball)
+        touched = {}
+        for key in list(parent):
+            if isinstance(key, tuple):
+                touched.setdefault(find(key), []).append(key[1])
+
+        for root, members in groups.items():
+            if min(ball.rest_time for ball in members) < self.time_to_sleep:
+                continue
+            island = self._next_island
+            self._next_island += 1
+            for old in touched.get(root, ()):
+                members.extend(self.islands.pop(old, ()))
+            for ball in members:
+                ball.asleep = True
+                ball.island = island
+                ball.vx = ball.vy = 0.0
+            self.islands[island] = members
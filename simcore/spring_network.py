@@ -0,0 +1,229 @@
+"""Implicit spring-mass networks (ropes, cloth, soft bodies).
+
+Nodes and springs are stored as flat NumPy arrays and advanced with
+projective dynamics (Liu et al., "Fast Simulation of Mass-Spring Systems").
+Each step alternates a local pass, which projects every spring onto its rest
+length, with a global pass that solves the sparse system
+
+    (M / h^2 + L) x = M y / h^2 + J d
+
+where L is the stiffness-weighted graph Laplacian of the springs. The matrix
+only depends on the masses, stiffnesses, pins and timestep, so it is
+factorised once with SciPy when it is installed and reused every step.
+Without SciPy a matrix-free conjugate gradient solve is used instead. Every
+iteration lowers the step's energy, so the step stays stable for any
+stiffness and timestep even when the iteration count is small.
+
+Units are metres and seconds, with y pointing down like the screen.
+"""
+
+import time
+
+import numpy as np
+
+try:
+    import scipy.sparse as sparse
+    import scipy.sparse.linalg as sparse_linalg
+except ImportError:  # SciPy is optional
+    sparse = None
+
+GRAVITY = 9.8  # m/s^2
+
+
+class SpringNetwork:
+    def __init__(self, positions, springs, mass=1.0, stiffness=1e4, damping=0.1,
+                 rest_lengths=None, gravity=(0.0, GRAVITY), floor=None):
+        self.x = np.array(positions, dtype=float).reshape(-1, 2)
+        self.v = np.zeros_like(self.x)
+        self.n = len(self.x)
+
+        springs = np.asarray(springs, dtype=np.int64).reshape(-1, 2)
+        self.i = springs[:, 0].copy()
+        self.j = springs[:, 1].copy()
+        if rest_lengths is None:
+            rest_lengths = np.linalg.norm(self.x[self.i] - self.x[self.j], axis=1)
+        self.rest = np.asarray(rest_lengths, dtype=float)
+        self.k = np.broadcast_to(np.asarray(stiffness, dtype=float), self.rest.shape).copy()
+
+        self.mass = np.broadcast_to(np.asarray(mass, dtype=float), (self.n,)).copy()
+        self.damping = damping  # Velocity damping rate (1/s)
+        self.gravity = np.asarray(gravity, dtype=float)
+        self.floor = floor  # Optional ground height (y, metres)
+        self.free = np.ones(self.n, dtype=bool)  # False for pinned nodes
+
+        self.iterations = 10  # Local/global iterations per step
+        self.cg_iterations = 8  # Inner solver iterations without SciPy
+        self.backend = "scipy" if sparse is not None else "cg"
+        self._factor_dt = None  # Timestep the cached factorisation was built for
+
+    @property
+    def spring_count(self):
+        return len(self.rest)
+
+    def pin(self, indices):
+        self.free[np.asarray(indices)] = False
+        self.v[~self.free] = 0
+        self._factor_dt = None
+
+    def set_stiffness(self, stiffness):
+        self.k[:] = stiffness
+        self._factor_dt = None
+
+    def _scatter(self, values):
+        # Sum per-spring 2D vectors onto nodes (+ on i, - on j)
+        out = np.empty((self.n, 2))
+        for axis in range(2):
+            out[:, axis] = (np.bincount(self.i, values[:, axis], minlength=self.n)
+                            - np.bincount(self.j, values[:, axis], minlength=self.n))
+        return out
+
+    def _factorise(self, dt):
+        self._inertia = self.mass / (dt * dt)
+        if self.backend == "scipy":
+            rows = np.concatenate([self.i, self.j, self.i, self.j])
+            cols = np.concatenate([self.i, self.j, self.j, self.i])
+            data = np.concatenate([self.k, self.k, -self.k, -self.k])
+            matrix = sparse.coo_matrix((data, (rows, cols)), shape=(self.n, self.n)).tocsr()
+            matrix = matrix + sparse.diags(self._inertia)
+            free = np.flatnonzero(self.free)
+            pinned = np.flatnonzero(~self.free)
+            self._free_index = free
+            self._pinned_index = pinned
+            self._coupling = matrix[free][:, pinned].tocsr()
+            # Minimum-degree ordering on A + A^T suits this symmetric matrix
+            self._factor = sparse_linalg.splu(matrix[free][:, free].tocsc(),
+                                              permc_spec="MMD_AT_PLUS_A")
+        self._factor_dt = dt
+
+    def _global_solve(self, rhs, guess):
+        if self.backend == "scipy":
+            free, pinned = self._free_index, self._pinned_index
+            out = guess.copy()
+            b = rhs[free] - self._coupling @ guess[pinned]
+            out[free] = self._factor.solve(b)
+            return out
+
+        # Matrix-free conjugate gradient, warm-started from the current guess
+        def apply(vec):
+            out = self._inertia[:, None] * vec
+            out += self._scatter(self.k[:, None] * (vec[self.i] - vec[self.j]))
+            out[~self.free] = 0
+            return out
+
+        x = guess.copy()
+        residual = rhs - apply(x)
+        residual[~self.free] = 0
+        p = residual.copy()
+        rr = np.vdot(residual, residual)
+        for _ in range(self.cg_iterations):
+            if rr < 1e-20:
+                break
+            ap = apply(p)
+            alpha = rr / np.vdot(p, ap)
+            x += alpha * p
+            residual -= alpha * ap
+            rr_next = np.vdot(residual, residual)
+            p = residual + (rr_next / rr) * p
+            rr = rr_next
+        return x
+
+    def step(self, dt):
+        if self._factor_dt != dt:
+            self._factorise(dt)
+
+        x0 = self.x
+        y = x0 + dt * self.v + dt * dt * self.gravity
+        y[~self.free] = x0[~self.free]
+        inertia_rhs = self._inertia[:, None] * y
+
+        x = y.copy()
+        for _ in range(self.iterations):
+            # Local step: best rest-length direction for every spring
+            d = x[self.i] - x[self.j]
+            length = np.sqrt(np.einsum('ij,ij->i', d, d))
+            target = d * (self.k * self.rest / np.maximum(length, 1e-12))[:, None]
+            # Global step: sparse solve for the node positions
+            x = self._global_solve(inertia_rhs + self._scatter(target), x)
+
+        self.v = (x - x0) / (dt * (1.0 + dt * self.damping))
+        self.x = x
+
+        if self.floor is not None:
+            below = self.x[:, 1] > self.floor
+            self.x[below, 1] = self.floor
+            self.v[below, 1] = np.minimum(self.v[below, 1], 0)
+            self.v[below, 0] *= 0.9  # Ground friction
+
+    def energy(self):
+        """Total kinetic + spring + gravitational energy (J)"""
+        length = np.linalg.norm(self.x[self.i] - self.x[self.j], axis=1)
+        kinetic = 0.5 * np.sum(self.mass * np.sum(self.v ** 2, axis=1))
+        elastic = 0.5 * np.sum(self.k * (length - self.rest) ** 2)
+        potential = -np.sum(self.mass * (self.x @ self.gravity))
+        return kinetic + elastic + potential
+
+
+def rope(nodes, length=10.0, origin=(0.0, 0.0), **kwargs):
+    """Horizontal chain pinned at its first node"""
+    xs = origin[0] + np.linspace(0.0, length, nodes)
+    positions = np.column_stack([xs, np.full(nodes, origin[1])])
+    springs = np.column_stack([np.arange(nodes - 1), np.arange(1, nodes)])
+    network = SpringNetwork(positions, springs, **kwargs)
+    network.pin([0])
+    return network
+
+
+def _grid_springs(cols, rows):
+    index = np.arange(cols * rows).reshape(rows, cols)
+    springs = [
+        np.column_stack([index[:, :-1].ravel(), index[:, 1:].ravel()]),    # Structural
+        np.column_stack([index[:-1, :].ravel(), index[1:, :].ravel()]),
+        np.column_stack([index[:-1, :-1].ravel(), index[1:, 1:].ravel()]),  # Shear
+        np.column_stack([index[:-1, 1:].ravel(), index[1:, :-1].ravel()]),
+        np.column_stack([index[:, :-2].ravel(), index[:, 2:].ravel()]),    # Bend
+        np.column_stack([index[:-2, :].ravel(), index[2:, :].ravel()]),
+    ]
+    return np.concatenate(springs)
+
+
+def _grid_positions(cols, rows, width, height, origin):
+    xs = origin[0] + np.linspace(0.0, width, cols)
+    ys = origin[1] + np.linspace(0.0, height, rows)
+    gx, gy = np.meshgrid(xs, ys)
+    return np.column_stack([gx.ravel(), gy.ravel()])
+
+
+def cloth(cols, rows, width=10.0, height=10.0, origin=(0.0, 0.0), **kwargs):
+    """Cloth sheet hanging from its two top corners"""
+    positions = _grid_positions(cols, rows, width, height, origin)
+    network = SpringNetwork(positions, _grid_springs(cols, rows), **kwargs)
+    network.pin([0, cols - 1])
+    return network
+
+
+def jelly(cols, rows, width=4.0, height=4.0, origin=(0.0, 0.0), **kwargs):
+    """Free soft-body block; pass floor=... so it has something to land on"""
+    positions = _grid_positions(cols, rows, width, height, origin)
+    return SpringNetwork(positions, _grid_springs(cols, rows), **kwargs)
+
+
+def benchmark(sizes=(1_000, 10_000, 40_000), steps=30, dt=1 / 60, stiffness=1e5):
+    """Time cloth steps and report node-steps per second for each size"""
+    results = []
+    for size in sizes:
+        side = max(2, int(round(size ** 0.5)))
+        network = cloth(side, side, stiffness=stiffness)
+        network.step(dt)  # Warm-up, includes the factorisation
+        start = time.perf_counter()
+        for _ in range(steps):
+            network.step(dt)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "backend": network.backend,
+            "nodes": network.n,
+            "springs": network.spring_count,
+            "steps": steps,
+            "seconds": elapsed,
+            "node_steps_per_second": network.n * steps / elapsed,
+        })
+    return results
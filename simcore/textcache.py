@@ -0,0 +1,126 @@
+"""Fonts and rendered text shared by the simulator windows.
+
+font() creates each font once per (name, size, bold, italic). render()
+memoizes text surfaces by (text, font, color, antialias, background) in a
+least-recently-used cache, so labels and HUD lines that do not change
+are rendered once instead of every frame. Lines that change every frame
+(timers, counters) still miss and are rendered as before; the LRU bound
+keeps them from piling up. block() composes a list of static lines into
+one cached surface, and draw_lines() blits a HUD line by line through the
+cache.
+
+Rendering whole strings is cheaper than composing them from per-character
+glyph surfaces with pygame's font renderer, so the cache stores strings.
+Cached surfaces are shared and must not be drawn on.
+"""
+
+from collections import OrderedDict
+
+CAPACITY = 512  # Rendered surfaces kept
+LINE_SPACING = 20
+
+
+class TextCache:
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._fonts = {}
+        self._surfaces = OrderedDict()
+
+    def font(self, name=None, size=24, bold=False, italic=False):
+        """A font created on first use: pygame's default font for name None, else a system font"""
+        key = (name, size, bold, italic)
+        font = self._fonts.get(key)
+        if font is None:
+            import pygame
+
+            if not pygame.font.get_init():
+                pygame.font.init()
+            if name is None:
+                font = pygame.font.Font(None, size)
+                font.set_bold(bold)
+                font.set_italic(italic)
+            else:
+                font = pygame.font.SysFont(name, size, bold=bold, italic=italic)
+            self._fonts[key] = font
+        return font
+
+    def _lookup(self, key):
+        surface = self._surfaces.get(key)
+        if surface is None:
+            self.misses += 1
+            return None
+        self._surfaces.move_to_end(key)
+        self.hits += 1
+        return surface
+
+    def _store(self, key, surface):
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.capacity:
+            self._surfaces.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def render(self, font, text, color, antialias=True, background=None):
+        """font.render(text, antialias, color, background), rendered once per distinct call"""
+        color = tuple(color)
+        background = tuple(background) if background is not None else None
+        key = (text, font, color, antialias, background)
+        surface = self._lookup(key)
+        if surface is None:
+            surface = self._store(key, font.render(text, antialias, color, background))
+        return surface
+
+    def block(self, font, lines, color, spacing=LINE_SPACING, background=None):
+        """One surface holding `lines` drawn `spacing` pixels apart, composed once"""
+        import pygame
+
+        lines = tuple(lines)
+        color = tuple(color)
+        background = tuple(background) if background is not None else None
+        key = ("block", lines, font, color, spacing, background)
+        surface = self._lookup(key)
+        if surface is None:
+            rendered = [self.render(font, line, color) for line in lines]
+            width = max((line.get_width() for line in rendered), default=0)
+            height = spacing * (len(rendered) - 1) + rendered[-1].get_height() if rendered else 0
+            surface = pygame.Surface((max(width, 1), max(height, 1)), pygame.SRCALPHA)
+            if background is not None:
+                surface.fill(background)
+            surface.blits([(line, (0, i * spacing)) for i, line in enumerate(rendered)], False)
+            surface = self._store(key, surface)
+        return surface
+
+    def draw_lines(self, surface, font, lines, color, position, spacing=LINE_SPACING):
+        """Blit each line through the cache, `spacing` pixels apart from `position` down"""
+        x, y = position
+        surface.blits([(self.render(font, line, color), (x, y + i * spacing)) for i, line in enumerate(lines)],
+                      False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "surfaces": len(self._surfaces),
+            "fonts": len(self._fonts),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def label(self):
+        stats = self.stats()
+        return (f"text cache {stats['hit_rate'] * 100:.1f}% hits, {stats['surfaces']} surfaces, "
+                f"{stats['evictions']} evicted")
+
+
+# The cache shared by the simulator scripts and the profiler overlay
+cache = TextCache()
+font = cache.font
+render = cache.render
+block = cache.block
+draw_lines = cache.draw_lines
+stats = cache.stats
+label = cache.label
@@ -0,0 +1,196 @@
+"""Block tower on the ground, built from pymunk boxes.
+
+Layers alternate between lying and standing blocks, with small random
+imperfections in position, size, rotation, friction and elasticity so
+that towers do not stay perfectly balanced. Coordinates are pixels with y
+pointing down and gravity in pixels/s^2.
+
+pymunk is imported when the first Tower is built, so the module itself
+can be imported without it.
+"""
+
+import math
+import random
+
+GRAVITY = 981  # Gravity strength (9.81 m/s²)
+TIME_STEP = 1.0 / 60.0  # Physics timestep
+BLOCK_DENSITY = 5.0  # Density of blocks
+GROUND_FRICTION = 0.8  # Ground friction coefficient
+BLOCK_FRICTION = 0.6  # Block-to-block friction
+BLOCK_ELASTICITY = 0.2  # Block elasticity/restitution
+AIR_DAMPING = 0.9  # Air resistance factor
+
+
+class Block:
+    def __init__(self, space, pos, size, mass=None):
+        import pymunk
+
+        self.pos = pos
+        self.size = size
+
+        # Calculate mass based on density and size if not provided
+        if mass is None:
+            mass = size[0] * size[1] * BLOCK_DENSITY / 100
+
+        # Create body and shape
+        moment = pymunk.moment_for_box(mass, size)
+        self.body = pymunk.Body(mass, moment)
+        self.body.position = pos
+
+        # Add slight random rotation to make tower less stable
+        self.body.angle = random.uniform(-0.03, 0.03)
+
+        self.shape = pymunk.Poly.create_box(self.body, size)
+        self.shape.friction = BLOCK_FRICTION
+        self.shape.elasticity = BLOCK_ELASTICITY
+
+        # Add material imperfections (slight variations in friction and elasticity)
+        self.shape.friction *= random.uniform(0.95, 1.05)
+        self.shape.elasticity *= random.uniform(0.95, 1.05)
+
+        space.add(self.body, self.shape)
+
+
+class Tower:
+    """A tower of `layers` layers standing on a ground line at ground_y"""
+
+    def __init__(self, x_center, ground_y, layers, width=300, height=500, block_width=80, block_height=30,
+                 ground_width=1200):
+        import pymunk
+
+        self.space = pymunk.Space()
+        self.space.gravity = (0, GRAVITY)
+        self.space.damping = AIR_DAMPING  # Add air resistance
+
+        self.x_center = x_center
+        self.ground_y = ground_y
+        self.base_y = ground_y - 5  # Centre of the first layer rests on the ground segment
+        self.layers = layers
+        self.width = width
+        self.height = height
+        self.block_width = block_width
+        self.block_height = block_height
+        self.time = 0.0
+        self.wind = 0  # Wind strength applied by every step
+
+        body = pymunk.Body(body_type=pymunk.Body.STATIC)
+        self.ground = pymunk.Segment(body, (0, ground_y), (ground_width, ground_y), 5)
+        self.ground.friction = GROUND_FRICTION
+        self.ground.elasticity = 0.2
+        self.space.add(body, self.ground)
+
+        self.blocks = self.build()
+
+    def build(self):
+        blocks = []
+        width, block_width, block_height = self.width, self.block_width, self.block_height
+
+        # Calculate vertical spacing based on total height and layers
+        y_spacing = self.height / self.layers
+
+        # Calculate number of blocks per layer based on width
+        blocks_per_layer = max(1, int(width / block_width))
+
+        for layer in range(self.layers):
+            # Alternate orientation for stability: horizontal layers, then standing blocks
+            if layer % 2 == 0:
+                count, pitch = blocks_per_layer, block_width
+            else:
+                # Calculate how many blocks can fit in the width
+                count, pitch = max(1, int(width / block_height)), block_height
+
+            for i in range(count):
+                x = self.x_center - (width / 2) + (i * pitch) + (pitch / 2)
+                y = self.base_y - (layer * y_spacing)
+
+                # Add slight position imperfections
+                x += random.uniform(-1, 1)
+                y += random.uniform(-0.5, 0.5)
+
+                # Create block with slight variations in size
+                size_variation = random.uniform(0.95, 1.05)
+                if layer % 2 == 0:
+                    size = (block_width * size_variation, block_height)
+                else:
+                    size = (block_height, block_width * size_variation)
+                blocks.append(Block(self.space, (x, y), size))
+
+        return blocks
+
+    def reset(self, seed=None):
+        """Rebuild the tower; the same seed gives the same block sizes and imperfections"""
+        if seed is not None:
+            random.seed(seed)
+        for block in self.blocks:
+            self.space.remove(block.body, block.shape)
+        self.blocks = self.build()
+        self.time = 0.0
+
+    def apply_wind(self, strength):
+        for block in self.blocks:
+            # Apply force proportional to block's surface area facing the wind
+            force = strength * block.size[0] * block.size[1] / 1000
+
+            # Apply at a slight angle for more realistic effect
+            angle = random.uniform(-0.2, 0.2)
+            force_vector = (force * math.cos(angle), force * math.sin(angle))
+
+            # Apply at center of mass with slight offset
+            offset = (random.uniform(-block.size[0]/4, block.size[0]/4),
+                      random.uniform(-block.size[1]/4, block.size[1]/4))
+            block.body.apply_force_at_local_point(force_vector, offset)
+
+    def apply_impulse(self, index, impulse):
+        self.blocks[index].body.apply_impulse_at_local_point(impulse, (0, 0))
+
+    def step(self, dt=TIME_STEP):
+        if self.wind:
+            self.apply_wind(self.wind)
+        self.space.step(dt)
+        self.time += dt
+
+    def state(self):
+        """Block positions (n, 2), angles (n,) and the simulated time"""
+        import numpy as np
+
+        return {"position": np.array([tuple(block.body.position) for block in self.blocks], dtype=float),
+                "angle": np.array([block.body.angle for block in self.blocks], dtype=float),
+                "time": self.time}
+
+    def center_of_mass(self):
+        if not self.blocks:
+            return (0, 0)
+
+        total_mass = 0
+        weighted_x = 0
+        weighted_y = 0
+
+        for block in self.blocks:
+            mass = block.body.mass
+            total_mass += mass
+            weighted_x += block.body.position.x * mass
+            weighted_y += block.body.position.y * mass
+
+        if total_mass > 0:
+            return (weighted_x / total_mass, weighted_y / total_mass)
+        return (0, 0)
+
+    def stability_index(self, com):
+        """1 = centre of mass over the middle of the base, 0 = about to topple"""
+        if not self.blocks:
+            return 1.0
+
+        # Find the base blocks (lowest y positions)
+        base_blocks = sorted(self.blocks, key=lambda b: b.body.position.y, reverse=True)[:3]
+
+        # Calculate the base width
+        leftmost = min(b.body.position.x - b.size[0]/2 for b in base_blocks)
+        rightmost = max(b.body.position.x + b.size[0]/2 for b in base_blocks)
+        base_width = rightmost - leftmost
+
+        # Calculate how centered the COM is over the base
+        base_center = (leftmost + rightmost) / 2
+        offset = abs(com[0] - base_center)
+
+        # Normalize to get a stability index between 0 and 1
+        return max(0, 1 - (2 * offset / base_width))
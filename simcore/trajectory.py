@@ -0,0 +1,276 @@
+"""Trajectory recording and memory-mapped playback.
+
+A trajectory file stores a fixed set of per-step state arrays ("fields",
+e.g. ball positions or planet state vectors), each with a fixed shape and
+dtype. The layout is chunked and columnar:
+
+    header (HEADER_SIZE bytes: magic, JSON length, JSON description)
+    chunk 0: field a, steps 0..C-1 | field b, steps 0..C-1 | ...
+    chunk 1: field a, steps C..2C-1 | ...
+
+Every chunk has the same size and every field starts on a 64-byte
+boundary, so step s of field f is at a fixed stride inside its chunk. The
+JSON description lists the fields, the chunk length C (CHUNK_STEPS, or
+fewer when a step is so large that a chunk would exceed CHUNK_BYTES), the
+number of steps and free-form metadata (script, timestep, ...).
+
+TrajectoryWriter fills one chunk in memory and appends it with a single
+write when it is full. Trajectory maps the file with mmap and builds one
+(chunks, C, *shape) view per field over the mapping, so opening a
+multi-GB file reads only the header and trajectory[s] returns views into
+the file without copying.
+"""
+
+import json
+import mmap
+import os
+import random
+import struct
+
+MAGIC = b"SIMTRAJ1"
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+CHUNK_STEPS = 256
+CHUNK_BYTES = 64 * 2**20  # Large states get fewer steps per chunk to stay under this
+SEEK_STEPS = 60  # Left/Right in playback (Shift: ten times as far)
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(fields, chunk_steps):
+    """Byte offset of every field inside a chunk and the chunk size"""
+    import numpy as np
+
+    offsets = {}
+    offset = 0
+    for name, (shape, dtype) in fields.items():
+        offsets[name] = offset
+        step_bytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        offset = _align(offset + step_bytes * chunk_steps)
+    return offsets, offset
+
+
+class TrajectoryWriter:
+    def __init__(self, path, fields, chunk_steps=None, metadata=None):
+        """`fields` maps a name to (shape of one step, dtype)"""
+        import numpy as np
+
+        self.path = path
+        self.fields = {name: (tuple(shape), np.dtype(dtype).str) for name, (shape, dtype) in fields.items()}
+        if chunk_steps is None:
+            step_bytes = sum(int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+                             for shape, dtype in self.fields.values())
+            chunk_steps = max(1, min(CHUNK_STEPS, CHUNK_BYTES // max(step_bytes, 1)))
+        self.chunk_steps = chunk_steps
+        self.metadata = metadata or {}
+        self.steps = 0
+        self._offsets, self._chunk_bytes = _layout(self.fields, chunk_steps)
+        self._chunk = np.zeros(self._chunk_bytes, dtype=np.uint8)
+        self._views = {}
+        for name, (shape, dtype) in self.fields.items():
+            count = chunk_steps * int(np.prod(shape, dtype=np.int64))
+            view = np.frombuffer(self._chunk, dtype=dtype, count=count, offset=self._offsets[name])
+            self._views[name] = view.reshape((chunk_steps,) + shape)
+        self._file = open(path, "wb")
+        self._file.write(self._header())
+
+    def _header(self):
+        description = {
+            "fields": [{"name": name, "shape": list(shape), "dtype": dtype, "offset": self._offsets[name]}
+                       for name, (shape, dtype) in self.fields.items()],
+            "chunk_steps": self.chunk_steps,
+            "chunk_bytes": self._chunk_bytes,
+            "steps": self.steps,
+            "metadata": self.metadata,
+        }
+        text = json.dumps(description).encode()
+        if len(MAGIC) + 4 + len(text) > HEADER_SIZE:
+            raise ValueError("Trajectory description does not fit in the header")
+        return (MAGIC + struct.pack("<I", len(text)) + text).ljust(HEADER_SIZE, b"\0")
+
+    def append(self, state):
+        """Store one step; `state` maps every field name to an array of its shape"""
+        import numpy as np
+
+        row = self.steps % self.chunk_steps
+        for name, view in self._views.items():
+            value = state[name]
+            if np.shape(value) != view.shape[1:]:
+                raise ValueError(f"Field {name!r} has shape {np.shape(value)}, expected {view.shape[1:]}")
+            view[row] = value
+        self.steps += 1
+        if row == self.chunk_steps - 1:
+            self._file.write(self._chunk)
+
+    def close(self):
+        """Write the partial last chunk (at full chunk size) and the final step count"""
+        if self._file is None:
+            return
+        if self.steps % self.chunk_steps:
+            self._file.write(self._chunk)
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+        self._file = None
+        print(f"Recorded {self.steps} steps to {self.path}")
+
+
+class Trajectory:
+    """Read-only, zero-copy view of a trajectory file"""
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a trajectory file")
+            length, = struct.unpack("<I", header[len(MAGIC):len(MAGIC) + 4])
+            description = json.loads(header[len(MAGIC) + 4:len(MAGIC) + 4 + length])
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.chunk_steps = description["chunk_steps"]
+        self.metadata = description["metadata"]
+        chunk_bytes = description["chunk_bytes"]
+        chunks = max(0, (len(self._mmap) - HEADER_SIZE) // chunk_bytes) if chunk_bytes else 0
+        self.steps = min(description["steps"], chunks * self.chunk_steps)
+
+        self.fields = {}
+        self._columns = {}
+        for field in description["fields"]:
+            shape, dtype = tuple(field["shape"]), np.dtype(field["dtype"])
+            inner = np.empty(shape, dtype=dtype).strides  # C-order strides of one step
+            step_bytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+            self.fields[field["name"]] = (shape, dtype)
+            self._columns[field["name"]] = np.ndarray(
+                (chunks, self.chunk_steps) + shape, dtype=dtype, buffer=self._mmap,
+                offset=HEADER_SIZE + field["offset"], strides=(chunk_bytes, step_bytes) + inner)
+
+    def __len__(self):
+        return self.steps
+
+    def rows(self, name):
+        """Length of a field's first axis (the number of balls, bodies, ...)"""
+        return self.fields[name][0][0]
+
+    def __getitem__(self, step):
+        """{field: array} for one step, as views into the file"""
+        if not -self.steps <= step < self.steps:
+            raise IndexError(f"step {step} out of range for {self.steps} steps")
+        step %= self.steps
+        chunk, row = divmod(step, self.chunk_steps)
+        return {name: column[chunk, row] for name, column in self._columns.items()}
+
+    def column(self, name, start=0, stop=None):
+        """Steps start..stop of one field (a view when they lie in one chunk, else a copy)"""
+        import numpy as np
+
+        stop = self.steps if stop is None else min(stop, self.steps)
+        column = self._columns[name]
+        if stop <= start:
+            return column[0, 0:0]
+        first, last = start // self.chunk_steps, (stop - 1) // self.chunk_steps
+        if first == last:
+            return column[first, start % self.chunk_steps:(stop - 1) % self.chunk_steps + 1]
+        flat = column[first:last + 1].reshape((-1,) + column.shape[2:])
+        return np.ascontiguousarray(flat[start - first * self.chunk_steps:stop - first * self.chunk_steps])
+
+    def size_bytes(self):
+        return len(self._mmap)
+
+
+class Playback:
+    """Steps through a Trajectory at an adjustable speed from the render loop.
+
+    Space pauses, Left/Right seek (Shift: ten times as far), PageUp/PageDown
+    double or halve the speed and Home/End jump to the ends.
+    """
+
+    def __init__(self, path):
+        self.trajectory = Trajectory(path)
+        self.position = 0.0  # Step index, fractional at speeds below 1
+        self.speed = 1.0  # Steps per frame
+        self.paused = False
+
+    @property
+    def step(self):
+        return int(self.position)
+
+    def advance(self):
+        """The state to draw this frame; moves on by `speed` steps unless paused"""
+        state = self.trajectory[self.step]
+        if not self.paused:
+            last = len(self.trajectory) - 1
+            self.position = min(max(self.position + self.speed, 0.0), last)
+        return state
+
+    def seek(self, step):
+        self.position = float(min(max(step, 0), len(self.trajectory) - 1))
+
+    def handle_event(self, event):
+        import pygame
+
+        if event.type != pygame.KEYDOWN:
+            return False
+        distance = SEEK_STEPS * (10 if event.mod & pygame.KMOD_SHIFT else 1)
+        if event.key == pygame.K_SPACE:
+            self.paused = not self.paused
+        elif event.key == pygame.K_RIGHT:
+            self.seek(self.step + distance)
+        elif event.key == pygame.K_LEFT:
+            self.seek(self.step - distance)
+        elif event.key == pygame.K_PAGEUP:
+            self.speed = min(self.speed * 2, 1024)
+        elif event.key == pygame.K_PAGEDOWN:
+            self.speed = max(self.speed / 2, 1 / 64)
+        elif event.key == pygame.K_HOME:
+            self.seek(0)
+        elif event.key == pygame.K_END:
+            self.seek(len(self.trajectory) - 1)
+        else:
+            return False
+        return True
+
+    def label(self):
+        state = "paused" if self.paused else f"x{self.speed:g}"
+        return (f"Playback: step {self.step + 1}/{len(self.trajectory)} ({state})  "
+                "Space: pause  Left/Right: seek  PgUp/PgDn: speed")
+
+
+def add_arguments(parser):
+    parser.add_argument("--record", metavar="PATH", help="record every physics step to a trajectory file")
+    parser.add_argument("--play", metavar="PATH", help="replay a trajectory file instead of simulating")
+
+
+def setup(args):
+    """Prepare --record/--play; call before headless.setup(). Returns a Playback or None.
+
+    Recordings always store the random seed of their run (one is picked when
+    --seed was not given), and playback reuses it, so the scene is rebuilt
+    with the same random sizes and imperfections before the recorded states
+    are applied.
+    """
+    if args.play:
+        if not os.path.exists(args.play):
+            raise SystemExit(f"No such trajectory file: {args.play}")
+        playback = Playback(args.play)
+        if not len(playback.trajectory):
+            raise SystemExit(f"{args.play} holds no steps")
+        args.seed = playback.trajectory.metadata.get("seed", args.seed)
+        return playback
+    if args.record and args.seed is None:
+        args.seed = random.SystemRandom().randrange(2**31)
+    return None
+
+
+def writer_from_args(args, fields, **metadata):
+    """A TrajectoryWriter for --record (closed at exit), or None"""
+    if not args.record:
+        return None
+    import atexit
+
+    writer = TrajectoryWriter(args.record, fields, metadata={"seed": args.seed, **metadata})
+    atexit.register(writer.close)
+    return writer